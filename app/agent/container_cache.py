@@ -0,0 +1,86 @@
+import logging
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+from core.metrics import DOCKER_ERRORS, DOCKER_REQUEST_SECONDS, observe_call
+from domain.container_metadata import ContainerMetadata
+
+logger = logging.getLogger('dockdns.agent.container_cache')
+
+# Container actions after which the cached inspect can no longer be trusted
+INVALIDATING_CONTAINER_ACTIONS = {'start', 'die', 'destroy', 'rename', 'update'}
+INVALIDATING_NETWORK_ACTIONS = {'connect'}
+
+
+class ContainerMetadataCache:
+    """
+    Bounded LRU of ``ContainerMetadata`` keyed by container id.
+
+    Filled by one inspect per container lifecycle (or straight from a container listing) and
+    invalidated from the Docker event stream, so handling an event costs at most one inspect.
+    """
+
+    def __init__(self, max_size: int = 1024):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries: 'OrderedDict[str, ContainerMetadata]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        return {'size': len(self._entries), 'hits': self.hits, 'misses': self.misses}
+
+    def get(self, container_id: str) -> Optional[ContainerMetadata]:
+        with self._lock:
+            metadata = self._entries.get(container_id)
+            if metadata is not None:
+                self._entries.move_to_end(container_id)
+            return metadata
+
+    def put(self, metadata: ContainerMetadata) -> ContainerMetadata:
+        with self._lock:
+            self._entries[metadata.id] = metadata
+            self._entries.move_to_end(metadata.id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return metadata
+
+    def put_attrs(self, attrs: dict) -> ContainerMetadata:
+        return self.put(ContainerMetadata.from_attrs(attrs))
+
+    def invalidate(self, container_id: str):
+        with self._lock:
+            self._entries.pop(container_id, None)
+
+    def get_or_inspect(self, client, container_id: str) -> ContainerMetadata:
+        """Cached metadata, or a single inspect through ``client`` (raises docker.errors.NotFound)"""
+        metadata = self.get(container_id)
+        if metadata is not None:
+            self.hits += 1
+            return metadata
+        self.misses += 1
+        with observe_call(DOCKER_REQUEST_SECONDS, DOCKER_ERRORS, 'inspect'):
+            attrs = client.api.inspect_container(container_id)
+        return self.put_attrs(attrs)
+
+    def handle_event(self, event: dict):
+        """Drops entries made stale by a container or network event; a disconnect is applied in place"""
+        event_type, action = event.get('Type'), event.get('Action', '')
+        if event_type == 'container' and action in INVALIDATING_CONTAINER_ACTIONS:
+            self.invalidate(event.get('id') or event.get('Actor', {}).get('ID', ''))
+        elif event_type == 'network':
+            attributes = event.get('Actor', {}).get('Attributes', {})
+            container_id = attributes.get('container')
+            if not container_id:
+                return
+            if action in INVALIDATING_NETWORK_ACTIONS:
+                self.invalidate(container_id)
+            elif action == 'disconnect':
+                with self._lock:
+                    metadata = self._entries.get(container_id)
+                    if metadata is not None:
+                        self._entries[container_id] = metadata.without_network(attributes.get('name', ''))
@@ -1,13 +1,29 @@
+import asyncio
 import logging
-import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import List, Optional
 
 import docker
 import time
 from docker import DockerClient
 
+from agent.container_cache import ContainerMetadataCache
+from agent.docker_endpoints import DockerEndpoint, parse_docker_endpoints
 from agent.dockdns_config import DockDNSConfig
+from agent.event_coalescer import EventCoalescer
+from agent.event_dispatcher import ShardedWorkerPool
+from agent.event_stream import EventCursor, docker_http_client, event_filters, stream_events_async
 from dns.manager.pihole.pihole_client import DNSRecord
+from dns.manager.reverse_proxy.traefik_client import (delete_traefik_config, get_traefik_writer,
+                                                      render_traefik_config, traefik_config_from)
+from core.host_address import HOST_ADDRESS, HostAddressProvider
+from core.metrics import (DOCKER_ERRORS, DOCKER_REQUEST_SECONDS, EVENT_QUEUE_DEPTH, MANAGED_RECORDS, observe_call,
+                          observe_convergence)
+from core.tracing import correlate, event_correlation_id, span
+from domain.container_metadata import ContainerMetadata
 from domain.container_wraper import ContainerWrapper
+from domain.hostname_policy import HostnameIndex, Owner
+from notifier.dispatcher import create_dispatcher
 
 logger = logging.getLogger('dockdns.main')
 
@@ -28,78 +44,247 @@ def get_dns_record(wrapper: ContainerWrapper, config: DockDNSConfig,) -> DNSReco
     return DNSRecord(hostname, source_ip, source_port)
 
 
-def process_container(wrapper: ContainerWrapper, config: DockDNSConfig,):
+def process_container(wrapper: ContainerWrapper, config: DockDNSConfig,) -> bool:
+    """Writes the container's Traefik route, True if it changed"""
     dns_record = get_dns_record(wrapper, config)
 
     if config.dry_run:
         logger.info(f"[DRY RUN] Would process container {wrapper} with DNS record {dns_record}")
-        # return
 
-    # render_traefik_config(wrapper, dns_record)
+    return render_traefik_config(dns_record.hostname, dns_record.ip, dns_record.port, wrapper,
+                                 traefik_config_from(config), config)
 
 
-def init_existing_containers(client: DockerClient, config: DockDNSConfig):
-    logger.info("[INIT] Checking existing containers...")
-    for container in client.containers.list(filters={"status": "running"}):
-        try:
-            wrapper = ContainerWrapper(container.labels)
-            if wrapper.disabled:
-                logger.info(f"[INIT] DockDNS disabled for {wrapper}. Skipping.")
-                continue
+def claim_hostname(wrapper: ContainerWrapper, hostnames: Optional[HostnameIndex], watcher: str = "local") -> bool:
+    """Claims the container's hostname, False (and a warning) if another container already owns it"""
+    if hostnames is None or not wrapper.target_hostname:
+        return True
+    conflict = hostnames.claim(wrapper.target_hostname, Owner(watcher, wrapper.id))
+    if conflict:
+        logger.warning(f"[SKIP] Hostname {wrapper.target_hostname} is already owned by container "
+                       f"{conflict.container_id[:12]} on {conflict.instance_id}, skipping {wrapper}")
+        return False
+    return True
+
+
+def init_existing_container(metadata: ContainerMetadata, config: DockDNSConfig,
+                            hostnames: Optional[HostnameIndex] = None, watcher: str = "local",
+                            host_address: HostAddressProvider = HOST_ADDRESS):
+    try:
+        wrapper = ContainerWrapper(metadata, host_address)
+        if wrapper.disabled:
+            logger.info(f"[INIT] DockDNS disabled for {wrapper}. Skipping.")
+            return
+        if claim_hostname(wrapper, hostnames, watcher):
             process_container(wrapper, config)
-        except Exception as e:
-            logger.error(f"[INIT] Error processing container {container.id}: {e}")
+    except Exception as e:
+        logger.error(f"[INIT] Error processing container {metadata.id}: {e}")
 
 
-def destroy_container(wrapper: ContainerWrapper, config: DockDNSConfig):
-    dns_record = get_dns_record(wrapper, config)
+def init_existing_containers(client: DockerClient, config: DockDNSConfig,
+                             cache: Optional[ContainerMetadataCache] = None,
+                             hostnames: Optional[HostnameIndex] = None, watcher: str = "local",
+                             host_address: HostAddressProvider = HOST_ADDRESS):
+    """
+    Processes every running container from a single ``docker ps`` call (no per-container inspect),
+    on up to ``event_workers`` threads.
+    """
+    logger.info("[INIT] Checking existing containers...")
+    started = time.monotonic()
+    with observe_call(DOCKER_REQUEST_SECONDS, DOCKER_ERRORS, "list"):
+        summaries = client.api.containers(filters={"status": "running"})
+    containers = [ContainerMetadata.from_summary(summary) for summary in summaries]
+    if cache is not None:
+        for metadata in containers:
+            cache.put(metadata)
+
+    progress_every = max(len(containers) // 10, 1)
+    with ThreadPoolExecutor(max_workers=max(config.event_workers, 1), thread_name_prefix="InitSync") as pool:
+        futures = [pool.submit(init_existing_container, metadata, config, hostnames, watcher, host_address)
+                   for metadata in containers]
+        for done, _ in enumerate(as_completed(futures), start=1):
+            if done % progress_every == 0 or done == len(containers):
+                logger.info(f"[INIT] Processed {done}/{len(containers)} containers")
+    logger.info(f"[INIT] {len(containers)} existing containers processed in {time.monotonic() - started:.2f}s")
 
+
+def destroy_container(wrapper: ContainerWrapper, config: DockDNSConfig) -> bool:
+    """Removes the container's Traefik route, True if it had one"""
     if config.dry_run:
-        logger.info(f"[DRY RUN] Would destroy container {wrapper} with DNS record {dns_record}")
-        # return
+        logger.info(f"[DRY RUN] Would destroy container {wrapper}")
 
-    # delete_traefik_config(wrapper)
+    return delete_traefik_config(wrapper, traefik_config_from(config), config)
 
 
 class DockerWatcher:
-    __running = True
+    """
+    Watches Docker events from a task on the running asyncio loop (the FastAPI one under ``lifespan``).
 
-    def __init__(self, dock_dn_config: DockDNSConfig):
+    The event stream is read with an async HTTP client, so there is no polling and ``stop`` cancels it
+    at once. Inspects, the initial sync and DNS updates stay on the worker threads.
+    """
+
+    def __init__(self, dock_dn_config: DockDNSConfig, name: str = "local",
+                 hostnames: Optional[HostnameIndex] = None):
         self.dock_dn_config = dock_dn_config
-        self.__client: DockerClient = docker.DockerClient(base_url=dock_dn_config.docker_url, timeout=0.5,)
-        self.__thread = None
+        self.name = name
+        self.__client: DockerClient = docker.DockerClient(base_url=dock_dn_config.docker_url)
+        self.__host_address = HostAddressProvider(dock_dn_config.docker_host_ip, dock_dn_config.docker_url,
+                                                  dock_dn_config.host_ip_refresh_interval)
+        self.__task: Optional[asyncio.Task] = None
+        self.__containers = ContainerMetadataCache(dock_dn_config.container_cache_size)
+        self.__cursor = EventCursor(dock_dn_config.event_cursor_path)
+        self.__hostnames = hostnames if hostnames is not None else HostnameIndex()
+        self.__notifier = create_dispatcher(dock_dn_config)
+        self.__workers = ShardedWorkerPool(self.__handle_container_event,
+                                           workers=dock_dn_config.event_workers,
+                                           queue_size=dock_dn_config.event_queue_size,)
+        self.__coalescer = EventCoalescer(self.__workers.submit,
+                                          window=dock_dn_config.event_coalesce_window,
+                                          max_delay=dock_dn_config.event_coalesce_max_delay,
+                                          on_discard=self.__cursor.done,
+                                          max_pending=dock_dn_config.event_queue_size,)
 
-    def start(self):
-        if self.__thread:
+    async def start(self):
+        if self.__task:
             logger.error("[ERROR] Docker watcher is already running.")
             return
-        self.__thread = threading.Thread(name="DockerWatcherThread", target=self.__watch_docker_events, daemon=True,)
-        self.__thread.start()
+        self.__notifier.start()
+        self.__host_address.start()
+        self.__workers.start()
+        EVENT_QUEUE_DEPTH.track(self.name, lambda: self.__workers.depth)
+        MANAGED_RECORDS.track(self.name, self.__hostnames.counts)
+        self.__coalescer.start()
+        self.__task = asyncio.create_task(self.__watch_docker_events(), name="DockerWatcher")
+        self.__task.add_done_callback(self.__watch_done)
 
-    def __watch_docker_events(self):
-        init_existing_containers(self.__client, self.dock_dn_config)
-        logger.info(f"[START] Agent watching Docker events, config={self.dock_dn_config}...")
-        while self.__running:
+    def __handle_container_event(self, container_id: str, action: str, event: dict):
+        try:
+            self.__apply_container_event(container_id, action, event)
+        finally:
+            # The saved cursor only moves past an event once it was handled
+            self.__cursor.done(event)
+
+    def __apply_container_event(self, container_id: str, action: str, event: dict):
+        with correlate(event_correlation_id(container_id, action, event)), \
+                span("handle_container_event", container_id=container_id, action=action):
+            if action == "start":
+                wrapper = ContainerWrapper(self.__containers.get_or_inspect(self.__client, container_id),
+                                           self.__host_address)
+                if not wrapper.target_hostname or not claim_hostname(wrapper, self.__hostnames, self.name):
+                    return
+                try:
+                    changed = process_container(wrapper, self.dock_dn_config)
+                except ValueError as e:
+                    logger.warning(f"[SKIP] {e}")
+                    self.__hostnames.release(wrapper.target_hostname, Owner(self.name, container_id))
+                    return
+                if changed:
+                    self.__notifier.notify("routes added", f"{wrapper.target_hostname} → {wrapper.source_ip}")
+            else:
+                # The container may already be gone, the event itself carries its name and labels
+                metadata = self.__containers.get(container_id) or ContainerMetadata.from_event(event)
+                wrapper = ContainerWrapper(metadata, self.__host_address)
+                if not wrapper.target_hostname:
+                    return
+                owner = self.__hostnames.owner(wrapper.target_hostname)
+                if owner and owner.container_id != container_id:
+                    logger.info(f"[SKIP] Hostname {wrapper.target_hostname} belongs to another container")
+                    return
+                self.__hostnames.release(wrapper.target_hostname, Owner(self.name, container_id))
+                if destroy_container(wrapper, self.dock_dn_config):
+                    self.__notifier.notify("routes removed", wrapper.target_hostname)
+        observe_convergence(event, action)
+
+    async def __push(self, container_id: str, action: str, event: dict):
+        self.__cursor.track(event)
+        if self.__coalescer.window > 0 and not self.__coalescer.full:
+            self.__coalescer.push(container_id, action, event)
+        else:
+            # Without coalescing push submits straight to a worker queue, and with the coalescer full it
+            # waits for room; either blocks, so it runs off the loop and the stream is not read meanwhile
+            await asyncio.to_thread(self.__coalescer.push, container_id, action, event)
+
+    async def __watch_docker_events(self):
+        resume = self.__cursor.resumable(self.dock_dn_config.event_resume_max_age)
+        if resume and self.dock_dn_config.traefik_consolidated_file:
+            # The consolidated file is re-rendered from the routes in memory, which start empty: without
+            # the sync its first flush would drop the routes of every container that kept running
+            logger.info(f"[INIT] Resuming Docker events since {self.__cursor.since}, "
+                        f"syncing existing containers to rebuild the consolidated Traefik routes")
+        elif resume:
+            logger.info(f"[INIT] Resuming Docker events since {self.__cursor.since}, skipping initial sync")
+        else:
+            self.__cursor.reset()
+        if not resume or self.dock_dn_config.traefik_consolidated_file:
             try:
-                for event in self.__client.events(decode=True):
-                    if event.get("Type") == "container":
-                        action = event.get("Action")
-                        container = self.__client.containers.get(event["id"])
-                        wrapper = ContainerWrapper(container)
-                        if action == "start":
-                            process_container(wrapper, self.dock_dn_config)
-                        elif action in ["die", "stop", "destroy"]:
-                            destroy_container(wrapper, self.dock_dn_config)
-
-                time.sleep(0.5)  # Polling interval
+                await asyncio.to_thread(init_existing_containers, self.__client, self.dock_dn_config,
+                                        self.__containers, self.__hostnames, self.name, self.__host_address)
             except Exception as e:
-                logger.error(f"[ERROR] Main loop failed: {e}", exc_info=True)
-                time.sleep(5)
-        logger.info("[STOP] Agent stopped watching Docker events.")
+                logger.error(f"[INIT] Initial sync failed: {e}")
+        logger.info(f"[START] Agent watching Docker events, config={self.dock_dn_config}...")
+        filters = event_filters(label=self.dock_dn_config.event_label_filter)
+        async with docker_http_client(self.dock_dn_config.docker_url) as http:
+            async for event in stream_events_async(http, self.__cursor, filters,
+                                                   retry_delay=self.dock_dn_config.event_retry_delay,
+                                                   max_retry_delay=self.dock_dn_config.event_max_retry_delay):
+                self.__containers.handle_event(event)
+                self.__host_address.handle_event(event)
+                if event.get("Type") == "container":
+                    action = event.get("Action")
+                    if action == "start":
+                        await self.__push(event["id"], "start", event)
+                    elif action in ["die", "stop", "destroy"]:
+                        await self.__push(event["id"], "stop", event)
+
+    @staticmethod
+    def __watch_done(task: asyncio.Task):
+        if not task.cancelled() and task.exception():
+            logger.error(f"[ERROR] Docker watcher failed: {task.exception()}", exc_info=task.exception())
 
-    def stop(self):
+    async def stop(self):
+        """Cancels the event stream, then hands pending events to the workers and waits for them."""
         logger.info("[STOP] Stopping Docker watcher...")
-        self.__running = False
-        self.__thread.join()
-        self.__thread = None
-        logger.info("[STOP] Docker watcher stopped.")
+        if self.__task:
+            self.__task.cancel()
+            try:
+                await self.__task
+            except asyncio.CancelledError:
+                pass
+            except Exception:
+                pass  # already logged by __watch_done
+            self.__task = None
+        logger.info("[STOP] Agent stopped watching Docker events.")
+        await asyncio.to_thread(self.__drain)
+        logger.info(f"[STOP] Docker watcher stopped, event coalescing stats: {self.__coalescer.stats()}, "
+                    f"worker stats: {self.__workers.stats()}")
+
+    def __drain(self):
+        self.__coalescer.stop()
+        self.__workers.stop()
+        self.__cursor.save()
+        # Writes out route changes still waiting for the consolidated file's flush timer
+        get_traefik_writer(traefik_config_from(self.dock_dn_config)).close()
+        self.__notifier.stop()
+        self.__host_address.stop()
+        EVENT_QUEUE_DEPTH.untrack(self.name)
+        MANAGED_RECORDS.untrack(self.name)
+        self.__client.close()
+
+
+def create_watchers(config: DockDNSConfig) -> List[DockerWatcher]:
+    """
+    One watcher per Docker daemon in ``config.docker_hosts`` (or just ``config.docker_url``), all sharing one
+    hostname index so a name taken on one host is reported as a collision on the others.
+    """
+    endpoints = parse_docker_endpoints(config.docker_hosts) or [DockerEndpoint("local", config.docker_url)]
+    hostnames = HostnameIndex()
+    watchers = []
+    for endpoint in endpoints:
+        update = {"docker_url": endpoint.url}
+        if len(endpoints) > 1:
+            update["docker_host_ip"] = None
+            if config.event_cursor_path:
+                update["event_cursor_path"] = f"{config.event_cursor_path}.{endpoint.name}"
+        watchers.append(DockerWatcher(config.model_copy(update=update), endpoint.name, hostnames))
+    return watchers
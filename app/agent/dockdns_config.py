@@ -9,13 +9,38 @@ class DockDNSConfig(BaseSettings):
     dns_ip: Optional[str] = None
 
     docker_url: str = "unix:///var/run/docker.sock"
+    docker_hosts: Optional[str] = None
+    docker_host_ip: Optional[str] = None
+    host_ip_refresh_interval: float = 300.0
+
+    event_coalesce_window: float = 1.0
+    event_coalesce_max_delay: float = 10.0
+    event_workers: int = 4
+    event_queue_size: int = 256
+    container_cache_size: int = 1024
+    event_label_filter: Optional[str] = None
+    event_cursor_path: Optional[str] = None
+    event_resume_max_age: float = 300.0
+    event_retry_delay: float = 1.0
+    event_max_retry_delay: float = 30.0
+
+    trace_file: Optional[str] = None
+    trace_max_events: int = 100_000
+    trace_max_files: int = 5
 
     traefik_output_dir: str = "/mnt/traefik-dynamic"
-    traefik_template_path: str = "templates/traefik_router.tmpl"
+    traefik_template_path: Optional[str] = None
+    traefik_consolidated_file: Optional[str] = None
+    traefik_consolidated_template_path: Optional[str] = None
+    traefik_flush_interval: float = 1.0
 
     notifications_enabled: bool = True
     telegram_token: Optional[str] = None
     telegram_chat_id: Optional[str] = None
+    notification_queue_size: int = 1000
+    notification_digest_window: float = 10.0
+    notification_rate: float = 1.0
+    notification_burst: int = 5
 
     model_config = SettingsConfigDict(
         env_prefix="DOCKDNS_",
@@ -0,0 +1,36 @@
+import re
+from dataclasses import dataclass
+from typing import List, Optional
+from urllib.parse import urlparse
+
+
+@dataclass(frozen=True)
+class DockerEndpoint:
+    """One Docker daemon to watch; ``name`` tells its records apart (env prefix, instance id)"""
+    name: str
+    url: str
+
+
+def endpoint_name(url: str) -> str:
+    """DNS-safe name derived from the daemon's host, ``local`` for a unix socket"""
+    host = urlparse(url).hostname or 'local'
+    name = re.sub(r'[^a-z0-9-]+', '-', host.split('.')[0].lower()).strip('-')
+    return name[:20] or 'docker'
+
+
+def parse_docker_endpoints(value: Optional[str]) -> List[DockerEndpoint]:
+    """
+    Parses ``name=url`` pairs separated by commas or whitespace, e.g.
+    ``web=tcp://10.0.0.5:2375,db=tcp://10.0.0.6:2375``. A bare url is named after its host.
+    """
+    endpoints, names = [], set()
+    for item in re.split(r'[,\s]+', value or ''):
+        if not item:
+            continue
+        name, _, url = item.partition('=') if '=' in item.split('://')[0] else ('', '', item)
+        name = name or endpoint_name(url)
+        if name in names:
+            raise ValueError(f"Duplicate Docker endpoint name {name!r} in {value!r}")
+        names.add(name)
+        endpoints.append(DockerEndpoint(name, url))
+    return endpoints
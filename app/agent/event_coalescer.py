@@ -0,0 +1,171 @@
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger('dockdns.agent.event_coalescer')
+
+
+@dataclass
+class PendingEvent:
+    container_id: str
+    action: str
+    event: Optional[dict]
+    first_seen: float
+    last_seen: float
+    count: int = 1
+
+
+class EventCoalescer:
+    """
+    Debounces container events per container id.
+
+    Events for the same container are collapsed until it has been quiet for ``window`` seconds
+    (or ``max_delay`` seconds passed since the first one, so a crash loop cannot starve it); only the
+    last action is handed to ``handler(container_id, action, event)``. With ``window <= 0`` every
+    event is passed straight through. ``on_discard(event)`` is called for each event absorbed by
+    another one, which is then handled in its place.
+
+    At most ``max_pending`` containers (0: unbounded) are held. A push for another container then
+    blocks, and the oldest pending event is handed over early to make room, so a handler that blocks
+    (a full worker queue) slows down the caller instead of letting the pending map grow.
+    """
+
+    def __init__(self, handler: Callable[[str, str, Optional[dict]], None], window: float = 1.0,
+                 max_delay: float = 10.0, name: str = "EventCoalescerThread",
+                 on_discard: Optional[Callable[[Optional[dict]], None]] = None, max_pending: int = 0):
+        self.handler = handler
+        self.on_discard = on_discard
+        self.window = window
+        self.max_delay = max(max_delay, window)
+        self.max_pending = max_pending
+        self.name = name
+        self.received = 0
+        self.emitted = 0
+        self.backpressure = 0
+        self._blocked = 0
+        self._pending: Dict[str, PendingEvent] = {}
+        self._cond = threading.Condition()
+        self._running = False
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def saved(self) -> int:
+        """Number of events that were absorbed instead of being acted upon."""
+        return self.received - self.emitted - len(self._pending)
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    @property
+    def full(self) -> bool:
+        """Whether a push for a container not pending yet would block"""
+        return 0 < self.max_pending <= len(self._pending) and self._running
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {'received': self.received, 'emitted': self.emitted, 'pending': len(self._pending),
+                    'saved': self.saved, 'backpressure': self.backpressure}
+
+    def start(self):
+        if self.window <= 0 or self._thread:
+            return
+        self._running = True
+        self._thread = threading.Thread(name=self.name, target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stops the flusher thread and hands every pending event to the handler."""
+        if self._thread:
+            with self._cond:
+                self._running = False
+                self._cond.notify_all()
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def push(self, container_id: str, action: str, event: Optional[dict] = None, replace: bool = True):
+        """
+        Queues ``action``; with ``replace=False`` it does not override an action already pending.
+        Blocks while ``max_pending`` other containers are pending.
+        """
+        if self.window <= 0:
+            self.received += 1
+            self.emitted += 1
+            self._dispatch(PendingEvent(container_id, action, event, 0, 0))
+            return
+
+        now = time.monotonic()
+        with self._cond:
+            self.received += 1
+            if container_id not in self._pending and self.full:
+                self.backpressure += 1
+                while container_id not in self._pending and self.full:
+                    self._blocked += 1
+                    self._cond.notify_all()
+                    self._cond.wait()
+                    self._blocked -= 1
+                now = time.monotonic()
+            pending = self._pending.get(container_id)
+            if pending:
+                discarded = event
+                if replace:
+                    discarded, pending.action, pending.event = pending.event, action, event
+                pending.last_seen = now
+                pending.count += 1
+            else:
+                self._pending[container_id] = PendingEvent(container_id, action, event, now, now)
+                self._cond.notify_all()
+                return
+        if self.on_discard:
+            self.on_discard(discarded)
+
+    def flush(self):
+        with self._cond:
+            due = list(self._pending.values())
+            self._pending.clear()
+            self.emitted += len(due)
+            self._cond.notify_all()
+        for pending in due:
+            self._dispatch(pending)
+
+    def _deadline(self, pending: PendingEvent) -> float:
+        return min(pending.last_seen + self.window, pending.first_seen + self.max_delay)
+
+    def _pop_due(self, now: float) -> List[PendingEvent]:
+        due = [p for p in self._pending.values() if self._deadline(p) <= now]
+        if not due and self._blocked and self._pending:
+            # A push is waiting for room: hand over the oldest pending event before its window ends
+            due = [next(iter(self._pending.values()))]
+        for pending in due:
+            del self._pending[pending.container_id]
+        self.emitted += len(due)
+        if due:
+            self._cond.notify_all()
+        return due
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._running:
+                    return
+                now = time.monotonic()
+                due = self._pop_due(now)
+                if not due:
+                    timeout = min((self._deadline(p) for p in self._pending.values()), default=now + 1) - now
+                    self._cond.wait(timeout=max(timeout, 0.01))
+                    continue
+            for pending in due:
+                self._dispatch(pending)
+
+    def _dispatch(self, pending: PendingEvent):
+        if pending.count > 1:
+            logger.debug(f"Coalesced {pending.count} events for container {pending.container_id[:12]} "
+                         f"into '{pending.action}'")
+        try:
+            self.handler(pending.container_id, pending.action, pending.event)
+        except Exception as e:
+            logger.error(f"Failed to handle '{pending.action}' for container {pending.container_id[:12]}: {e}",
+                         exc_info=True)
@@ -0,0 +1,95 @@
+import logging
+import queue
+import threading
+import time
+import zlib
+from typing import Callable, List, Optional
+
+logger = logging.getLogger('dockdns.agent.event_dispatcher')
+
+_STOP = object()
+
+
+class ShardedWorkerPool:
+    """
+    Runs ``handler(key, *args)`` on a pool of worker threads fed through bounded queues.
+
+    Work is sharded by key (the container id), so everything for one container runs in order on
+    the same worker while unrelated containers are processed in parallel. ``submit`` blocks while
+    the target shard is full, which pushes back on the event reader instead of buffering without
+    limit.
+    """
+
+    def __init__(self, handler: Callable[..., None], workers: int = 4, queue_size: int = 256,
+                 name: str = "EventWorker"):
+        self.handler = handler
+        self.name = name
+        workers = max(1, workers)
+        self._queues: List[queue.Queue] = [queue.Queue(maxsize=max(1, queue_size // workers))
+                                           for _ in range(workers)]
+        self._threads: List[threading.Thread] = []
+        self.submitted = 0
+        self.processed = 0
+        self.backpressure = 0
+        self.max_depth = 0
+        self._last_full_warning = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def workers(self) -> int:
+        return len(self._queues)
+
+    @property
+    def depth(self) -> int:
+        return sum(q.qsize() for q in self._queues)
+
+    def stats(self) -> dict:
+        return {'depth': self.depth, 'max_depth': self.max_depth, 'submitted': self.submitted,
+                'processed': self.processed, 'backpressure': self.backpressure}
+
+    def start(self):
+        if self._threads:
+            return
+        for index, shard in enumerate(self._queues):
+            thread = threading.Thread(name=f"{self.name}-{index}", target=self._run, args=(shard,), daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout: Optional[float] = None):
+        """Lets the workers drain what is already queued, then stops them."""
+        for shard in self._queues:
+            shard.put(_STOP)
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def _shard(self, key: str) -> queue.Queue:
+        return self._queues[zlib.crc32(key.encode()) % len(self._queues)]
+
+    def submit(self, key: str, *args, timeout: Optional[float] = None):
+        shard = self._shard(key)
+        if shard.full():
+            with self._lock:
+                self.backpressure += 1
+                now = time.monotonic()
+                if now - self._last_full_warning > 5:
+                    self._last_full_warning = now
+                    logger.warning(f"Event queue full (depth={self.depth}), applying backpressure to the event reader")
+        shard.put((key, args), timeout=timeout)
+        with self._lock:
+            self.submitted += 1
+            self.max_depth = max(self.max_depth, self.depth)
+
+    def _run(self, shard: queue.Queue):
+        while True:
+            item = shard.get()
+            if item is _STOP:
+                return
+            key, args = item
+            try:
+                self.handler(key, *args)
+            except Exception as e:
+                logger.error(f"Worker failed to handle {key[:12]}: {e}", exc_info=True)
+            finally:
+                with self._lock:
+                    self.processed += 1
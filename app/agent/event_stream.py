@@ -0,0 +1,254 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+from typing import AsyncIterator, Callable, Dict, Iterable, Iterator, List, Optional
+from urllib.parse import urlparse
+
+import httpx
+import time
+
+from core.metrics import EVENT_LAG_SECONDS, event_age
+
+logger = logging.getLogger('dockdns.agent.event_stream')
+
+# Container actions DockDNS reacts to, plus the ones that only invalidate cached inspect data
+CONTAINER_ACTIONS = ['start', 'stop', 'die', 'kill', 'destroy', 'rename', 'update']
+NETWORK_ACTIONS = ['connect', 'disconnect']
+
+
+def event_filters(actions: Iterable[str] = CONTAINER_ACTIONS, label: Optional[str] = None,
+                  network_events: bool = True) -> Dict[str, List[str]]:
+    """
+    Daemon-side filters for ``client.events``, so image, volume and unrelated events are never sent.
+
+    Values under one key are OR-ed and keys are AND-ed by the daemon. A ``label`` filter also applies
+    to network events, which carry no container labels, so network events are dropped in that case.
+    """
+    filters = {'type': ['container'], 'event': list(actions)}
+    if label:
+        filters['label'] = [label]
+    elif network_events:
+        filters['type'].append('network')
+        filters['event'] += NETWORK_ACTIONS
+    return filters
+
+
+class EventCursor:
+    """
+    Position of the last processed Docker event, used as ``since`` when the stream is reopened.
+
+    The daemon's ``since`` has one second resolution, so replayed events at or before the last
+    ``timeNano`` are skipped by ``seen``. When ``path`` is set the cursor is persisted (at most every
+    ``save_interval`` seconds, temp file + rename) so a restart can resume instead of resyncing.
+
+    Events handed to a coalescer or worker queue are registered with ``track`` and released with
+    ``done`` once handled. The persisted position (``committed``) stays just before the oldest event
+    still in flight, so a restart replays whatever was buffered instead of losing it.
+    """
+
+    def __init__(self, path: Optional[str] = None, save_interval: float = 1.0):
+        self.path = path
+        self.save_interval = save_interval
+        self.time_nano = 0
+        self.updated_at: Optional[float] = None
+        self._dirty = False
+        self._saved_at = 0.0
+        self._saved_position = 0
+        self._in_flight: Dict[int, int] = {}
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+            self.time_nano = self._saved_position = int(data.get('time_nano', 0))
+            self.updated_at = data.get('updated_at')
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable event cursor {self.path}: {e}")
+
+    @property
+    def since(self) -> Optional[int]:
+        return self.time_nano // 1_000_000_000 if self.time_nano else None
+
+    def age(self) -> Optional[float]:
+        """Seconds since the cursor last moved, None if it never did"""
+        return time.time() - self.updated_at if self.updated_at else None
+
+    def resumable(self, max_age: float) -> bool:
+        age = self.age()
+        return age is not None and age <= max_age
+
+    def reset(self):
+        """Moves the cursor to now, e.g. after a full resync made older events irrelevant"""
+        self.time_nano = time.time_ns()
+        self.updated_at = time.time()
+        self._dirty = True
+        self.save()
+
+    @staticmethod
+    def _time_nano(event: Optional[dict]) -> int:
+        if not event:
+            return 0
+        return event.get('timeNano') or event.get('time', 0) * 1_000_000_000
+
+    def track(self, event: Optional[dict]):
+        """Registers an event that is handled later; the persisted position stays before it until ``done``"""
+        time_nano = self._time_nano(event)
+        if time_nano:
+            with self._lock:
+                self._in_flight[time_nano] = self._in_flight.get(time_nano, 0) + 1
+
+    def done(self, event: Optional[dict]):
+        time_nano = self._time_nano(event)
+        with self._lock:
+            count = self._in_flight.get(time_nano)
+            if count is None:
+                return
+            if count > 1:
+                self._in_flight[time_nano] = count - 1
+            else:
+                del self._in_flight[time_nano]
+
+    @property
+    def in_flight(self) -> int:
+        with self._lock:
+            return sum(self._in_flight.values())
+
+    @property
+    def committed(self) -> int:
+        """Position up to which every event was handled"""
+        with self._lock:
+            if self._in_flight:
+                return min(self.time_nano, min(self._in_flight) - 1)
+            return self.time_nano
+
+    def seen(self, event: dict) -> bool:
+        time_nano = event.get('timeNano') or 0
+        return bool(self.time_nano) and 0 < time_nano <= self.time_nano
+
+    def advance(self, event: dict):
+        time_nano = self._time_nano(event)
+        if time_nano > self.time_nano:
+            self.time_nano = time_nano
+            self.updated_at = time.time()
+            self._dirty = True
+            if time.monotonic() - self._saved_at >= self.save_interval:
+                self.save()
+
+    def save(self):
+        committed = self.committed
+        if not self.path or (not self._dirty and committed == self._saved_position):
+            return
+        try:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            tmp_file = f"{self.path}.tmp"
+            with open(tmp_file, 'w') as f:
+                json.dump({'time_nano': committed, 'updated_at': self.updated_at}, f)
+            os.replace(tmp_file, self.path)
+            self._saved_position = committed
+            self._dirty = False
+            self._saved_at = time.monotonic()
+        except Exception as e:
+            logger.error(f"Error saving event cursor {self.path}: {e}")
+
+
+def stream_events(client, cursor: EventCursor, filters: Optional[Dict[str, List[str]]] = None,
+                  running: Callable[[], bool] = lambda: True, retry_delay: float = 5.0,
+                  on_stream: Optional[Callable[[object], None]] = None) -> Iterator[dict]:
+    """
+    Yields filtered Docker events forever, reopening the stream with ``since=cursor`` after a failure.
+
+    Events replayed by the reopen that were already processed are dropped, so callers see each event
+    once and only need a full resync when the cursor is too old for the daemon to replay.
+
+    ``on_stream`` receives every stream as it is opened. Closing it is the only way to end a stream
+    waiting for events: closing the Docker client leaves it blocked.
+    """
+    while running():
+        try:
+            stream = client.events(decode=True, filters=filters, since=cursor.since)
+            if on_stream:
+                on_stream(stream)
+            for event in stream:
+                if cursor.seen(event):
+                    continue
+                age = event_age(event)
+                if age is not None:
+                    EVENT_LAG_SECONDS.observe(max(age, 0.0), type=event.get('Type', ''))
+                yield event
+                cursor.advance(event)
+                if not running():
+                    return
+            if running():
+                logger.warning("Docker event stream closed, reconnecting...")
+                time.sleep(min(retry_delay, 0.5))
+        except Exception as e:
+            if not running():
+                break
+            logger.error(f"Docker event stream failed: {e}, reconnecting in {retry_delay}s "
+                         f"(since={cursor.since})")
+            time.sleep(retry_delay)
+        finally:
+            cursor.save()
+
+
+def docker_http_client(docker_url: str) -> httpx.AsyncClient:
+    """
+    Async HTTP client for the Docker Engine API at ``docker_url`` (``unix://``, ``tcp://`` or ``http(s)://``).
+
+    Reads never time out, the event stream is expected to stay idle for a long time.
+    """
+    url = urlparse(docker_url)
+    timeout = httpx.Timeout(10.0, read=None)
+    if url.scheme == 'unix':
+        return httpx.AsyncClient(transport=httpx.AsyncHTTPTransport(uds=url.path), base_url='http://docker',
+                                 timeout=timeout)
+    scheme = 'http' if url.scheme == 'tcp' else url.scheme
+    return httpx.AsyncClient(base_url=f"{scheme}://{url.netloc}", timeout=timeout)
+
+
+async def stream_events_async(http: httpx.AsyncClient, cursor: EventCursor,
+                              filters: Optional[Dict[str, List[str]]] = None, retry_delay: float = 1.0,
+                              max_retry_delay: float = 30.0) -> AsyncIterator[dict]:
+    """
+    Asyncio counterpart of ``stream_events`` reading ``GET /events`` through ``http``.
+
+    Failed connections are retried with exponential backoff from ``retry_delay`` up to
+    ``max_retry_delay`` seconds, reset once the daemon accepts the stream. Cancelling the consuming
+    task ends the stream immediately; the cursor is saved either way.
+    """
+    delay = retry_delay
+    try:
+        while True:
+            params = {'filters': json.dumps(filters or {})}
+            if cursor.since:
+                params['since'] = str(cursor.since)
+            try:
+                async with http.stream('GET', '/events', params=params) as response:
+                    response.raise_for_status()
+                    delay = retry_delay
+                    async for line in response.aiter_lines():
+                        if not line.strip():
+                            continue
+                        event = json.loads(line)
+                        if cursor.seen(event):
+                            continue
+                        age = event_age(event)
+                        if age is not None:
+                            EVENT_LAG_SECONDS.observe(max(age, 0.0), type=event.get('Type', ''))
+                        yield event
+                        cursor.advance(event)
+                logger.warning("Docker event stream closed, reconnecting...")
+                await asyncio.sleep(min(retry_delay, 0.5))
+            except (httpx.HTTPError, ValueError) as e:
+                logger.error(f"Docker event stream failed: {e}, reconnecting in {delay:.1f}s "
+                             f"(since={cursor.since})")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, max_retry_delay)
+    finally:
+        cursor.save()
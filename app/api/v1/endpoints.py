@@ -1,7 +1,15 @@
 from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from core.metrics import CONTENT_TYPE, REGISTRY
 
 router = APIRouter()
 
 @router.get("/ping")
 async def ping():
     return {"ping": "pong"}
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    return PlainTextResponse(REGISTRY.render(), media_type=CONTENT_TYPE)
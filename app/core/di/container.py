@@ -1,5 +1,6 @@
 from dependency_injector import containers, providers
 
+from dns.manager.pihole.async_pihole_client import create_async_pihole_client
 from dns.manager.pihole.config import PiHoleConfig
 from dns.manager.pihole.pihole_client import PiHoleClient
 
@@ -9,6 +10,7 @@ class Container(containers.DeclarativeContainer):
 
     config.pi_hole_url = config.from_env('PI_HOLE_URL', default='http://0.0.0.0:8080', as_=str)
     config.pi_hole_api_token = config.from_env('PI_HOLE_API_TOKEN', required=True, as_=str)
+    config.pi_hole_api_version = config.from_env('PI_HOLE_API_VERSION', default=5, as_=int)
 
     pi_hole_client = providers.Singleton(
         PiHoleClient,
@@ -17,3 +19,12 @@ class Container(containers.DeclarativeContainer):
             api_token=config.pi_hole_api_token(),
         )
     )
+
+    async_pi_hole_client = providers.Singleton(
+        create_async_pihole_client,
+        pihole_config=PiHoleConfig(
+            url=config.pi_hole_url(),
+            api_token=config.pi_hole_api_token(),
+            api_version=config.pi_hole_api_version(),
+        )
+    )
@@ -0,0 +1,125 @@
+import logging
+import socket
+import threading
+from typing import Optional
+from urllib.parse import urlparse
+
+import time
+
+logger = logging.getLogger('dockdns.core.host_address')
+
+# Docker network events after which the host's address is looked up again
+REFRESH_NETWORK_ACTIONS = ('create', 'destroy', 'connect', 'disconnect')
+
+
+def primary_address() -> Optional[str]:
+    """Address of the interface the default route uses; a UDP connect sends nothing and forks nothing"""
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+        s.connect(('192.0.2.1', 9))
+        address = s.getsockname()[0]
+    return None if address.startswith('0.') else address
+
+
+class HostAddressProvider:
+    """
+    Address of the Docker host, for containers running with ``network_mode: host``.
+
+    Resolved once on first use (``override``, the host of a ``tcp://`` ``docker_url``, the primary
+    interface, then the hostname) and cached. ``start`` refreshes it every ``refresh_interval`` seconds
+    and, at most every ``min_refresh_interval`` seconds, after Docker network events; lookups never
+    happen on the caller's thread once it has been resolved.
+    """
+
+    def __init__(self, override: Optional[str] = None, docker_url: Optional[str] = None,
+                 refresh_interval: float = 300.0, min_refresh_interval: float = 5.0):
+        self.override = override or None
+        self.docker_url = docker_url
+        self.refresh_interval = refresh_interval
+        self.min_refresh_interval = min_refresh_interval
+        self.refreshes = 0
+        self._address: Optional[str] = None
+        self._resolved = False
+        self._refreshed_at = 0.0
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def address(self) -> Optional[str]:
+        if not self._resolved:
+            with self._lock:
+                if not self._resolved:
+                    self._update(self._resolve())
+        return self._address
+
+    def _resolve(self) -> Optional[str]:
+        if self.override:
+            return self.override
+        url = urlparse(self.docker_url or '')
+        if url.scheme in ('tcp', 'http', 'https') and url.hostname:
+            try:
+                return socket.gethostbyname(url.hostname)
+            except OSError as e:
+                logger.warning(f"Could not resolve Docker host {url.hostname}: {e}")
+        try:
+            return primary_address()
+        except OSError:
+            pass
+        try:
+            return socket.gethostbyname(socket.gethostname())
+        except OSError as e:
+            logger.warning(f"Could not determine the Docker host address: {e}")
+            return None
+
+    def _update(self, address: Optional[str]):
+        if address != self._address:
+            logger.info(f"Docker host address: {address} (was {self._address})")
+        self._address = address
+        self._resolved = True
+        self._refreshed_at = time.monotonic()
+        self.refreshes += 1
+
+    def refresh(self) -> Optional[str]:
+        address = self._resolve()
+        with self._lock:
+            self._update(address)
+        return address
+
+    def handle_event(self, event: dict):
+        """Schedules a refresh after a Docker network change; returns immediately"""
+        if event.get('Type') == 'network' and event.get('Action') in REFRESH_NETWORK_ACTIONS:
+            self._wake.set()
+
+    def start(self):
+        if self._thread or self.override:
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(name='HostAddressRefresher', target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        if not self._resolved:
+            self.refresh()
+        while not self._stopped.is_set():
+            woken = self._wake.wait(self.refresh_interval if self.refresh_interval > 0 else None)
+            self._wake.clear()
+            if woken:
+                # Coalesces a burst of network events into one lookup
+                self._stopped.wait(max(self._refreshed_at + self.min_refresh_interval - time.monotonic(), 0))
+            if self._stopped.is_set():
+                return
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.warning(f"Failed to refresh the Docker host address: {e}")
+
+
+HOST_ADDRESS = HostAddressProvider()
@@ -0,0 +1,257 @@
+import logging
+import math
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+import time
+
+logger = logging.getLogger('dockdns.core.metrics')
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+CONVERGENCE_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Metric:
+    type = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def samples(self) -> Iterable[str]:
+        return ()
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        lines += self.samples()
+        return '\n'.join(lines)
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for key, value in values.items():
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+
+
+class Gauge(Metric):
+    """
+    Set directly, or read at scrape time from ``set_function`` (a number, or ``{label value(s): number}``).
+
+    Several sources (e.g. one per watched Docker daemon) can ``track`` a function each: their numbers
+    are summed and their label dicts merged.
+    """
+    type = 'gauge'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+        self._functions: Dict[str, Callable[[], Union[float, Dict]]] = {}
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def set_function(self, function: Optional[Callable[[], Union[float, Dict]]]):
+        self._functions = {'': function} if function is not None else {}
+
+    def track(self, source: str, function: Callable[[], Union[float, Dict]]):
+        self._functions[source] = function
+
+    def untrack(self, source: str):
+        self._functions.pop(source, None)
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for function in list(self._functions.values()):
+            try:
+                result = function()
+            except Exception as e:
+                logger.warning(f"Failed to collect {self.name}: {e}")
+                continue
+            if isinstance(result, dict):
+                for key, value in result.items():
+                    values[key if isinstance(key, tuple) else (str(key),)] = value
+            else:
+                values[()] = values.get((), 0) + result
+        for key, value in values.items():
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self._counts: Dict[LabelValues, List[int]] = {}
+        self._sums: Dict[LabelValues, float] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts = self._counts.setdefault(key, [0] * len(self.buckets))
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+                    break
+            self._sums[key] = self._sums.get(key, 0.0) + value
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def count(self, **labels) -> int:
+        return sum(self._counts.get(self._key(labels), ()))
+
+    def samples(self):
+        with self._lock:
+            counts = {key: list(value) for key, value in self._counts.items()}
+            sums = dict(self._sums)
+        for key, bucket_counts in counts.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, bucket_counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                yield f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}"
+            labels = _format_labels(self.labelnames, key)
+            yield f"{self.name}_sum{labels} {_format_value(sums[key])}"
+            yield f"{self.name}_count{labels} {cumulative}"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format (0.0.4)"""
+        return '\n'.join(metric.render() for metric in self._metrics.values()) + '\n'
+
+
+REGISTRY = Registry()
+
+EVENT_LAG_SECONDS = REGISTRY.register(Histogram(
+    'dockdns_event_lag_seconds', 'Delay between a Docker event and DockDNS reading it', ('type',)))
+EVENT_CONVERGENCE_SECONDS = REGISTRY.register(Histogram(
+    'dockdns_event_convergence_seconds', 'Delay between a Docker event and its DNS change being applied',
+    ('action',), CONVERGENCE_BUCKETS))
+EVENT_QUEUE_DEPTH = REGISTRY.register(Gauge(
+    'dockdns_event_queue_depth', 'Container events waiting for a worker'))
+PIHOLE_REQUEST_SECONDS = REGISTRY.register(Histogram(
+    'dockdns_pihole_request_seconds', 'Pi-hole API call latency, retries included', ('operation',)))
+PIHOLE_ERRORS = REGISTRY.register(Counter(
+    'dockdns_pihole_errors_total', 'Failed Pi-hole API calls (after retries)', ('operation',)))
+DOCKER_REQUEST_SECONDS = REGISTRY.register(Histogram(
+    'dockdns_docker_request_seconds', 'Docker API call latency', ('operation',)))
+DOCKER_ERRORS = REGISTRY.register(Counter(
+    'dockdns_docker_errors_total', 'Failed Docker API calls', ('operation',)))
+STATE_FLUSH_SECONDS = REGISTRY.register(Histogram(
+    'dockdns_state_flush_seconds', 'Duration of writing one instance to the shared state store'))
+MANAGED_RECORDS = REGISTRY.register(Gauge(
+    'dockdns_managed_records', 'DNS records managed per DockDNS instance', ('instance',)))
+
+
+@contextmanager
+def observe_call(histogram: Histogram, errors: Counter, operation: str):
+    """Times one API call and counts it as an error if it raises"""
+    started = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        errors.inc(operation=operation)
+        raise
+    finally:
+        histogram.observe(time.perf_counter() - started, operation=operation)
+
+
+def event_age(event: Optional[dict]) -> Optional[float]:
+    """Seconds since the Docker event happened, from its ``timeNano``/``time``"""
+    if not event:
+        return None
+    if event.get('timeNano'):
+        return time.time() - event['timeNano'] / 1e9
+    if event.get('time'):
+        return time.time() - event['time']
+    return None
+
+
+def observe_convergence(event: Optional[dict], action: str):
+    age = event_age(event)
+    if age is not None:
+        EVENT_CONVERGENCE_SECONDS.observe(max(age, 0.0), action=action)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.rstrip('/') not in ('/metrics', '/api/v1/metrics'):
+            self.send_error(404)
+            return
+        body = REGISTRY.render().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_metrics(port: int, host: str = '0.0.0.0') -> ThreadingHTTPServer:
+    """Serves ``/api/v1/metrics`` from a daemon thread, for processes that don't run the FastAPI app"""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(name='MetricsServer', target=server.serve_forever, daemon=True).start()
+    logger.info(f"Serving metrics on http://{host}:{port}/api/v1/metrics")
+    return server
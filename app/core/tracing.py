@@ -0,0 +1,145 @@
+import contextvars
+import json
+import logging
+import os
+import threading
+from contextlib import contextmanager, nullcontext
+from typing import Dict, List, Optional
+
+import time
+
+logger = logging.getLogger('dockdns.core.tracing')
+
+# Correlates every span of one Docker event (e.g. "start:1a2b3c4d5e6f:1718000000123456789")
+CORRELATION_ID: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar('dockdns_correlation_id',
+                                                                               default=None)
+
+_DISABLED = nullcontext()
+
+
+class Tracer:
+    """
+    Opt-in spans written as Chrome trace JSON (open in Perfetto or chrome://tracing).
+
+    Disabled by default, in which case ``span`` returns a shared no-op context manager. Once enabled,
+    finished spans are buffered and every ``max_events`` of them go to a new ``<path>-NNNN.json``;
+    only the newest ``max_files`` files are kept.
+    """
+
+    def __init__(self):
+        self.path: Optional[str] = None
+        self.max_events = 100_000
+        self.max_files = 5
+        self._events: List[dict] = []
+        self._thread_names: Dict[int, str] = {}
+        self._sequence = 0
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.path is not None
+
+    def configure(self, path: Optional[str], max_events: int = 100_000, max_files: int = 5):
+        self.flush()
+        self.path = path or None
+        self.max_events = max(max_events, 1)
+        self.max_files = max(max_files, 1)
+        if self.path:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            logger.info(f"Tracing enabled, writing Chrome traces to {self._file(0)}")
+
+    def span(self, name: str, **attributes):
+        if self.path is None:
+            return _DISABLED
+        return self._span(name, attributes)
+
+    @contextmanager
+    def _span(self, name: str, attributes: dict):
+        correlation_id = CORRELATION_ID.get()
+        if correlation_id:
+            attributes['correlation_id'] = correlation_id
+        started = time.time_ns()
+        try:
+            yield
+        except BaseException as e:
+            attributes['error'] = repr(e)
+            raise
+        finally:
+            self._record(name, started, time.time_ns() - started, attributes)
+
+    def _record(self, name: str, started: int, duration: int, attributes: dict):
+        thread = threading.current_thread()
+        event = {'name': name, 'cat': 'dockdns', 'ph': 'X', 'ts': started / 1000, 'dur': duration / 1000,
+                 'pid': os.getpid(), 'tid': thread.ident, 'args': attributes}
+        with self._lock:
+            self._events.append(event)
+            self._thread_names.setdefault(thread.ident, thread.name)
+            if len(self._events) < self.max_events:
+                return
+            batch = self._take()
+        threading.Thread(name='TraceWriter', target=self._write, args=batch, daemon=True).start()
+
+    def _take(self):
+        """Swaps out the buffered events; caller holds the lock"""
+        events, self._events = self._events, []
+        thread_names, self._thread_names = self._thread_names, {}
+        sequence = self._sequence
+        self._sequence += 1
+        return events, thread_names, sequence
+
+    def _file(self, sequence: int) -> str:
+        root, ext = os.path.splitext(self.path)
+        return f"{root}-{sequence:04d}{ext or '.json'}"
+
+    def _write(self, events: List[dict], thread_names: Dict[int, str], sequence: int):
+        pid = os.getpid()
+        metadata = [{'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid, 'args': {'name': name}}
+                    for tid, name in thread_names.items()]
+        path = self._file(sequence)
+        try:
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump({'traceEvents': metadata + events, 'displayTimeUnit': 'ms'}, f)
+            os.replace(tmp_path, path)
+            stale = self._file(sequence - self.max_files)
+            if sequence >= self.max_files and os.path.exists(stale):
+                os.remove(stale)
+        except Exception as e:
+            logger.warning(f"Failed to write trace file {path}: {e}")
+
+    def flush(self):
+        """Writes the buffered spans to the next trace file, e.g. on shutdown"""
+        with self._lock:
+            if not self.path or not self._events:
+                return
+            batch = self._take()
+        self._write(*batch)
+
+
+TRACER = Tracer()
+
+
+def span(name: str, **attributes):
+    """``with span('pihole.add', hostname=...)``: a no-op unless tracing was configured"""
+    return TRACER.span(name, **attributes)
+
+
+@contextmanager
+def correlate(correlation_id: Optional[str]):
+    """Tags every span opened in this context (thread or task) with ``correlation_id``"""
+    token = CORRELATION_ID.set(correlation_id)
+    try:
+        yield
+    finally:
+        CORRELATION_ID.reset(token)
+
+
+def event_correlation_id(container_id: str, action: str, event: Optional[dict] = None) -> str:
+    time_nano = (event or {}).get('timeNano') or (event or {}).get('time') or ''
+    return f"{action}:{container_id[:12]}:{time_nano}"
+
+
+async def in_context(coro, correlation_id: Optional[str]):
+    """Runs ``coro`` (e.g. on another thread's event loop) with the caller's correlation id"""
+    CORRELATION_ID.set(correlation_id)
+    return await coro
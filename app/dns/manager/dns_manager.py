@@ -0,0 +1,50 @@
+import logging
+from abc import ABC, abstractmethod
+from typing import Dict, List, Tuple
+
+logger = logging.getLogger('dns.manager.dns_manager')
+
+Record = Tuple[str, str]
+
+DNS_BACKENDS = ('pihole', 'hosts')
+
+
+class DNSManager(ABC):
+    """
+    Where DockDNS publishes ``(hostname, ip)`` records; the monitor and DNSReconciler only use this API.
+
+    Implementations: ``PiHoleDNSManager`` (Pi-hole HTTP API) and ``HostsFileDNSManager`` (a hosts or
+    addn-hosts file read by dnsmasq or CoreDNS). Bulk methods return one success flag per record.
+    """
+
+    @abstractmethod
+    def add_dns_records(self, records: List[Record]) -> List[bool]:
+        pass
+
+    @abstractmethod
+    def remove_dns_records(self, records: List[Record]) -> List[bool]:
+        pass
+
+    @abstractmethod
+    def has_dns_record(self, hostname: str, ip: str) -> bool:
+        """Whether ``hostname`` already resolves to ``ip``; False if that cannot be determined"""
+
+    @abstractmethod
+    def fetch_dns_records(self, force: bool = True) -> List[Dict[str, str]]:
+        """Every record served, as ``{'ip', 'domain'}`` dicts; raises if they cannot be read"""
+
+    def add_dns_record(self, hostname: str, ip: str) -> bool:
+        return self.add_dns_records([(hostname, ip)])[0]
+
+    def remove_dns_record(self, hostname: str, ip: str) -> bool:
+        return self.remove_dns_records([(hostname, ip)])[0]
+
+    def get_dns_records(self) -> List[Dict[str, str]]:
+        try:
+            return self.fetch_dns_records(force=False)
+        except Exception as e:
+            logger.error(f"Failed to get DNS records: {e}")
+            return []
+
+    def close(self):
+        pass
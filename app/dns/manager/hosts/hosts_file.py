@@ -0,0 +1,209 @@
+import logging
+import os
+import shlex
+import signal
+import subprocess
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import fcntl
+
+from core.tracing import span
+from dns.manager.dns_manager import DNSManager, Record
+
+logger = logging.getLogger('dns.manager.hosts_file')
+
+# (action, hostname, ip) with action 'add' or 'remove'
+HostChange = Tuple[str, str, str]
+
+HEADER = '# Managed by DockDNS'
+
+# Seconds before a failed write is retried
+WRITE_RETRY_DELAY = 5.0
+
+
+def parse_hosts(hosts: Iterable[str]) -> List[Record]:
+    """Hosts-file entries (``"ip name [name...]"``) as one ``(hostname, ip)`` record per name"""
+    records = []
+    for entry in hosts:
+        parts = entry.split('#', 1)[0].split()
+        records += [(name, parts[0]) for name in parts[1:]]
+    return records
+
+
+def apply_host_changes(hosts: List[str], changes: Iterable[HostChange]) -> List[str]:
+    """
+    ``hosts`` after ``changes`` in order. Untouched entries and comments keep their exact text, so
+    entries added by hand survive; an entry whose last name is removed is dropped.
+    """
+    entries = [[entry, entry.split('#', 1)[0].split()] for entry in hosts]
+    for action, hostname, ip in changes:
+        matching = [entry for entry in entries if entry[1][:1] == [ip] and hostname in entry[1][1:]]
+        if action == 'add' and not matching:
+            entries.append([None, [ip, hostname]])
+        elif action == 'remove':
+            for entry in matching:
+                entry[0], entry[1] = None, [part for part in entry[1] if part != hostname]
+    return [text if text is not None else ' '.join(parts) for text, parts in entries
+            if text is not None or len(parts) > 1]
+
+
+def read_hosts(path: str) -> List[str]:
+    try:
+        with open(path, 'r') as f:
+            return f.read().splitlines()
+    except FileNotFoundError:
+        return []
+
+
+class HostsFileDNSManager(DNSManager):
+    """
+    Serves records from a hosts-syntax file, e.g. a dnsmasq ``addn-hosts`` file or the file of the
+    CoreDNS ``hosts`` plugin.
+
+    Changes are applied to the in-memory view at once and written behind: ``write_delay`` seconds after
+    the first pending change, a background thread writes all pending changes with one file replace and
+    reloads the DNS server once, so a burst of events costs a single write. Before each write the file
+    is re-read under an flock and only our changes are applied to it, so entries of other writers
+    (another DockDNS instance, hand edits) survive. The reload is a SIGHUP to the pid in
+    ``reload_pid_file`` (dnsmasq) and/or ``reload_command``; CoreDNS picks up the new file by itself.
+    """
+
+    def __init__(self, path: str, write_delay: float = 0.5, reload_pid_file: Optional[str] = None,
+                 reload_command: Optional[str] = None):
+        self.path = path
+        self.write_delay = write_delay
+        self.reload_pid_file = reload_pid_file or None
+        self.reload_command = reload_command or None
+        self.writes = 0
+        self.reloads = 0
+        self.queued_changes = 0
+        self._records: Set[Record] = set()
+        self._pending: List[HostChange] = []
+        self._due_at: Optional[float] = None
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._running = True
+        self._load()
+        self._thread = threading.Thread(name='HostsFileWriter', target=self._run, daemon=True)
+        self._thread.start()
+
+    def stats(self) -> dict:
+        return {'pending': len(self._pending), 'writes': self.writes, 'reloads': self.reloads,
+                'queued_changes': self.queued_changes}
+
+    @contextmanager
+    def _locked(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with open(f"{self.path}.lock", 'a') as lock:
+            fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock.fileno(), fcntl.LOCK_UN)
+
+    def _load(self):
+        """Re-reads the file; changes not written yet stay applied on top"""
+        with self._flush_lock:
+            with self._locked():
+                hosts = read_hosts(self.path)
+            with self._cond:
+                self._records = set(parse_hosts(apply_host_changes(hosts, self._pending)))
+
+    def _change(self, action: str, records: List[Record]) -> List[bool]:
+        records = list(records)
+        with self._cond:
+            for hostname, ip in records:
+                self._pending.append((action, hostname, ip))
+                if action == 'add':
+                    self._records.add((hostname, ip))
+                else:
+                    self._records.discard((hostname, ip))
+            self.queued_changes += len(records)
+            if records and self._due_at is None:
+                self._due_at = time.monotonic() + self.write_delay
+                self._cond.notify()
+        return [True] * len(records)
+
+    def add_dns_records(self, records: List[Record]) -> List[bool]:
+        return self._change('add', records)
+
+    def remove_dns_records(self, records: List[Record]) -> List[bool]:
+        return self._change('remove', records)
+
+    def has_dns_record(self, hostname: str, ip: str) -> bool:
+        with self._cond:
+            return (hostname, ip) in self._records
+
+    def fetch_dns_records(self, force: bool = True) -> List[Dict[str, str]]:
+        if force:
+            self._load()
+        with self._cond:
+            records = sorted(self._records)
+        return [{'ip': ip, 'domain': hostname} for hostname, ip in records]
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._running and (self._due_at is None or time.monotonic() < self._due_at):
+                    timeout = None if self._due_at is None else self._due_at - time.monotonic()
+                    self._cond.wait(timeout=None if timeout is None else max(timeout, 0.01))
+                if not self._running:
+                    return
+            self.flush()
+
+    def _write(self, hosts: List[str]):
+        tmp_file = f"{self.path}.tmp"
+        with open(tmp_file, 'w') as f:
+            f.write('\n'.join(hosts) + '\n')
+        os.replace(tmp_file, self.path)
+        self.writes += 1
+
+    def _reload(self):
+        try:
+            if self.reload_pid_file:
+                with open(self.reload_pid_file, 'r') as f:
+                    os.kill(int(f.read().strip()), signal.SIGHUP)
+            if self.reload_command:
+                subprocess.run(shlex.split(self.reload_command), check=True, capture_output=True, timeout=30)
+            if self.reload_pid_file or self.reload_command:
+                self.reloads += 1
+        except Exception as e:
+            logger.warning(f"Failed to reload the DNS server after writing {self.path}: {e}")
+
+    def flush(self):
+        """Writes all pending changes now, and reloads the DNS server if the file changed"""
+        with self._flush_lock:
+            with self._cond:
+                changes, self._pending, self._due_at = self._pending, [], None
+            if not changes:
+                return
+            try:
+                with span('hosts_file.write', changes=len(changes)), self._locked():
+                    hosts = read_hosts(self.path)
+                    updated = apply_host_changes(hosts or [HEADER], changes)
+                    if updated != hosts:
+                        self._write(updated)
+            except Exception as e:
+                logger.warning(f"Failed to write {len(changes)} DNS record changes to {self.path}, will retry: {e}")
+                with self._cond:
+                    self._pending[:0] = changes
+                    self._due_at = time.monotonic() + WRITE_RETRY_DELAY
+                return
+            with self._cond:
+                # Picks up entries written by others since the last read
+                self._records = set(parse_hosts(apply_host_changes(updated, self._pending)))
+        if updated != hosts:
+            logger.info(f"Wrote {len(changes)} DNS record changes to {self.path} "
+                        f"({len(hosts)} -> {len(updated)} lines)")
+            self._reload()
+
+    def close(self):
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+        self._thread.join()
+        self.flush()
+        logger.info(f"Hosts file {self.path}: {self.stats()}")
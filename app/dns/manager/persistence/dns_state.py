@@ -3,8 +3,9 @@ import json
 import logging
 import os
 import socket
+from contextlib import contextmanager
 from dataclasses import dataclass
-from typing import Dict
+from typing import Dict, Iterable, Tuple
 
 import fcntl
 import time
@@ -13,6 +14,8 @@ from dns.manager.pihole.pihole_client import DNSRecord
 
 logger = logging.getLogger('dns.manager.dns_state')
 
+Record = Tuple[str, str]
+
 
 def _generate_instance_id(self) -> str:
     hostname = socket.gethostname()
@@ -30,50 +33,187 @@ class SharedState:
     records: list[DNSRecord]
 
 
-def _save_shared_state(self, shared_state: Dict):
-    """Save the shared state file with file locking"""
-    try:
-        os.makedirs(self.state_dir, exist_ok=True)
-        shared_state['last_updated'] = time.time()
-
-        with open(self.state_file, 'w') as f:
-            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
-            json.dump(shared_state, f, indent=2)
-    except Exception as e:
-        logger.warning(f"Failed to save shared state to {self.state_file}: {e}")
-
-
-def _load_state(self):
-    """Load this instance's records from shared state"""
-    try:
-        shared_state = self._load_shared_state()
-        instance_data = shared_state.get('instances', {}).get(self.instance_id, {})
+def _empty_state() -> Dict:
+    return {'instances': {}, 'last_updated': time.time()}
 
-        self.container_dns_records = {}
-        for container_id, record_data in instance_data.get('records', {}).items():
-            self.container_dns_records[container_id] = tuple(record_data)
 
-        logger.info(f"Loaded {len(self.container_dns_records)} DNS records for instance {self.instance_id}")
-    except Exception as e:
-        logger.warning(f"Failed to load state for instance {self.instance_id}: {e}")
+def _dumps(obj) -> str:
+    return json.dumps(obj, separators=(',', ':'))
 
 
-def _save_state(self):
-    """Save this instance's records to shared state"""
+def _same_file(fd: int, path: str) -> bool:
     try:
-        shared_state = self._load_shared_state()
-
-        if 'instances' not in shared_state:
-            shared_state['instances'] = {}
-
-        shared_state['instances'][self.instance_id] = {
-            'hostname': socket.gethostname(),
-            'base_domain': self.base_domain,
-            'env_prefix': self.env_prefix,
-            'last_seen': time.time(),
-            'records': {k: list(v) for k, v in self.container_dns_records.items()}
-        }
-
-        self._save_shared_state(shared_state)
-    except Exception as e:
-        logger.warning(f"Failed to save state for instance {self.instance_id}: {e}")
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return False
+    opened = os.fstat(fd)
+    return (stat.st_dev, stat.st_ino) == (opened.st_dev, opened.st_ino)
+
+
+def apply_journal_entry(state: Dict, entry: list):
+    """
+    Replays one journal entry onto ``state``.
+
+    Every entry assigns an absolute value, so replaying entries that are already part of the
+    snapshot (e.g. after a crash between snapshot rename and journal truncation) is harmless.
+    """
+    op, instance_id, ts = entry[0], entry[1], entry[-1]
+    instances = state.setdefault('instances', {})
+    if op == 'X':
+        instances.pop(instance_id, None)
+    else:
+        instance = instances.setdefault(instance_id, {'records': {}})
+        if op == 'I':
+            instance.update(entry[2])
+            instance['records'] = {k: list(v) for k, v in entry[3].items()}
+        elif op == 'P':
+            instance.setdefault('records', {})[entry[2]] = [entry[3], entry[4]]
+        elif op == 'D':
+            instance.setdefault('records', {}).pop(entry[2], None)
+        elif op != 'H':
+            raise ValueError(f"Unknown journal op {op!r}")
+        instance['last_seen'] = ts
+    state['last_updated'] = ts
+
+
+class SharedStateStore:
+    """
+    Multi-instance state kept as a compact JSON snapshot plus an append-only journal.
+
+    Every record change appends one short line (O(1) per event) instead of rewriting the whole
+    file. Loading replays the journal over the snapshot; once the journal grows past
+    ``max_journal_bytes`` it is folded into a new snapshot written to a temp file and renamed
+    into place. All access is serialized through a separate lock file, so readers never see a
+    truncated snapshot. The snapshot keeps the format of the original ``dockdns-shared-state.json``.
+    """
+
+    def __init__(self, state_dir: str, name: str = 'dockdns-shared-state', max_journal_bytes: int = 1024 * 1024):
+        self.state_dir = state_dir
+        self.snapshot_file = os.path.join(state_dir, f"{name}.json")
+        self.journal_file = os.path.join(state_dir, f"{name}.journal")
+        self.lock_file = os.path.join(state_dir, f"{name}.lock")
+        self.max_journal_bytes = max_journal_bytes
+        self.bytes_written = 0
+
+    @contextmanager
+    def _locked(self, mode: int):
+        os.makedirs(self.state_dir, exist_ok=True)
+        while True:
+            with open(self.lock_file, 'a') as lock:
+                fcntl.flock(lock.fileno(), mode)
+                try:
+                    # destroy() may have removed the lock file while we waited for it; then lock the new one
+                    if _same_file(lock.fileno(), self.lock_file):
+                        yield
+                        return
+                finally:
+                    fcntl.flock(lock.fileno(), fcntl.LOCK_UN)
+
+    def _read(self) -> Dict:
+        state = _empty_state()
+        if os.path.exists(self.snapshot_file):
+            with open(self.snapshot_file, 'r') as f:
+                state = json.load(f)
+        if os.path.exists(self.journal_file):
+            with open(self.journal_file, 'r') as f:
+                for line_no, line in enumerate(f, 1):
+                    if not line.strip():
+                        continue
+                    try:
+                        apply_journal_entry(state, json.loads(line))
+                    except (ValueError, IndexError) as e:
+                        # A torn last line after a crash is expected, anything else is worth a warning
+                        logger.warning(f"Skipping unreadable journal entry {self.journal_file}:{line_no}: {e}")
+        return state
+
+    def load(self) -> Dict:
+        """Loads the full multi-instance state (snapshot + journal replay)"""
+        try:
+            with self._locked(fcntl.LOCK_SH):
+                return self._read()
+        except Exception as e:
+            logger.warning(f"Failed to load shared state from {self.snapshot_file}: {e}")
+            return _empty_state()
+
+    def load_instance(self, instance_id: str) -> Dict[str, Record]:
+        instance = self.load().get('instances', {}).get(instance_id, {})
+        return {k: tuple(v) for k, v in instance.get('records', {}).items()}
+
+    def _append(self, *entries: list):
+        line = ''.join(_dumps(entry) + '\n' for entry in entries)
+        with self._locked(fcntl.LOCK_EX):
+            with open(self.journal_file, 'a+') as f:
+                size = f.seek(0, os.SEEK_END)
+                if size:
+                    # Don't glue this entry onto a torn line left behind by a crash
+                    f.seek(size - 1)
+                    if f.read(1) != '\n':
+                        line = '\n' + line
+                f.write(line)
+                size = f.tell()
+            self.bytes_written += len(line)
+            if size > self.max_journal_bytes:
+                self._compact()
+
+    def save_instance(self, instance_id: str, meta: Dict, records: Dict[str, Record]):
+        """Replaces one instance's metadata and records, O(records of that instance)"""
+        self._append(['I', instance_id, meta, {k: list(v) for k, v in records.items()}, time.time()])
+
+    def put_record(self, instance_id: str, container_id: str, hostname: str, ip: str):
+        self._append(['P', instance_id, container_id, hostname, ip, time.time()])
+
+    def delete_record(self, instance_id: str, container_id: str):
+        self._append(['D', instance_id, container_id, time.time()])
+
+    def update_records(self, instance_id: str, records: Dict[str, Record], deleted: Iterable[str]):
+        """Appends every put and delete under one lock"""
+        now = time.time()
+        entries = [['P', instance_id, container_id, hostname, ip, now]
+                   for container_id, (hostname, ip) in records.items()]
+        entries += [['D', instance_id, container_id, now] for container_id in deleted]
+        if entries:
+            self._append(*entries)
+
+    def heartbeat(self, instance_id: str):
+        self._append(['H', instance_id, time.time()])
+
+    def drop_instance(self, instance_id: str):
+        self._append(['X', instance_id, time.time()])
+
+    def replace_instance(self, instance_id: str, meta: Dict, records: Dict[str, Record]):
+        """Rewrites the snapshot with one instance replaced (temp file + rename) and truncates the journal"""
+        with self._locked(fcntl.LOCK_EX):
+            state = self._read()
+            apply_journal_entry(state, ['I', instance_id, meta, {k: list(v) for k, v in records.items()},
+                                        time.time()])
+            self._write_snapshot(state)
+
+    def destroy(self):
+        """Deletes the snapshot, journal and lock file while holding the lock, so no writer is mid-update"""
+        with self._locked(fcntl.LOCK_EX):
+            for path in (self.snapshot_file, self.journal_file, self.lock_file):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+    def compact(self):
+        with self._locked(fcntl.LOCK_EX):
+            self._compact()
+
+    def _compact(self):
+        """Folds the journal into a new snapshot; caller must hold the exclusive lock"""
+        data = self._write_snapshot(self._read())
+        logger.info(f"Compacted shared state journal into {self.snapshot_file} ({len(data)} bytes)")
+
+    def _write_snapshot(self, state: Dict) -> str:
+        data = _dumps(state)
+        tmp_file = f"{self.snapshot_file}.tmp"
+        with open(tmp_file, 'w') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, self.snapshot_file)
+        open(self.journal_file, 'w').close()
+        self.bytes_written += len(data)
+        return data
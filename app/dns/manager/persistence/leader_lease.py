@@ -0,0 +1,95 @@
+import json
+import logging
+import os
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+import fcntl
+
+logger = logging.getLogger('dns.manager.leader_lease')
+
+LEASE_FILE = 'cleanup-leader.lease'
+
+
+class LeaderLease:
+    """
+    File lease in ``STATE_DIR`` electing one holder at a time, e.g. the instance that sweeps dead peers.
+
+    The lease file holds ``{"holder", "expires_at"}`` and is only read and rewritten under an exclusive
+    flock. ``try_acquire`` takes the lease when it is free or expired and renews it (another ``ttl``
+    seconds) when we already hold it, so the holder has to call it well within ``ttl``; a crashed
+    holder is replaced once its lease expires.
+    """
+
+    def __init__(self, state_dir: str, holder: str, ttl: float = 180.0, name: str = LEASE_FILE):
+        self.path = os.path.join(state_dir, name)
+        self.holder = holder
+        self.ttl = ttl
+        self.expires_at = 0.0
+
+    @contextmanager
+    def _locked(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(f"{self.path}.lock", 'a') as lock:
+            fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock.fileno(), fcntl.LOCK_UN)
+
+    def _read(self) -> Dict:
+        try:
+            with open(self.path, 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable leader lease {self.path}: {e}")
+            return {}
+
+    def _write(self, lease: Dict):
+        tmp_file = f"{self.path}.tmp"
+        with open(tmp_file, 'w') as f:
+            json.dump(lease, f)
+        os.replace(tmp_file, self.path)
+
+    @property
+    def is_leader(self) -> bool:
+        return time.time() < self.expires_at
+
+    def current_holder(self) -> Optional[str]:
+        lease = self._read()
+        return lease.get('holder') if lease.get('expires_at', 0) > time.time() else None
+
+    def try_acquire(self) -> bool:
+        """Acquires or renews the lease; False while another holder's lease is still valid"""
+        was_leader = self.is_leader
+        try:
+            with self._locked():
+                lease = self._read()
+                now = time.time()
+                if lease.get('holder') not in (None, self.holder) and lease.get('expires_at', 0) > now:
+                    self.expires_at = 0.0
+                else:
+                    self.expires_at = now + self.ttl
+                    self._write({'holder': self.holder, 'expires_at': self.expires_at})
+        except Exception as e:
+            logger.warning(f"Failed to renew leader lease {self.path}: {e}")
+            # Keep acting on a lease we still hold locally, never on one we cannot confirm
+        if self.is_leader and not was_leader:
+            logger.info(f"Instance {self.holder} is now the cleanup leader")
+        elif was_leader and not self.is_leader:
+            logger.info(f"Instance {self.holder} lost the cleanup leadership")
+        return self.is_leader
+
+    def release(self):
+        if not self.is_leader:
+            return
+        try:
+            with self._locked():
+                if self._read().get('holder') == self.holder:
+                    os.remove(self.path)
+        except Exception as e:
+            logger.warning(f"Failed to release leader lease {self.path}: {e}")
+        self.expires_at = 0.0
@@ -0,0 +1,194 @@
+import json
+import logging
+import os
+import re
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional
+
+import fcntl
+
+from dns.manager.persistence.dns_state import SharedStateStore
+from dns.manager.persistence.state_store import Record, StateStore
+
+logger = logging.getLogger('dns.manager.sharded_state')
+
+INDEX_FILE = 'index.json'
+LEASE_SUFFIX = '.lease'
+
+
+def _shard_name(instance_id: str) -> str:
+    return re.sub(r'[^A-Za-z0-9_.-]', '_', instance_id)
+
+
+class ShardedStateStore(StateStore):
+    """
+    One journaled state shard per instance under ``STATE_DIR/instances``.
+
+    An instance only ever locks and writes its own shard, so hosts no longer contend on a single
+    file. Liveness is a lease file whose mtime is bumped by ``heartbeat`` (no rewrite of any
+    records), and dead instances are found by stat'ing the lease files. ``index.json`` keeps the
+    small per-instance metadata (hostname, base domain, env prefix) so nobody has to open other
+    instances' shards to list them.
+    """
+
+    def __init__(self, state_dir: str, max_journal_bytes: int = 1024 * 1024):
+        self.state_dir = state_dir
+        self.shard_dir = os.path.join(state_dir, 'instances')
+        self.index_file = os.path.join(self.shard_dir, INDEX_FILE)
+        self.max_journal_bytes = max_journal_bytes
+        self._shards: Dict[str, SharedStateStore] = {}
+        self._index_cache: Dict[str, Dict] = {}
+        self._migrate_legacy_state()
+
+    @property
+    def bytes_written(self) -> int:
+        return sum(shard.bytes_written for shard in self._shards.values())
+
+    def _shard(self, instance_id: str) -> SharedStateStore:
+        shard = self._shards.get(instance_id)
+        if shard is None:
+            shard = SharedStateStore(self.shard_dir, _shard_name(instance_id), self.max_journal_bytes)
+            self._shards[instance_id] = shard
+        return shard
+
+    def _lease_file(self, instance_id: str) -> str:
+        return os.path.join(self.shard_dir, f"{_shard_name(instance_id)}{LEASE_SUFFIX}")
+
+    @contextmanager
+    def _index_locked(self):
+        os.makedirs(self.shard_dir, exist_ok=True)
+        with open(f"{self.index_file}.lock", 'a') as lock:
+            fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock.fileno(), fcntl.LOCK_UN)
+
+    def _read_index(self) -> Dict[str, Dict]:
+        try:
+            with open(self.index_file, 'r') as f:
+                return json.load(f).get('instances', {})
+        except FileNotFoundError:
+            return {}
+
+    def _write_index(self, instances: Dict[str, Dict]):
+        tmp_file = f"{self.index_file}.tmp"
+        with open(tmp_file, 'w') as f:
+            json.dump({'instances': instances}, f, separators=(',', ':'))
+        os.replace(tmp_file, self.index_file)
+
+    def _register(self, instance_id: str, meta: Dict):
+        if self._index_cache.get(instance_id) == meta:
+            return
+        with self._index_locked():
+            instances = self._read_index()
+            if instances.get(instance_id) != meta:
+                instances[instance_id] = meta
+                self._write_index(instances)
+        self._index_cache[instance_id] = meta
+
+    def _migrate_legacy_state(self):
+        """Splits a pre-sharding dockdns-shared-state.json (+ journal) into per-instance shards once"""
+        legacy = SharedStateStore(self.state_dir)
+        if os.path.exists(self.index_file) or not os.path.exists(legacy.snapshot_file):
+            return
+        with self._index_locked():
+            if os.path.exists(self.index_file):
+                return
+            state = legacy.load()
+            index = {}
+            for instance_id, data in state.get('instances', {}).items():
+                meta = {k: v for k, v in data.items() if k not in ('records', 'last_seen')}
+                records = {k: tuple(v) for k, v in data.get('records', {}).items()}
+                self._shard(instance_id).save_instance(_shard_name(instance_id), meta, records)
+                self.heartbeat(instance_id)
+                last_seen = data.get('last_seen', 0)
+                os.utime(self._lease_file(instance_id), (last_seen, last_seen))
+                index[instance_id] = meta
+            self._write_index(index)
+        logger.info(f"Migrated {len(index)} instances from {legacy.snapshot_file} "
+                    f"into per-instance shards in {self.shard_dir}")
+
+    def register(self, instance_id: str, meta: Dict):
+        """Publishes the instance metadata in the index and takes the lease"""
+        self._register(instance_id, meta)
+        self.heartbeat(instance_id)
+
+    def heartbeat(self, instance_id: str):
+        """Bumps the lease mtime; no records are read or rewritten"""
+        lease_file = self._lease_file(instance_id)
+        try:
+            os.utime(lease_file)
+        except FileNotFoundError:
+            os.makedirs(self.shard_dir, exist_ok=True)
+            open(lease_file, 'a').close()
+
+    def last_seen(self, instance_id: str) -> Optional[float]:
+        try:
+            return os.stat(self._lease_file(instance_id)).st_mtime
+        except FileNotFoundError:
+            return None
+
+    def inactive_instances(self, threshold: float, exclude: Optional[str] = None) -> List[str]:
+        """Instances whose lease was not renewed for ``threshold`` seconds, found by stat'ing lease files"""
+        index = self._read_index()
+        by_shard = {_shard_name(instance_id): instance_id for instance_id in index}
+        now = time.time()
+        inactive = []
+        try:
+            entries = list(os.scandir(self.shard_dir))
+        except FileNotFoundError:
+            return []
+        for entry in entries:
+            if not entry.name.endswith(LEASE_SUFFIX):
+                continue
+            instance_id = by_shard.get(entry.name[:-len(LEASE_SUFFIX)], entry.name[:-len(LEASE_SUFFIX)])
+            if instance_id != exclude and now - entry.stat().st_mtime > threshold:
+                inactive.append(instance_id)
+        return inactive
+
+    def load(self) -> Dict:
+        """Assembles the full multi-instance state; only needed for inspection, not on the event path"""
+        instances = {}
+        for instance_id, meta in self._read_index().items():
+            data = dict(meta)
+            data['records'] = {k: list(v) for k, v in self.load_instance(instance_id).items()}
+            data['last_seen'] = self.last_seen(instance_id) or 0
+            instances[instance_id] = data
+        return {'instances': instances, 'last_updated': time.time()}
+
+    def load_instance(self, instance_id: str) -> Dict[str, Record]:
+        return self._shard(instance_id).load_instance(_shard_name(instance_id))
+
+    def save_instance(self, instance_id: str, meta: Dict, records: Dict[str, Record]):
+        """Rewrites the instance's shard snapshot atomically; a shard only holds that one instance"""
+        self._register(instance_id, meta)
+        self._shard(instance_id).replace_instance(_shard_name(instance_id), meta, records)
+        self.heartbeat(instance_id)
+
+    def put_record(self, instance_id: str, container_id: str, hostname: str, ip: str):
+        self._shard(instance_id).put_record(_shard_name(instance_id), container_id, hostname, ip)
+        self.heartbeat(instance_id)
+
+    def delete_record(self, instance_id: str, container_id: str):
+        self._shard(instance_id).delete_record(_shard_name(instance_id), container_id)
+        self.heartbeat(instance_id)
+
+    def update_records(self, instance_id: str, records: Dict[str, Record], deleted: Iterable[str]):
+        self._shard(instance_id).update_records(_shard_name(instance_id), records, deleted)
+        self.heartbeat(instance_id)
+
+    def drop_instance(self, instance_id: str):
+        """Removes an instance's shard under its lock, so a write it still has in flight completes first"""
+        shard = self._shards.pop(instance_id, None) or SharedStateStore(self.shard_dir, _shard_name(instance_id))
+        shard.destroy()
+        try:
+            os.remove(self._lease_file(instance_id))
+        except FileNotFoundError:
+            pass
+        with self._index_locked():
+            instances = self._read_index()
+            if instances.pop(instance_id, None) is not None:
+                self._write_index(instances)
+        self._index_cache.pop(instance_id, None)
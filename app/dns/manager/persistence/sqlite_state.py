@@ -0,0 +1,183 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from dns.manager.persistence.dns_state import SharedStateStore
+from dns.manager.persistence.state_store import Record, StateStore
+
+logger = logging.getLogger('dns.manager.sqlite_state')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS instances (
+    instance_id TEXT PRIMARY KEY,
+    meta TEXT NOT NULL DEFAULT '{}',
+    last_seen REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_instances_last_seen ON instances (last_seen);
+CREATE TABLE IF NOT EXISTS records (
+    instance_id TEXT NOT NULL,
+    container_id TEXT NOT NULL,
+    hostname TEXT NOT NULL,
+    ip TEXT NOT NULL,
+    updated REAL NOT NULL,
+    PRIMARY KEY (instance_id, container_id)
+);
+CREATE INDEX IF NOT EXISTS idx_records_hostname ON records (hostname);
+CREATE INDEX IF NOT EXISTS idx_records_container ON records (container_id);
+CREATE TABLE IF NOT EXISTS properties (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+class SqliteStateStore(StateStore):
+    """
+    State in a SQLite database in WAL mode, indexed by instance id, container id and hostname.
+
+    Every record change is a single-row upsert in its own transaction, and "who owns this hostname"
+    or "which instances are inactive" are index lookups. WAL relies on shared memory, so all
+    instances using the database must run on the same host; keep the file-based backend for state
+    shared over NFS/SMB.
+    """
+
+    def __init__(self, db_path: str, migrate_from: Optional[str] = None):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.executescript(SCHEMA)
+        if migrate_from:
+            self._migrate_json_state(migrate_from)
+
+    def _transaction(self, statements: List[Tuple[str, tuple]]):
+        with self._lock:
+            self._db.execute('BEGIN IMMEDIATE')
+            try:
+                for sql, params in statements:
+                    self._db.execute(sql, params)
+                self._db.execute('COMMIT')
+            except Exception:
+                self._db.execute('ROLLBACK')
+                raise
+
+    def _query(self, sql: str, params: tuple = ()) -> list:
+        with self._lock:
+            return self._db.execute(sql, params).fetchall()
+
+    @staticmethod
+    def _touch(instance_id: str, now: float) -> Tuple[str, tuple]:
+        return ("INSERT INTO instances (instance_id, last_seen) VALUES (?, ?) "
+                "ON CONFLICT (instance_id) DO UPDATE SET last_seen = excluded.last_seen", (instance_id, now))
+
+    def _migrate_json_state(self, state_dir: str):
+        """Imports the JSON state (sharded or the single shared file) once, into an empty database"""
+        if self._query("SELECT value FROM properties WHERE key = 'migrated_from'"):
+            return
+        from dns.manager.persistence.sharded_state import ShardedStateStore
+
+        if os.path.exists(os.path.join(state_dir, 'instances', 'index.json')):
+            source, state = 'instances/index.json', ShardedStateStore(state_dir).load()
+        elif os.path.exists(os.path.join(state_dir, 'dockdns-shared-state.json')):
+            source, state = 'dockdns-shared-state.json', SharedStateStore(state_dir).load()
+        else:
+            source, state = 'none', {'instances': {}}
+
+        statements = []
+        for instance_id, data in state.get('instances', {}).items():
+            meta = {k: v for k, v in data.items() if k not in ('records', 'last_seen')}
+            last_seen = data.get('last_seen', 0)
+            statements.append(("INSERT OR REPLACE INTO instances (instance_id, meta, last_seen) VALUES (?, ?, ?)",
+                               (instance_id, json.dumps(meta), last_seen)))
+            for container_id, (hostname, ip) in data.get('records', {}).items():
+                statements.append(("INSERT OR REPLACE INTO records VALUES (?, ?, ?, ?, ?)",
+                                   (instance_id, container_id, hostname, ip, last_seen)))
+        statements.append(("INSERT OR IGNORE INTO properties (key, value) VALUES ('migrated_from', ?)", (source,)))
+        self._transaction(statements)
+        if state.get('instances'):
+            logger.info(f"Migrated {len(state['instances'])} instances from {source} into {self.db_path}")
+
+    def load(self) -> Dict:
+        instances = {}
+        for instance_id, meta, last_seen in self._query("SELECT instance_id, meta, last_seen FROM instances"):
+            instances[instance_id] = {**json.loads(meta), 'last_seen': last_seen, 'records': {}}
+        for instance_id, container_id, hostname, ip in self._query(
+                "SELECT instance_id, container_id, hostname, ip FROM records"):
+            instances.setdefault(instance_id, {'records': {}})['records'][container_id] = [hostname, ip]
+        return {'instances': instances, 'last_updated': time.time()}
+
+    def load_instance(self, instance_id: str) -> Dict[str, Record]:
+        rows = self._query("SELECT container_id, hostname, ip FROM records WHERE instance_id = ?", (instance_id,))
+        return {container_id: (hostname, ip) for container_id, hostname, ip in rows}
+
+    def register(self, instance_id: str, meta: Dict):
+        self._transaction([
+            ("INSERT INTO instances (instance_id, meta, last_seen) VALUES (?, ?, ?) "
+             "ON CONFLICT (instance_id) DO UPDATE SET meta = excluded.meta, last_seen = excluded.last_seen",
+             (instance_id, json.dumps(meta), time.time())),
+        ])
+
+    def save_instance(self, instance_id: str, meta: Dict, records: Dict[str, Record]):
+        now = time.time()
+        statements = [
+            ("INSERT INTO instances (instance_id, meta, last_seen) VALUES (?, ?, ?) "
+             "ON CONFLICT (instance_id) DO UPDATE SET meta = excluded.meta, last_seen = excluded.last_seen",
+             (instance_id, json.dumps(meta), now)),
+            ("DELETE FROM records WHERE instance_id = ?", (instance_id,)),
+        ]
+        statements += [("INSERT INTO records VALUES (?, ?, ?, ?, ?)", (instance_id, container_id, hostname, ip, now))
+                       for container_id, (hostname, ip) in records.items()]
+        self._transaction(statements)
+
+    def put_record(self, instance_id: str, container_id: str, hostname: str, ip: str):
+        now = time.time()
+        self._transaction([
+            ("INSERT INTO records VALUES (?, ?, ?, ?, ?) ON CONFLICT (instance_id, container_id) "
+             "DO UPDATE SET hostname = excluded.hostname, ip = excluded.ip, updated = excluded.updated",
+             (instance_id, container_id, hostname, ip, now)),
+            self._touch(instance_id, now),
+        ])
+
+    def delete_record(self, instance_id: str, container_id: str):
+        now = time.time()
+        self._transaction([
+            ("DELETE FROM records WHERE instance_id = ? AND container_id = ?", (instance_id, container_id)),
+            self._touch(instance_id, now),
+        ])
+
+    def update_records(self, instance_id: str, records: Dict[str, Record], deleted: Iterable[str]):
+        now = time.time()
+        statements = [("INSERT INTO records VALUES (?, ?, ?, ?, ?) ON CONFLICT (instance_id, container_id) "
+                       "DO UPDATE SET hostname = excluded.hostname, ip = excluded.ip, updated = excluded.updated",
+                       (instance_id, container_id, hostname, ip, now))
+                      for container_id, (hostname, ip) in records.items()]
+        statements += [("DELETE FROM records WHERE instance_id = ? AND container_id = ?", (instance_id, container_id))
+                       for container_id in deleted]
+        self._transaction(statements + [self._touch(instance_id, now)])
+
+    def heartbeat(self, instance_id: str):
+        self._transaction([self._touch(instance_id, time.time())])
+
+    def inactive_instances(self, threshold: float, exclude: Optional[str] = None) -> List[str]:
+        rows = self._query("SELECT instance_id FROM instances WHERE last_seen < ? AND instance_id != ?",
+                           (time.time() - threshold, exclude or ''))
+        return [instance_id for (instance_id,) in rows]
+
+    def drop_instance(self, instance_id: str):
+        self._transaction([
+            ("DELETE FROM records WHERE instance_id = ?", (instance_id,)),
+            ("DELETE FROM instances WHERE instance_id = ?", (instance_id,)),
+        ])
+
+    def find_owners(self, hostname: str) -> List[Tuple[str, str, str]]:
+        return self._query("SELECT instance_id, container_id, ip FROM records WHERE hostname = ?", (hostname,))
+
+    def close(self):
+        with self._lock:
+            self._db.close()
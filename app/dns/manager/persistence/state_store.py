@@ -0,0 +1,89 @@
+import os
+from abc import ABC, abstractmethod
+from typing import Dict, Iterable, List, Optional, Tuple
+
+Record = Tuple[str, str]
+
+STATE_BACKENDS = ('file', 'sqlite')
+
+
+class StateStore(ABC):
+    """
+    Persistence of the records every DockDNS instance manages.
+
+    Implementations: ``ShardedStateStore`` (journaled files per instance, safe on NAS mounts) and
+    ``SqliteStateStore`` (indexed SQLite database in WAL mode).
+    """
+
+    @abstractmethod
+    def load(self) -> Dict:
+        """Full multi-instance state in the ``{'instances': {...}, 'last_updated': ...}`` shape"""
+
+    @abstractmethod
+    def load_instance(self, instance_id: str) -> Dict[str, Record]:
+        """``container_id -> (hostname, ip)`` of one instance"""
+
+    @abstractmethod
+    def register(self, instance_id: str, meta: Dict):
+        """Publishes instance metadata (hostname, base domain, env prefix) and marks it alive"""
+
+    @abstractmethod
+    def save_instance(self, instance_id: str, meta: Dict, records: Dict[str, Record]):
+        """Replaces all records of one instance"""
+
+    @abstractmethod
+    def put_record(self, instance_id: str, container_id: str, hostname: str, ip: str):
+        pass
+
+    @abstractmethod
+    def delete_record(self, instance_id: str, container_id: str):
+        pass
+
+    def update_records(self, instance_id: str, records: Dict[str, Record], deleted: Iterable[str]):
+        """Puts ``records`` and deletes the ``deleted`` container ids, O(changes) unlike ``save_instance``"""
+        for container_id, (hostname, ip) in records.items():
+            self.put_record(instance_id, container_id, hostname, ip)
+        for container_id in deleted:
+            self.delete_record(instance_id, container_id)
+
+    @abstractmethod
+    def heartbeat(self, instance_id: str):
+        pass
+
+    @abstractmethod
+    def inactive_instances(self, threshold: float, exclude: Optional[str] = None) -> List[str]:
+        """Instances not seen for ``threshold`` seconds"""
+
+    @abstractmethod
+    def drop_instance(self, instance_id: str):
+        pass
+
+    def find_owners(self, hostname: str) -> List[Tuple[str, str, str]]:
+        """``(instance_id, container_id, ip)`` of every record for ``hostname``"""
+        owners = []
+        for instance_id, data in self.load().get('instances', {}).items():
+            for container_id, (record_hostname, ip) in data.get('records', {}).items():
+                if record_hostname == hostname:
+                    owners.append((instance_id, container_id, ip))
+        return owners
+
+    def close(self):
+        pass
+
+
+def create_state_store(backend: str, state_dir: str, max_journal_bytes: int = 1024 * 1024,
+                       flush_interval: float = 0, flush_max_pending: int = 100) -> StateStore:
+    """Builds the configured backend, wrapped in a write-behind buffer when ``flush_interval > 0``"""
+    if backend == 'file':
+        from dns.manager.persistence.sharded_state import ShardedStateStore
+        store = ShardedStateStore(state_dir, max_journal_bytes=max_journal_bytes)
+    elif backend == 'sqlite':
+        from dns.manager.persistence.sqlite_state import SqliteStateStore
+        store = SqliteStateStore(os.path.join(state_dir, 'dockdns-state.db'), migrate_from=state_dir)
+    else:
+        raise ValueError(f"Unknown state backend {backend!r}, expected one of {', '.join(STATE_BACKENDS)}")
+
+    if flush_interval > 0:
+        from dns.manager.persistence.write_behind import WriteBehindStateStore
+        return WriteBehindStateStore(store, flush_interval=flush_interval, max_pending=flush_max_pending)
+    return store
@@ -0,0 +1,178 @@
+import logging
+import threading
+import time
+from typing import Dict, List, Optional, Set, Tuple
+
+from core.metrics import STATE_FLUSH_SECONDS
+from core.tracing import span
+from dns.manager.persistence.state_store import Record, StateStore
+
+logger = logging.getLogger('dns.manager.write_behind')
+
+
+class WriteBehindStateStore(StateStore):
+    """
+    Buffers record changes in memory and flushes them to the wrapped store in batches.
+
+    ``put_record``/``delete_record`` only update the in-memory records and mark the instance
+    dirty. A background thread flushes once ``max_pending`` changes piled up or the oldest change is
+    ``flush_interval`` seconds old, and ``close`` flushes whatever is left. Each dirty instance is
+    diffed against what was last flushed and only the records that differ go out, in one
+    ``update_records`` call (journal entries, O(changes)); an instance whose records ended up as
+    they were (e.g. a container that stopped and started again) is not written at all. Only a
+    ``save_instance`` since the last flush is written as a full replacement.
+    """
+
+    def __init__(self, store: StateStore, flush_interval: float = 2.0, max_pending: int = 100):
+        self.store = store
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.flushes = 0
+        self.skipped_flushes = 0
+        self.buffered_changes = 0
+        self._records: Dict[str, Dict[str, Record]] = {}
+        self._meta: Dict[str, Dict] = {}
+        self._flushed: Dict[str, Dict[str, Record]] = {}
+        self._replaced: Set[str] = set()
+        self._dirty: Dict[str, int] = {}
+        self._dirty_since: Optional[float] = None
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._running = True
+        self._thread = threading.Thread(name='StateFlushThread', target=self._run, daemon=True)
+        self._thread.start()
+
+    @property
+    def pending(self) -> int:
+        return sum(self._dirty.values())
+
+    def stats(self) -> dict:
+        return {'pending': self.pending, 'flushes': self.flushes, 'skipped_flushes': self.skipped_flushes,
+                'buffered_changes': self.buffered_changes}
+
+    def _tracked(self, instance_id: str) -> Dict[str, Record]:
+        """In-memory records of an instance we write to, loaded from the wrapped store on first use"""
+        records = self._records.get(instance_id)
+        if records is None:
+            records = dict(self.store.load_instance(instance_id))
+            self._records[instance_id] = records
+            if instance_id not in self._meta:
+                data = self.store.load().get('instances', {}).get(instance_id, {})
+                self._meta[instance_id] = {k: v for k, v in data.items() if k not in ('records', 'last_seen')}
+            self._flushed[instance_id] = dict(records)
+        return records
+
+    def _mark_dirty(self, instance_id: str):
+        self._dirty[instance_id] = self._dirty.get(instance_id, 0) + 1
+        self.buffered_changes += 1
+        if self._dirty_since is None:
+            self._dirty_since = time.monotonic()
+        self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._running and not self._due():
+                    timeout = None if self._dirty_since is None else \
+                        self._dirty_since + self.flush_interval - time.monotonic()
+                    self._cond.wait(timeout=None if timeout is None else max(timeout, 0.01))
+                if not self._running:
+                    return
+            self.flush()
+
+    def _due(self) -> bool:
+        if self._dirty_since is None:
+            return False
+        return self.pending >= self.max_pending or time.monotonic() - self._dirty_since >= self.flush_interval
+
+    def flush(self):
+        with self._flush_lock:
+            with self._cond:
+                dirty = list(self._dirty)
+                self._dirty.clear()
+                self._dirty_since = None
+                snapshot = [(i, i in self._replaced, dict(self._meta.get(i, {})), dict(self._records.get(i, {})))
+                            for i in dirty]
+                self._replaced.difference_update(dirty)
+            for instance_id, replaced, meta, records in snapshot:
+                flushed = self._flushed.get(instance_id, {})
+                changed = {container_id: record for container_id, record in records.items()
+                           if flushed.get(container_id) != record}
+                deleted = [container_id for container_id in flushed if container_id not in records]
+                if not replaced and not changed and not deleted:
+                    self.skipped_flushes += 1
+                    continue
+                try:
+                    with STATE_FLUSH_SECONDS.time(), span('state_flush', instance_id=instance_id):
+                        if replaced:
+                            self.store.save_instance(instance_id, meta, records)
+                        else:
+                            self.store.update_records(instance_id, changed, deleted)
+                    self._flushed[instance_id] = records
+                    self.flushes += 1
+                except Exception as e:
+                    logger.warning(f"Failed to flush state for instance {instance_id}, will retry: {e}")
+                    with self._cond:
+                        if replaced:
+                            self._replaced.add(instance_id)
+                        self._mark_dirty(instance_id)
+
+    def load(self) -> Dict:
+        self.flush()
+        return self.store.load()
+
+    def load_instance(self, instance_id: str) -> Dict[str, Record]:
+        with self._cond:
+            if instance_id in self._records:
+                return dict(self._records[instance_id])
+        return self.store.load_instance(instance_id)
+
+    def register(self, instance_id: str, meta: Dict):
+        with self._cond:
+            self._meta[instance_id] = dict(meta)
+        self.store.register(instance_id, meta)
+
+    def save_instance(self, instance_id: str, meta: Dict, records: Dict[str, Record]):
+        with self._cond:
+            self._tracked(instance_id)
+            self._meta[instance_id] = dict(meta)
+            self._records[instance_id] = dict(records)
+            self._replaced.add(instance_id)
+            self._mark_dirty(instance_id)
+
+    def put_record(self, instance_id: str, container_id: str, hostname: str, ip: str):
+        with self._cond:
+            self._tracked(instance_id)[container_id] = (hostname, ip)
+            self._mark_dirty(instance_id)
+
+    def delete_record(self, instance_id: str, container_id: str):
+        with self._cond:
+            self._tracked(instance_id).pop(container_id, None)
+            self._mark_dirty(instance_id)
+
+    def heartbeat(self, instance_id: str):
+        self.store.heartbeat(instance_id)
+
+    def inactive_instances(self, threshold: float, exclude: Optional[str] = None) -> List[str]:
+        return self.store.inactive_instances(threshold, exclude)
+
+    def drop_instance(self, instance_id: str):
+        with self._cond:
+            self._records.pop(instance_id, None)
+            self._dirty.pop(instance_id, None)
+            self._flushed.pop(instance_id, None)
+            self._replaced.discard(instance_id)
+        self.store.drop_instance(instance_id)
+
+    def find_owners(self, hostname: str) -> List[Tuple[str, str, str]]:
+        self.flush()
+        return self.store.find_owners(hostname)
+
+    def close(self):
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+        self._thread.join()
+        self.flush()
+        logger.info(f"State write-behind: {self.stats()}")
+        self.store.close()
@@ -0,0 +1,138 @@
+import asyncio
+import logging
+import random
+from typing import Iterable, List, Optional, Tuple
+
+import httpx
+
+from core.metrics import PIHOLE_ERRORS, PIHOLE_REQUEST_SECONDS, observe_call
+from core.tracing import span
+from dns.manager.pihole.config import PiHoleConfig
+from dns.manager.pihole.pihole_client import DNSRecord
+
+logger = logging.getLogger('dns.manager.async_pihole_client')
+
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class AsyncPiHoleClient:
+    """
+    Async counterpart of PiHoleClient with the same add/remove/get API.
+
+    A single pooled ``httpx.AsyncClient`` keeps connections alive, every request has a timeout,
+    at most ``max_concurrency`` requests are in flight, and transient failures are retried with
+    jittered exponential backoff.
+    """
+
+    def __init__(self, pihole_config: PiHoleConfig):
+        self.pihole_config = pihole_config
+        self.url = f"{pihole_config.url.rstrip('/')}/admin/scripts/pi-hole/php/customdns.php"
+        self.session = httpx.AsyncClient(
+            timeout=httpx.Timeout(pihole_config.timeout),
+            limits=httpx.Limits(max_connections=pihole_config.max_connections,
+                                max_keepalive_connections=pihole_config.max_connections),
+        )
+        self._semaphore = asyncio.Semaphore(pihole_config.max_concurrency)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+    async def aclose(self):
+        await self.session.aclose()
+
+    def _backoff_delay(self, attempt: int) -> float:
+        return random.uniform(0, min(self.pihole_config.backoff_max, self.pihole_config.backoff_base * 2 ** attempt))
+
+    async def _request(self, method: str, **kwargs) -> httpx.Response:
+        form = kwargs.get('data') or kwargs.get('params') or {}
+        operation = form.get('action', method.lower())
+        with observe_call(PIHOLE_REQUEST_SECONDS, PIHOLE_ERRORS, operation), \
+                span(f"pihole.{operation}", hostname=form.get('domain', '')):
+            return await self._send(method, **kwargs)
+
+    async def _send(self, method: str, url: Optional[str] = None, **kwargs) -> httpx.Response:
+        attempt = 0
+        while True:
+            try:
+                async with self._semaphore:
+                    response = await self.session.request(method, url or self.url, **kwargs)
+                if response.status_code not in RETRYABLE_STATUS_CODES:
+                    response.raise_for_status()
+                    return response
+                error = httpx.HTTPStatusError(f"Pi-hole responded {response.status_code}",
+                                              request=response.request, response=response)
+            except httpx.TransportError as e:
+                error = e
+            if attempt >= self.pihole_config.max_retries:
+                raise error
+            delay = self._backoff_delay(attempt)
+            attempt += 1
+            logger.warning(f"Pi-hole {method} failed ({error}), retry {attempt}/{self.pihole_config.max_retries} "
+                           f"in {delay:.2f}s")
+            await asyncio.sleep(delay)
+
+    def _form(self, action: str, hostname: str, ip: str) -> dict:
+        data = {'action': action, 'domain': hostname, 'ip': ip}
+        if self.pihole_config.api_token:
+            data['auth'] = self.pihole_config.api_token
+        return data
+
+    async def add_dns_record(self, dns_record: DNSRecord) -> bool:
+        try:
+            await self._request('POST', data=self._form('add', dns_record.hostname, dns_record.ip))
+            logger.info(f"Added DNS record: {dns_record}")
+            return True
+        except Exception as e:
+            logger.error(f"Failed to add DNS record {dns_record}: {e}")
+            return False
+
+    async def remove_dns_record(self, hostname: str, ip: str) -> bool:
+        try:
+            await self._request('POST', data=self._form('delete', hostname, ip))
+            logger.info(f"Removed DNS record: {hostname} -> {ip}")
+            return True
+        except Exception as e:
+            logger.error(f"Failed to remove DNS record {hostname} -> {ip}: {e}")
+            return False
+
+    async def add_dns_records(self, dns_records: Iterable[DNSRecord]) -> List[bool]:
+        return list(await asyncio.gather(*(self.add_dns_record(r) for r in dns_records)))
+
+    async def remove_dns_records(self, records: Iterable[Tuple[str, str]]) -> List[bool]:
+        return list(await asyncio.gather(*(self.remove_dns_record(hostname, ip) for hostname, ip in records)))
+
+    async def fetch_dns_records(self) -> List[DNSRecord]:
+        """Same as get_dns_records, but raises instead of returning an empty list on failure."""
+        params = {'action': 'get'}
+        if self.pihole_config.api_token:
+            params['auth'] = self.pihole_config.api_token
+
+        response = await self._request('GET', params=params)
+
+        records = []
+        for line in response.text.strip().split('\n'):
+            if line and ' ' in line:
+                parts = line.split(' ', 1)
+                if len(parts) == 2:
+                    records.append(DNSRecord(ip=parts[0], hostname=parts[1]))
+        return records
+
+    async def get_dns_records(self) -> List[DNSRecord]:
+        try:
+            return await self.fetch_dns_records()
+        except Exception as e:
+            logger.error(f"Failed to get DNS records: {e}", exc_info=True)
+            return []
+
+
+def create_async_pihole_client(pihole_config: PiHoleConfig) -> AsyncPiHoleClient:
+    """The client for ``pihole_config.api_version``: 5 (customdns.php) or 6 (REST API)"""
+    if pihole_config.api_version == 6:
+        from dns.manager.pihole.pihole_v6_client import AsyncPiHoleV6Client
+        return AsyncPiHoleV6Client(pihole_config)
+    if pihole_config.api_version == 5:
+        return AsyncPiHoleClient(pihole_config)
+    raise ValueError(f"Unsupported Pi-hole API version {pihole_config.api_version!r}, expected 5 or 6")
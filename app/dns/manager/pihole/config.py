@@ -5,3 +5,12 @@ from dataclasses import dataclass
 class PiHoleConfig:
     url: str
     api_token: str
+    timeout: float = 10.0
+    max_connections: int = 10
+    max_concurrency: int = 8
+    max_retries: int = 3
+    backoff_base: float = 0.2
+    backoff_max: float = 5.0
+    cache_ttl: float = 60.0
+    api_version: int = 5
+    batch_window: float = 0.05
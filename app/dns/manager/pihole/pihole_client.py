@@ -1,10 +1,13 @@
 import logging
 from dataclasses import dataclass
-from typing import List
+from typing import List, Optional
 
 import requests
 
+from core.metrics import PIHOLE_ERRORS, PIHOLE_REQUEST_SECONDS, observe_call
+from core.tracing import span
 from dns.manager.pihole.config import PiHoleConfig
+from dns.manager.pihole.record_index import DNSRecordIndex
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - DockDNS - %(levelname)s - %(message)s')
 logger = logging.getLogger('dns.manager.pihole_client')
@@ -14,13 +17,17 @@ logger = logging.getLogger('dns.manager.pihole_client')
 class DNSRecord:
     hostname: str
     ip: str
-    port: int
+    port: Optional[int] = None
 
 
 class PiHoleClient:
     def __init__(self, pihole_config: PiHoleConfig):
         self.pihole_config = pihole_config
         self.session = requests.Session()
+        self.records = DNSRecordIndex(
+            lambda: [(record.hostname, record.ip) for record in self.fetch_dns_records()],
+            ttl=pihole_config.cache_ttl,
+        )
 
     def add_dns_record(self, dns_record: DNSRecord) -> bool:
         try:
@@ -33,8 +40,11 @@ class PiHoleClient:
             if self.pihole_config.api_token:
                 data['auth'] = self.pihole_config.api_token
 
-            response = self.session.post(url, data=data)
-            response.raise_for_status()
+            with observe_call(PIHOLE_REQUEST_SECONDS, PIHOLE_ERRORS, 'add'), \
+                    span('pihole.add', hostname=dns_record.hostname):
+                response = self.session.post(url, data=data, timeout=self.pihole_config.timeout)
+                response.raise_for_status()
+            self.records.add(dns_record.hostname, dns_record.ip)
             logger.info(f"Added DNS record: {dns_record}")
             return True
         except Exception as e:
@@ -52,35 +62,42 @@ class PiHoleClient:
             if self.pihole_config.api_token:
                 data['auth'] = self.pihole_config.api_token
 
-            response = self.session.post(url, data=data)
-            response.raise_for_status()
+            with observe_call(PIHOLE_REQUEST_SECONDS, PIHOLE_ERRORS, 'delete'), \
+                    span('pihole.delete', hostname=hostname):
+                response = self.session.post(url, data=data, timeout=self.pihole_config.timeout)
+                response.raise_for_status()
+            self.records.discard(hostname, ip)
             logger.info(f"Removed DNS record: {hostname} -> {ip}")
             return True
         except Exception as e:
             logger.error(f"Failed to remove DNS record {hostname} -> {ip}: {e}")
             return False
 
-    def get_dns_records(self) -> List[DNSRecord]:
-        try:
-            url = f"{self.pihole_config.url}/admin/scripts/pi-hole/php/customdns.php"
-            params = {'action': 'get'}
-            if self.pihole_config.api_token:
-                params['auth'] = self.pihole_config.api_token
+    def fetch_dns_records(self) -> List[DNSRecord]:
+        """Downloads the full custom DNS list, raising on failure. Prefer ``get_dns_records``/``records``."""
+        url = f"{self.pihole_config.url}/admin/scripts/pi-hole/php/customdns.php"
+        params = {'action': 'get'}
+        if self.pihole_config.api_token:
+            params['auth'] = self.pihole_config.api_token
 
-            response = self.session.get(url, params=params)
+        with observe_call(PIHOLE_REQUEST_SECONDS, PIHOLE_ERRORS, 'get'), span('pihole.get'):
+            response = self.session.get(url, params=params, timeout=self.pihole_config.timeout)
             response.raise_for_status()
 
-            records = []
-            for line in response.text.strip().split('\n'):
-                if line and ' ' in line:
-                    parts = line.split(' ', 1)
-                    if len(parts) == 2:
-                        records.append(DNSRecord(ip=parts[0], hostname=parts[1]))
-            return records
+        records = []
+        for line in response.text.strip().split('\n'):
+            if line and ' ' in line:
+                parts = line.split(' ', 1)
+                if len(parts) == 2:
+                    records.append(DNSRecord(ip=parts[0], hostname=parts[1]))
+        return records
+
+    def has_dns_record(self, hostname: str, ip: str) -> bool:
+        return self.records.contains(hostname, ip)
+
+    def get_dns_records(self) -> List[DNSRecord]:
+        try:
+            return [DNSRecord(hostname, ip) for hostname, ip in sorted(self.records.snapshot())]
         except Exception as e:
             logger.error(f"Failed to get DNS records: {e}", exc_info=True)
             return []
-
-
-
-
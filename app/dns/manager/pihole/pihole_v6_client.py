@@ -0,0 +1,153 @@
+import asyncio
+import logging
+from typing import Iterable, List, Optional, Tuple
+
+import httpx
+
+from core.metrics import PIHOLE_ERRORS, PIHOLE_REQUEST_SECONDS, observe_call
+from core.tracing import span
+from dns.manager.hosts.hosts_file import HostChange, apply_host_changes, parse_hosts
+from dns.manager.pihole.async_pihole_client import AsyncPiHoleClient
+from dns.manager.pihole.config import PiHoleConfig
+from dns.manager.pihole.pihole_client import DNSRecord
+
+logger = logging.getLogger('dns.manager.pihole_v6_client')
+
+# PATCHes of one batch before giving up when other writers keep overwriting the list in between
+MAX_PATCH_ATTEMPTS = 3
+
+
+def changes_applied(hosts: List[str], changes: Iterable[HostChange]) -> bool:
+    """Whether ``hosts`` reflects the end state of ``changes``: added records present, removed ones gone"""
+    records = set(parse_hosts(hosts))
+    wanted = {(hostname, ip): action == 'add' for action, hostname, ip in changes}
+    return all((record in records) == present for record, present in wanted.items())
+
+
+class AsyncPiHoleV6Client(AsyncPiHoleClient):
+    """
+    Pi-hole v6 REST API client with the same API as AsyncPiHoleClient.
+
+    Logs in once (``POST /api/auth``, ``api_token`` being the app password) and reuses the session
+    until Pi-hole answers 401. Local DNS records live in the ``dns.hosts`` config list, so every record
+    change made within ``batch_window`` seconds, plus those queued while a write is in flight, is
+    applied together: one GET of the list and one PATCH replacing it, however many records changed.
+    Single-record calls (one per container event) are queued too, so events handled at the same time
+    share one list update; a batch is as large as the number of concurrent callers (``EVENT_WORKERS``).
+    Changes queued while an update is in flight start from the list that update read back, saving the GET.
+
+    Pi-hole has no conditional PATCH, so a list rewrite is last-writer-wins: a writer that replaces the
+    list between our GET and PATCH loses our changes, or we lose its. The list is therefore read back
+    after each PATCH and the batch re-applied (up to ``MAX_PATCH_ATTEMPTS`` times) until our changes
+    are in it. That only protects our own changes: an edit made by someone else (the web UI, a client
+    without this check) in the same window can still be overwritten by our PATCH.
+    """
+
+    def __init__(self, pihole_config: PiHoleConfig):
+        super().__init__(pihole_config)
+        self.url = f"{pihole_config.url.rstrip('/')}/api"
+        self.batches = 0
+        self._sid: Optional[str] = None
+        self._login_lock = asyncio.Lock()
+        self._pending: List[Tuple[List[HostChange], asyncio.Future]] = []
+        self._flush_task: Optional[asyncio.Task] = None
+
+    async def aclose(self):
+        if self._flush_task is not None:
+            await asyncio.gather(self._flush_task, return_exceptions=True)
+        if self._sid:
+            try:
+                await self.session.delete(f"{self.url}/auth", headers={'X-FTL-SID': self._sid})
+            except httpx.HTTPError as e:
+                logger.debug(f"Failed to end Pi-hole session: {e}")
+            self._sid = None
+        await super().aclose()
+
+    async def _login(self):
+        response = await self._send('POST', url=f"{self.url}/auth", json={'password': self.pihole_config.api_token})
+        session = response.json().get('session') or {}
+        if not session.get('valid'):
+            raise PermissionError(f"Pi-hole rejected the API password: {session.get('message')}")
+        self._sid = session.get('sid')
+        logger.info(f"Logged in to the Pi-hole v6 API, session valid for {session.get('validity')}s")
+
+    async def _api(self, method: str, path: str, operation: str, **kwargs) -> httpx.Response:
+        with observe_call(PIHOLE_REQUEST_SECONDS, PIHOLE_ERRORS, operation), span(f"pihole.{operation}"):
+            for attempt in range(2):
+                if self._sid is None and self.pihole_config.api_token:
+                    async with self._login_lock:
+                        if self._sid is None:
+                            await self._login()
+                headers = {'X-FTL-SID': self._sid} if self._sid else {}
+                try:
+                    return await self._send(method, url=f"{self.url}{path}", headers=headers, **kwargs)
+                except httpx.HTTPStatusError as e:
+                    if e.response.status_code != 401 or attempt:
+                        raise
+                    logger.info("Pi-hole session expired, logging in again")
+                    self._sid = None
+
+    async def _fetch_hosts(self) -> List[str]:
+        response = await self._api('GET', '/config/dns/hosts', 'get')
+        return list(response.json()['config']['dns']['hosts'])
+
+    async def _apply(self, changes: List[HostChange], hosts: Optional[List[str]] = None) -> List[str]:
+        """Applies ``changes`` on top of ``hosts`` (fetched when not given) and returns the list read back"""
+        if hosts is None:
+            hosts = await self._fetch_hosts()
+        before, patches = len(hosts), 0
+        while not changes_applied(hosts, changes):
+            if patches == MAX_PATCH_ATTEMPTS:
+                raise RuntimeError(f"changes were overwritten by another writer {patches} times")
+            if patches:
+                logger.warning(f"Pi-hole host list was replaced by another writer, re-applying "
+                               f"{len(changes)} DNS record changes")
+            updated = apply_host_changes(hosts, changes)
+            await self._api('PATCH', '/config', 'patch', json={'config': {'dns': {'hosts': updated}}})
+            patches += 1
+            hosts = await self._fetch_hosts()
+        self.batches += 1
+        logger.info(f"Applied {len(changes)} DNS record changes to Pi-hole in {patches} update(s) "
+                    f"({before} -> {len(hosts)} host entries)")
+        return hosts
+
+    async def _flush_pending(self):
+        await asyncio.sleep(self.pihole_config.batch_window)
+        hosts = None
+        while self._pending:
+            batch, self._pending = self._pending, []
+            changes = [change for queued, _ in batch for change in queued]
+            try:
+                # Changes queued during the previous update start from the list it just read back
+                hosts = await self._apply(changes, hosts)
+                ok = True
+            except Exception as e:
+                logger.error(f"Failed to apply {len(changes)} DNS record changes: {e}")
+                hosts, ok = None, False
+            for _, future in batch:
+                if not future.done():
+                    future.set_result(ok)
+
+    async def _change(self, changes: List[HostChange]) -> List[bool]:
+        if not changes:
+            return []
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((changes, future))
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.ensure_future(self._flush_pending())
+        return [await future] * len(changes)
+
+    async def add_dns_record(self, dns_record: DNSRecord) -> bool:
+        return (await self.add_dns_records([dns_record]))[0]
+
+    async def remove_dns_record(self, hostname: str, ip: str) -> bool:
+        return (await self.remove_dns_records([(hostname, ip)]))[0]
+
+    async def add_dns_records(self, dns_records: Iterable[DNSRecord]) -> List[bool]:
+        return await self._change([('add', record.hostname, record.ip) for record in dns_records])
+
+    async def remove_dns_records(self, records: Iterable[Tuple[str, str]]) -> List[bool]:
+        return await self._change([('remove', hostname, ip) for hostname, ip in records])
+
+    async def fetch_dns_records(self) -> List[DNSRecord]:
+        return [DNSRecord(hostname=hostname, ip=ip) for hostname, ip in parse_hosts(await self._fetch_hosts())]
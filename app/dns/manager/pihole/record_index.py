@@ -0,0 +1,138 @@
+import logging
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+logger = logging.getLogger('dns.manager.record_index')
+
+Record = Tuple[str, str]
+
+
+class DNSRecordIndex:
+    """
+    Cached, indexed view of the custom DNS records served by Pi-hole.
+
+    ``fetch`` returns the full ``(hostname, ip)`` list and is only called when the cache is older
+    than ``ttl`` seconds or was invalidated. Successful writes of our own are applied in place with
+    ``add``/``discard``, so lookups stay correct between refreshes without another round trip.
+    The fetch runs without holding the index lock, so lookups and writes are not blocked by a slow
+    Pi-hole; writes made while it is in flight are replayed on top of the fetched records.
+    """
+
+    def __init__(self, fetch: Callable[[], Iterable[Record]], ttl: float = 60.0):
+        self.fetch = fetch
+        self.ttl = ttl
+        self.refreshes = 0
+        self.hits = 0
+        self._by_hostname: Dict[str, Set[str]] = {}
+        self._by_ip: Dict[str, Set[str]] = {}
+        self._loaded_at: Optional[float] = None
+        self._edits: Optional[List[Tuple[bool, str, str]]] = None
+        self._lock = threading.RLock()
+        self._fetch_lock = threading.Lock()
+
+    @property
+    def age(self) -> Optional[float]:
+        """Seconds since the last refresh, None if never loaded or invalidated"""
+        loaded_at = self._loaded_at
+        return None if loaded_at is None else time.monotonic() - loaded_at
+
+    @property
+    def fresh(self) -> bool:
+        age = self.age
+        return age is not None and age < self.ttl
+
+    def invalidate(self):
+        with self._lock:
+            self._loaded_at = None
+
+    def refresh(self, force: bool = False, max_age: Optional[float] = None):
+        """Reloads from Pi-hole if older than ``ttl`` (or ``max_age`` if smaller); raises if the fetch fails"""
+        max_age = self.ttl if max_age is None else min(max_age, self.ttl)
+        if not force and self._younger_than(max_age):
+            self.hits += 1
+            return
+        # One fetch at a time; callers queued behind it reuse its result
+        with self._fetch_lock:
+            with self._lock:
+                if not force and self._younger_than(max_age):
+                    self.hits += 1
+                    return
+                self._edits = []
+            try:
+                records = list(self.fetch())
+            except BaseException:
+                with self._lock:
+                    self._edits = None
+                raise
+            with self._lock:
+                edits, self._edits = self._edits, None
+                self._by_hostname, self._by_ip = {}, {}
+                for hostname, ip in records:
+                    self._index(hostname, ip)
+                for added, hostname, ip in edits:
+                    (self._index if added else self._unindex)(hostname, ip)
+                self._loaded_at = time.monotonic()
+                self.refreshes += 1
+        logger.debug(f"Refreshed Pi-hole record index: {len(records)} records")
+
+    def _younger_than(self, max_age: float) -> bool:
+        age = self.age
+        return age is not None and age < max_age
+
+    def _index(self, hostname: str, ip: str):
+        self._by_hostname.setdefault(hostname, set()).add(ip)
+        self._by_ip.setdefault(ip, set()).add(hostname)
+
+    def _unindex(self, hostname: str, ip: str):
+        ips = self._by_hostname.get(hostname)
+        if ips:
+            ips.discard(ip)
+            if not ips:
+                del self._by_hostname[hostname]
+        hostnames = self._by_ip.get(ip)
+        if hostnames:
+            hostnames.discard(hostname)
+            if not hostnames:
+                del self._by_ip[ip]
+
+    def add(self, hostname: str, ip: str):
+        with self._lock:
+            self._index(hostname, ip)
+            if self._edits is not None:
+                self._edits.append((True, hostname, ip))
+
+    def discard(self, hostname: str, ip: str):
+        with self._lock:
+            self._unindex(hostname, ip)
+            if self._edits is not None:
+                self._edits.append((False, hostname, ip))
+
+    def snapshot(self, force: bool = False) -> Set[Record]:
+        self.refresh(force)
+        with self._lock:
+            return {(hostname, ip) for hostname, ips in self._by_hostname.items() for ip in ips}
+
+    def contains(self, hostname: str, ip: str, max_age: Optional[float] = None) -> bool:
+        """
+        Whether ``hostname`` already points at ``ip``. With ``max_age``, a yes from an index older than
+        that is confirmed by a refresh first, for callers that skip a write on it
+        """
+        self.refresh()
+        with self._lock:
+            found = ip in self._by_hostname.get(hostname, ())
+        if not found or max_age is None or self._younger_than(max_age):
+            return found
+        self.refresh(max_age=max_age)
+        with self._lock:
+            return ip in self._by_hostname.get(hostname, ())
+
+    def ips(self, hostname: str) -> Set[str]:
+        self.refresh()
+        with self._lock:
+            return set(self._by_hostname.get(hostname, ()))
+
+    def hostnames(self, ip: str) -> Set[str]:
+        self.refresh()
+        with self._lock:
+            return set(self._by_ip.get(ip, ()))
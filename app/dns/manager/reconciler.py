@@ -0,0 +1,162 @@
+import logging
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+logger = logging.getLogger('dns.manager.reconciler')
+
+Record = Tuple[str, str]
+
+
+@dataclass(frozen=True)
+class RecordChange:
+    container_id: str
+    hostname: str
+    ip: str
+
+    @property
+    def record(self) -> Record:
+        return self.hostname, self.ip
+
+
+@dataclass
+class ReconcilePlan:
+    """
+    Minimal diff between the records we manage and what Pi-hole currently serves.
+
+    ``add``/``remove`` need a Pi-hole write, ``keep``/``forget`` only touch our own state.
+    """
+    add: List[RecordChange] = field(default_factory=list)
+    remove: List[RecordChange] = field(default_factory=list)
+    keep: List[RecordChange] = field(default_factory=list)
+    forget: List[RecordChange] = field(default_factory=list)
+
+    @property
+    def writes(self) -> int:
+        return len(self.add) + len(self.remove)
+
+    @property
+    def empty(self) -> bool:
+        return not (self.add or self.remove or self.forget)
+
+    def __str__(self):
+        return (f"ReconcilePlan(add={len(self.add)}, remove={len(self.remove)}, "
+                f"keep={len(self.keep)}, forget={len(self.forget)})")
+
+
+@dataclass
+class ReconcileResult:
+    records: Dict[str, Record]
+    added: List[RecordChange] = field(default_factory=list)
+    removed: List[RecordChange] = field(default_factory=list)
+    failed: List[RecordChange] = field(default_factory=list)
+
+    @property
+    def changed(self) -> bool:
+        return bool(self.added or self.removed)
+
+
+def normalize_records(records: Iterable) -> Set[Record]:
+    """Accepts both the legacy ``{'domain', 'ip'}`` dicts and ``DNSRecord`` objects."""
+    result = set()
+    for record in records:
+        if isinstance(record, dict):
+            result.add((record['domain'], record['ip']))
+        else:
+            result.add((record.hostname, record.ip))
+    return result
+
+
+class DNSReconciler:
+    """
+    Plans and applies the minimal add/remove diff for one instance.
+
+    The DNS manager only needs ``add_dns_record(hostname, ip)`` and ``remove_dns_record(hostname, ip)``;
+    if it also offers ``add_dns_records``/``remove_dns_records`` each side of the diff is sent as one batch.
+    ``existing`` is the set of records Pi-hole serves right now; ``None`` means it could not be
+    fetched, in which case every change is written blindly (the pre-reconciler behaviour).
+    Large diffs are sent in chunks of ``batch_size`` records so progress can be logged.
+    """
+
+    def __init__(self, dns_manager, batch_size: int = 100):
+        self.dns_manager = dns_manager
+        self.batch_size = batch_size
+
+    @staticmethod
+    def plan(desired: Dict[str, Record], managed: Dict[str, Record],
+             existing: Optional[Set[Record]]) -> ReconcilePlan:
+        plan = ReconcilePlan()
+        desired_records = set(desired.values())
+
+        for container_id, (hostname, ip) in managed.items():
+            if desired.get(container_id) == (hostname, ip):
+                continue
+            change = RecordChange(container_id, hostname, ip)
+            if (hostname, ip) in desired_records:
+                # Another container now owns the very same record, nothing to delete.
+                plan.forget.append(change)
+            elif existing is None or (hostname, ip) in existing:
+                plan.remove.append(change)
+            else:
+                plan.forget.append(change)
+
+        for container_id, (hostname, ip) in desired.items():
+            change = RecordChange(container_id, hostname, ip)
+            if existing is not None and (hostname, ip) in existing:
+                plan.keep.append(change)
+            elif managed.get(container_id) == (hostname, ip) and existing is None:
+                plan.keep.append(change)
+            else:
+                plan.add.append(change)
+
+        return plan
+
+    @staticmethod
+    def plan_removal(records: Dict[str, Record], existing: Optional[Set[Record]]) -> ReconcilePlan:
+        """Plan to drop every record in ``records``, e.g. the records of an inactive instance."""
+        return DNSReconciler.plan({}, records, existing)
+
+    def _write(self, action: str, changes: List[RecordChange]) -> List[bool]:
+        if not changes:
+            return []
+        bulk = getattr(self.dns_manager, f"{action}_dns_records", None)
+        if bulk is None:
+            single = getattr(self.dns_manager, f"{action}_dns_record")
+
+            def bulk(records: List[Record]) -> List[bool]:
+                return [single(hostname, ip) for hostname, ip in records]
+
+        if self.batch_size <= 0 or len(changes) <= self.batch_size:
+            return bulk([change.record for change in changes])
+        results = []
+        for start in range(0, len(changes), self.batch_size):
+            results += bulk([change.record for change in changes[start:start + self.batch_size]])
+            logger.info(f"DNS {action}: {len(results)}/{len(changes)} records written")
+        return results
+
+    def apply(self, plan: ReconcilePlan, managed: Dict[str, Record]) -> ReconcileResult:
+        records = dict(managed)
+        result = ReconcileResult(records=records)
+
+        for change, ok in zip(plan.remove, self._write('remove', plan.remove)):
+            if ok:
+                records.pop(change.container_id, None)
+                result.removed.append(change)
+            else:
+                result.failed.append(change)
+
+        for change in plan.forget:
+            records.pop(change.container_id, None)
+
+        for change in plan.keep:
+            records[change.container_id] = change.record
+
+        for change, ok in zip(plan.add, self._write('add', plan.add)):
+            if ok:
+                records[change.container_id] = change.record
+                result.added.append(change)
+            else:
+                result.failed.append(change)
+
+        logger.info(f"Applied {plan}: {len(result.added)} added, {len(result.removed)} removed, "
+                    f"{len(result.failed)} failed")
+        return result
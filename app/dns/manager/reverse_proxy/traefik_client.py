@@ -1,46 +1,271 @@
+import hashlib
 import os
-from dataclasses import dataclass
+import re
+import tempfile
+import threading
+from dataclasses import dataclass, replace
 import logging
+from typing import Dict, Optional, Tuple
 
 from jinja2 import Template
 
 from agent.dockdns_config import DockDNSConfig
 from domain.container_wraper import ContainerWrapper
 
+logger = logging.getLogger('dns.manager.traefik_client')
+
+# Used for per-container files when no traefik_template_path is configured
+DEFAULT_ROUTER_TEMPLATE = """\
+http:
+  routers:
+    {{ name }}:
+      rule: "Host(`{{ hostname }}`)"
+      service: {{ name }}
+  services:
+    {{ name }}:
+      loadBalancer:
+        servers:
+          - url: "http://{{ ip }}:{{ port }}"
+"""
+
+# Used for the consolidated file when no traefik_consolidated_template_path is configured
+DEFAULT_CONSOLIDATED_TEMPLATE = """\
+http:
+  routers:
+{%- for route in routes %}
+    {{ route.name }}:
+      rule: "Host(`{{ route.hostname }}`)"
+      service: {{ route.name }}
+{%- endfor %}
+  services:
+{%- for route in routes %}
+    {{ route.name }}:
+      loadBalancer:
+        servers:
+          - url: "http://{{ route.ip }}:{{ route.port }}"
+{%- endfor %}
+"""
+
 
 @dataclass
 class TraefikConfig:
-    template_path: str
+    template_path: Optional[str]
     output_dir: str
     dry_run: bool
+    consolidated_file: Optional[str] = None
+    consolidated_template_path: Optional[str] = None
+    flush_interval: float = 1.0
+
+
+@dataclass(frozen=True)
+class TraefikRoute:
+    name: str
+    hostname: str
+    ip: str
+    port: str
 
 
 def yaml_path(container: ContainerWrapper, config: TraefikConfig, ):
     return f"{config.output_dir}/{container.target_hostname}_{container.id[:12]}.yaml"
 
 
-def render_traefik_config(hostname, ip, port, container, config: TraefikConfig, dockdns_config: DockDNSConfig):
-    logger = logging.getLogger('dns.manager.traefik_client')
-    with open(config.template_path) as f:
-        template = Template(f.read())
-    rendered = template.render(hostname=hostname, ip=ip, port=port)
-    output_path = yaml_path(container, config)
+def route_name(hostname: str, container_id: str) -> str:
+    """Router/service key, unique per container so two containers sharing a hostname keep their own routes"""
+    return f"{re.sub(r'[^a-zA-Z0-9-]', '-', hostname)}-{container_id[:12]}"
+
+
+class TemplateCache:
+    """Compiled Jinja2 template that is only re-read and re-compiled when the file's mtime changes"""
+
+    def __init__(self, path: Optional[str], default: Optional[str] = None):
+        self.path = path
+        self.default = default
+        self.compiles = 0
+        self._mtime: Optional[float] = None
+        self._template: Optional[Template] = Template(default) if default and not path else None
+        self._lock = threading.Lock()
+
+    def get(self) -> Template:
+        if not self.path:
+            return self._template
+        with self._lock:
+            mtime = os.stat(self.path).st_mtime
+            if self._template is None or mtime != self._mtime:
+                with open(self.path) as f:
+                    self._template = Template(f.read())
+                self._mtime = mtime
+                self.compiles += 1
+                logger.info(f"[TRAEFIK] Compiled template {self.path}")
+            return self._template
+
+
+def atomic_write(path: str, content: str):
+    """Writes to a temp file in the same directory and renames it, so readers never see a partial file"""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.', prefix='.dockdns-', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def _digest(content: str) -> str:
+    return hashlib.sha1(content.encode()).hexdigest()
+
+
+class TraefikWriter:
+    """
+    Writes Traefik file-provider config for containers.
+
+    Every write is atomic and skipped when the rendered content did not change, so Traefik only
+    reloads on real changes. With ``consolidated_file`` set all routes go to that single file,
+    which is re-rendered at most every ``flush_interval`` seconds no matter how many containers changed.
+    """
+
+    def __init__(self, config: TraefikConfig):
+        self.config = config
+        self.template = TemplateCache(config.template_path, DEFAULT_ROUTER_TEMPLATE)
+        self.consolidated_template = TemplateCache(config.consolidated_template_path, DEFAULT_CONSOLIDATED_TEMPLATE)
+        self.writes = 0
+        self.skipped = 0
+        self._hashes: Dict[str, str] = {}
+        self._routes: Dict[str, TraefikRoute] = {}
+        self._dirty = False
+        self._lock = threading.RLock()
+        self._timer: Optional[threading.Timer] = None
+
+    @property
+    def consolidated_path(self) -> Optional[str]:
+        if not self.config.consolidated_file:
+            return None
+        return os.path.join(self.config.output_dir, self.config.consolidated_file)
+
+    def stats(self) -> dict:
+        return {'writes': self.writes, 'skipped': self.skipped, 'routes': len(self._routes),
+                'template_compiles': self.template.compiles + self.consolidated_template.compiles}
+
+    def _write_if_changed(self, path: str, content: str) -> bool:
+        digest = _digest(content)
+        with self._lock:
+            if path not in self._hashes and os.path.exists(path):
+                with open(path) as f:
+                    self._hashes[path] = _digest(f.read())
+            if self._hashes.get(path) == digest:
+                self.skipped += 1
+                return False
+            if self.config.dry_run:
+                logger.info(f"[DRY RUN] Would write {path}:{content}")
+            else:
+                atomic_write(path, content)
+                logger.info(f"[TRAEFIK] Wrote config to {path}")
+            self._hashes[path] = digest
+            self.writes += 1
+            return True
+
+    def _remove(self, path: str) -> bool:
+        with self._lock:
+            self._hashes.pop(path, None)
+            if not os.path.exists(path):
+                return False
+            if self.config.dry_run:
+                logger.info(f"[DRY RUN] Would delete {path}")
+            else:
+                os.remove(path)
+                logger.info(f"[TRAEFIK] Removed config: {path}")
+            return True
+
+    def write(self, hostname, ip, port, container: ContainerWrapper) -> bool:
+        """True when the container's route changed (in consolidated mode: was scheduled to be written)"""
+        name = route_name(hostname, container.id)
+        if self.consolidated_path:
+            route = TraefikRoute(name, hostname, ip, str(port))
+            with self._lock:
+                if self._routes.get(container.id) == route:
+                    return False
+                self._routes[container.id] = route
+                self._schedule_flush()
+            return True
+        rendered = self.template.get().render(name=name, hostname=hostname, ip=ip, port=port)
+        return self._write_if_changed(yaml_path(container, self.config), rendered)
+
+    def delete(self, container: ContainerWrapper) -> bool:
+        """True when the container had a route"""
+        if self.consolidated_path:
+            with self._lock:
+                if self._routes.pop(container.id, None) is None:
+                    return False
+                self._schedule_flush()
+            return True
+        return self._remove(yaml_path(container, self.config))
+
+    def _schedule_flush(self):
+        self._dirty = True
+        if self.config.flush_interval <= 0:
+            self.flush()
+        elif self._timer is None:
+            self._timer = threading.Timer(self.config.flush_interval, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def flush(self):
+        """Renders every pending route change into the consolidated file in one write"""
+        with self._lock:
+            self._timer = None
+            if not self._dirty or not self.consolidated_path:
+                return
+            routes = sorted(self._routes.values(), key=lambda route: route.name)
+            rendered = self.consolidated_template.get().render(routes=routes)
+            self._dirty = False
+        try:
+            self._write_if_changed(self.consolidated_path, rendered)
+        except Exception as e:
+            logger.error(f"[TRAEFIK] Failed to write {self.consolidated_path}: {e}")
+            with self._lock:
+                self._dirty = True
+
+    def close(self):
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+        self.flush()
+
+
+_writers: Dict[Tuple, TraefikWriter] = {}
+_writers_lock = threading.Lock()
+
+
+def get_traefik_writer(config: TraefikConfig) -> TraefikWriter:
+    """One writer (and so one template cache and content-hash table) per distinct config"""
+    key = (config.template_path, config.output_dir, config.dry_run, config.consolidated_file,
+           config.consolidated_template_path, config.flush_interval)
+    with _writers_lock:
+        if key not in _writers:
+            _writers[key] = TraefikWriter(config)
+        return _writers[key]
+
+
+def traefik_config_from(dockdns_config: DockDNSConfig) -> TraefikConfig:
+    return TraefikConfig(template_path=dockdns_config.traefik_template_path,
+                         output_dir=dockdns_config.traefik_output_dir,
+                         dry_run=dockdns_config.dry_run,
+                         consolidated_file=dockdns_config.traefik_consolidated_file,
+                         consolidated_template_path=dockdns_config.traefik_consolidated_template_path,
+                         flush_interval=dockdns_config.traefik_flush_interval)
+
+
+def render_traefik_config(hostname, ip, port, container, config: TraefikConfig,
+                          dockdns_config: DockDNSConfig) -> bool:
+    if dockdns_config.dry_run:
+        config = replace(config, dry_run=True)
+    return get_traefik_writer(config).write(hostname, ip, port, container)
+
+
+def delete_traefik_config(container: ContainerWrapper, config: TraefikConfig, dockdns_config: DockDNSConfig,) -> bool:
     if dockdns_config.dry_run:
-        logger.info(f"[DRY RUN] Would write {output_path}:{rendered}")
-    else:
-        with open(output_path, "w") as f:
-            f.write(rendered)
-        logger.info(f"[TRAEFIK] Wrote config to {output_path}")
-        # send_telegram(f"[Traefik] \U0001F195 Added route: {hostname} → {ip}:{port}")
-
-
-def delete_traefik_config(container: ContainerWrapper, config: TraefikConfig, dockdns_config: DockDNSConfig,):
-    logger = logging.getLogger('dns.manager.traefik_client')
-    path = yaml_path(container, config, )
-    if os.path.exists(path):
-        if dockdns_config.dry_run:
-            logger.info(f"[DRY RUN] Would delete {path}")
-        else:
-            os.remove(path)
-            logger.info(f"[TRAEFIK] Removed config: {path}")
-            # send_telegram(f"[Traefik] ❌ Removed route: {hostname}")
+        config = replace(config, dry_run=True)
+    return get_traefik_writer(config).delete(container)
@@ -0,0 +1,80 @@
+from dataclasses import dataclass, field, replace
+from typing import Dict, Optional, Tuple
+
+EVENT_ONLY_ATTRIBUTES = ('exitCode', 'signal', 'execDuration')
+
+
+@dataclass(frozen=True)
+class ContainerMetadata:
+    """The parts of a container inspect DockDNS needs, parsed once per container lifecycle."""
+    id: str
+    name: str
+    image: str = ''
+    labels: Dict[str, str] = field(default_factory=dict)
+    network_mode: str = ''
+    networks: Dict[str, str] = field(default_factory=dict)
+    exposed_ports: Tuple[str, ...] = ()
+    default_ip: str = ''
+
+    @classmethod
+    def from_attrs(cls, attrs: dict) -> 'ContainerMetadata':
+        """Builds the metadata from a ``docker inspect`` payload (``Container.attrs``)"""
+        config = attrs.get('Config') or {}
+        network_settings = attrs.get('NetworkSettings') or {}
+        return cls(
+            id=attrs['Id'],
+            name=(attrs.get('Name') or '').lstrip('/'),
+            image=config.get('Image') or '',
+            labels=dict(config.get('Labels') or {}),
+            network_mode=(attrs.get('HostConfig') or {}).get('NetworkMode') or '',
+            networks={name: (info or {}).get('IPAddress') or ''
+                      for name, info in (network_settings.get('Networks') or {}).items()},
+            exposed_ports=tuple(config.get('ExposedPorts') or {}),
+            default_ip=network_settings.get('IPAddress') or '',
+        )
+
+    @classmethod
+    def from_summary(cls, summary: dict) -> 'ContainerMetadata':
+        """Builds the metadata from a ``docker ps`` entry (``APIClient.containers()``), no inspect needed"""
+        networks = {name: (info or {}).get('IPAddress') or ''
+                    for name, info in ((summary.get('NetworkSettings') or {}).get('Networks') or {}).items()}
+        names = summary.get('Names') or ['']
+        return cls(
+            id=summary['Id'],
+            name=names[0].lstrip('/'),
+            image=summary.get('Image') or '',
+            labels=dict(summary.get('Labels') or {}),
+            network_mode=(summary.get('HostConfig') or {}).get('NetworkMode') or '',
+            networks=networks,
+            exposed_ports=tuple(dict.fromkeys(f"{port['PrivatePort']}/{port.get('Type', 'tcp')}"
+                                              for port in summary.get('Ports') or [] if 'PrivatePort' in port)),
+            default_ip=networks.get('bridge', ''),
+        )
+
+    @classmethod
+    def from_event(cls, event: dict) -> 'ContainerMetadata':
+        """Best-effort metadata from a container event, whose actor attributes carry name, image and labels"""
+        attributes = dict(event.get('Actor', {}).get('Attributes') or {})
+        name = attributes.pop('name', '')
+        image = attributes.pop('image', '')
+        for key in EVENT_ONLY_ATTRIBUTES:
+            attributes.pop(key, None)
+        return cls(id=event.get('id') or event.get('Actor', {}).get('ID', ''), name=name, image=image,
+                   labels=attributes)
+
+    def without_network(self, network: str) -> 'ContainerMetadata':
+        """The same container after ``docker network disconnect``; no inspect needed"""
+        networks = {name: ip for name, ip in self.networks.items() if name != network}
+        return replace(self, networks=networks, default_ip='' if network == 'bridge' else self.default_ip)
+
+    @property
+    def host_network(self) -> bool:
+        return self.network_mode == 'host'
+
+    @property
+    def ip(self) -> Optional[str]:
+        """First non-empty IP over the container's networks"""
+        for ip in self.networks.values():
+            if ip:
+                return ip
+        return self.default_ip or None
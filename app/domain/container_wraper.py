@@ -1,69 +1,79 @@
-import os
 from enum import Enum
+from functools import cached_property
 from typing import Optional
 
+from core.host_address import HOST_ADDRESS, HostAddressProvider
+from domain.container_metadata import ContainerMetadata
+from domain.hostname_policy import HostnamePolicy
+
 
 class ContainerLabelOptions(Enum):
     DISABLED = "dockdns.disabled"
     HOSTNAME = "dockdns.target.hostname"
     PORT = "dockdns.source.port"
 
+
+HOSTNAME_POLICY = HostnamePolicy(ContainerLabelOptions.HOSTNAME.value)
+
+
 class ContainerWrapper:
-    def __init__(self, container):
-        self.__container = container
+    """
+    Read-only view of a container for DockDNS.
+
+    Accepts a docker ``Container`` or an already parsed ``ContainerMetadata``; the inspect payload
+    is parsed once and derived values are computed on first access only.
+    """
+
+    def __init__(self, container, host_address: HostAddressProvider = HOST_ADDRESS):
+        self.host_address = host_address
+        if isinstance(container, ContainerMetadata):
+            self.__container = None
+            self.metadata = container
+        else:
+            self.__container = container
+            self.metadata = ContainerMetadata.from_attrs(container.attrs)
 
     @property
     def id(self):
-        return self.__container.id
+        return self.metadata.id
 
     @property
     def name(self):
-        return self.__container.name
+        return self.metadata.name
 
     @property
     def labels_dict(self):
-        return self.__container.labels
+        return self.metadata.labels
 
     @property
     def attrs(self):
-        return self.__container.attrs
+        return self.__container.attrs if self.__container is not None else None
 
-    @property
+    @cached_property
     def disabled(self) -> bool:
         return self.labels_dict.get(ContainerLabelOptions.DISABLED.value, "false").lower() == "true"
 
-    @property
-    def target_hostname(self) -> str:
-        return self.labels_dict.get(ContainerLabelOptions.HOSTNAME.value) or self.name
+    @cached_property
+    def target_hostname(self) -> Optional[str]:
+        return HOSTNAME_POLICY.hostname(self.name, self.labels_dict)
 
-    @property
+    @cached_property
     def source_port(self) -> int:
         return (self.labels_dict.get(ContainerLabelOptions.PORT.value)
-                or next(iter(self.__container.attrs.get("Config", {}).get("ExposedPorts", {})), None)
+                or next(iter(self.metadata.exposed_ports), None)
                 or 80
                 )
 
-    @property
+    @cached_property
     def source_ip(self) -> Optional[str]:
-        try:
-            ip = self.__container.attrs["NetworkSettings"]["IPAddress"]
-            if not ip and self.__container.attrs["HostConfig"]["NetworkMode"] == "host":
-                ip = os.popen("hostname -I").read().split()[0]
-
-            import socket
-            host_ip = socket.gethostbyname("host.docker.internal")
-
-            import logging
-            logger = logging.getLogger('dockdns.main')
-            logger.info(f"host.docker.internal IP: {host_ip}")
-
-            return ip.strip() if ip else None
-        except Exception:
-            return None
+        ip = self.metadata.default_ip
+        if not ip and self.metadata.host_network:
+            ip = self.host_address.address
+        return ip.strip() if ip else None
 
     def __str__(self):
         return (
-            f"Container(name={self.name}, id={self.id}, image={self.__container.image}, "
+            f"Container(name={self.name}, id={self.id}, image={self.metadata.image}, "
             f"disabled={self.disabled}, target_hostname={self.target_hostname}, "
             f"source_port={self.source_port}, source_ip={self.source_ip})"
         )
@@ -0,0 +1,160 @@
+import logging
+import re
+import threading
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, Iterable, Mapping, Optional, Set, Tuple
+
+logger = logging.getLogger('dockdns.domain.hostname_policy')
+
+ENV_PREFIX = '{env-prefix}'
+CONTAINER_NAME = '{container-name}'
+
+MAX_HOSTNAME_LENGTH = 253
+LABEL_PATTERN = re.compile(r'^[a-z0-9]([a-z0-9-]{0,61}[a-z0-9])?$')
+INVALID_CHARACTERS = re.compile(r'[^a-z0-9.-]')
+
+
+def normalize_hostname(hostname: str) -> str:
+    """Lower-cases and replaces characters that are not allowed in DNS names (e.g. ``_``) with ``-``"""
+    return INVALID_CHARACTERS.sub('-', hostname.strip().lower()).strip('.')
+
+
+def is_valid_hostname(hostname: str) -> bool:
+    """RFC 1123: at most 253 characters, dot separated labels of 1-63 ``[a-z0-9-]`` not starting/ending in ``-``"""
+    if not hostname or len(hostname) > MAX_HOSTNAME_LENGTH:
+        return False
+    return all(LABEL_PATTERN.match(label) for label in hostname.split('.'))
+
+
+class HostnamePolicy:
+    """
+    Turns a container name (or its hostname label) into the DNS name DockDNS registers.
+
+    ``base_domain`` is compiled once into a template:
+
+    * with ``{env-prefix}``: both placeholders are filled, ``{container-name}`` with the bare name
+    * with only ``{container-name}``: it is filled with ``<env-prefix>-<name>``
+    * otherwise: ``<env-prefix>-<name>.<base_domain>``
+
+    Results are normalized and rejected (``None``) if they are not valid RFC 1123 hostnames.
+    """
+
+    def __init__(self, label: str, base_domain: str = '', env_prefix: str = ''):
+        self.label = label
+        self.base_domain = base_domain
+        self.env_prefix = env_prefix
+        self._prefix = f"{env_prefix}-" if env_prefix else ''
+        if ENV_PREFIX in base_domain:
+            self._parts = self._compile(base_domain.replace(ENV_PREFIX, env_prefix))
+            self._prefixed = False
+        elif CONTAINER_NAME in base_domain:
+            self._parts = self._compile(base_domain)
+            self._prefixed = True
+        else:
+            self._parts = ('', f".{base_domain}") if base_domain else ('', '')
+            self._prefixed = True
+
+    @staticmethod
+    def _compile(template: str) -> Tuple[str, ...]:
+        """Splits the template around ``{container-name}``; rendering is a single join"""
+        return tuple(template.split(CONTAINER_NAME))
+
+    def render(self, name: str) -> str:
+        if self._prefixed:
+            if not name.startswith(self._prefix):
+                name = f"{self._prefix}{name}"
+        elif self._prefix and name.startswith(self._prefix):
+            name = name[len(self._prefix):]
+        return name.join(self._parts)
+
+    def hostname(self, name: Optional[str], labels: Optional[Mapping[str, str]] = None) -> Optional[str]:
+        """Hostname for a container, or ``None`` if it has no usable name"""
+        name = (labels or {}).get(self.label) or (name or '').lstrip('/')
+        if not name:
+            return None
+        hostname = normalize_hostname(self.render(name))
+        if not is_valid_hostname(hostname):
+            logger.warning(f"Ignoring invalid hostname '{hostname}' for container '{name}'")
+            return None
+        return hostname
+
+
+@dataclass(frozen=True)
+class Owner:
+    instance_id: str
+    container_id: str
+
+
+class HostnameIndex:
+    """
+    ``hostname -> Owner`` map shared by every container (and instance) that registers names.
+
+    ``claim`` answers in O(1) whether a name is free, already ours, or held by someone else, so a
+    collision is reported instead of silently overwriting the other owner's record in Pi-hole.
+    """
+
+    def __init__(self):
+        self._owners: Dict[str, Owner] = {}
+        self._local: Set[str] = set()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._owners)
+
+    def counts(self) -> Dict[str, int]:
+        """Claimed hostnames per instance id"""
+        return dict(Counter(owner.instance_id for owner in list(self._owners.values())))
+
+    def add_local(self, instance_id: str):
+        """Marks an instance of this process, whose claims are kept current here and never replaced by ``load``"""
+        with self._lock:
+            self._local.add(instance_id)
+
+    def is_local(self, instance_id: str) -> bool:
+        return instance_id in self._local
+
+    def owner(self, hostname: str) -> Optional[Owner]:
+        return self._owners.get(hostname)
+
+    def claim(self, hostname: str, owner: Owner) -> Optional[Owner]:
+        """Takes ``hostname`` for ``owner``; returns the current owner instead if it belongs to someone else"""
+        with self._lock:
+            current = self._owners.setdefault(hostname, owner)
+            return None if current == owner else current
+
+    def transfer(self, hostname: str, owner: Owner):
+        """Unconditionally hands ``hostname`` to ``owner``, e.g. once the previous owner is known to be gone"""
+        with self._lock:
+            self._owners[hostname] = owner
+
+    def release(self, hostname: str, owner: Owner):
+        with self._lock:
+            if self._owners.get(hostname) == owner:
+                del self._owners[hostname]
+
+    def replace_instance(self, instance_id: str, records: Mapping[str, Tuple[str, str]]):
+        """Replaces every claim of one instance with ``container_id -> (hostname, ip)`` records"""
+        with self._lock:
+            self._owners = {hostname: owner for hostname, owner in self._owners.items()
+                            if owner.instance_id != instance_id}
+            for container_id, (hostname, _) in records.items():
+                self._owners.setdefault(hostname, Owner(instance_id, container_id))
+
+    def drop_instance(self, instance_id: str):
+        self.replace_instance(instance_id, {})
+
+    def load(self, instances: Mapping[str, Mapping], exclude: Iterable[str] = ()):
+        """
+        Replaces the claims of every instance but ``exclude`` and the local ones with the shared state's
+        ``instances`` mapping, so instances that were dropped from it lose their claims too
+        """
+        with self._lock:
+            exclude = self._local.union(exclude)
+            owners = {hostname: owner for hostname, owner in self._owners.items() if owner.instance_id in exclude}
+            for instance_id, data in instances.items():
+                if instance_id in exclude:
+                    continue
+                for container_id, (hostname, _) in data.get('records', {}).items():
+                    owners.setdefault(hostname, Owner(instance_id, container_id))
+            self._owners = owners
@@ -1,10 +1,12 @@
+import asyncio
 import logging
 from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
 
-from agent.container_watcher import DockerWatcher
+from agent.container_watcher import create_watchers
 from agent.dockdns_config import DockDNSConfig
+from core.tracing import TRACER
 from app.api.v1.endpoints import router as v1_router
 
 logger = logging.getLogger('dockdns.main')
@@ -15,14 +17,17 @@ async def lifespan(app: FastAPI):
     logging.basicConfig(level=logging.INFO, format='%(asctime)s - DockDNS - %(levelname)s - %(message)s')
 
     dns_config = DockDNSConfig()
+    TRACER.configure(dns_config.trace_file, dns_config.trace_max_events, dns_config.trace_max_files)
 
-    logger.info(f"[FASTAPI] Starting background Docker watcher with configs {dns_config}...")
-    docker_watcher = DockerWatcher(dns_config)
-    docker_watcher.start()
+    docker_watchers = create_watchers(dns_config)
+    logger.info(f"[FASTAPI] Starting {len(docker_watchers)} background Docker watcher(s) with configs {dns_config}...")
+    for docker_watcher in docker_watchers:
+        await docker_watcher.start()
 
     yield
 
-    docker_watcher.stop()
+    await asyncio.gather(*(docker_watcher.stop() for docker_watcher in docker_watchers))
+    TRACER.flush()
 
 
 app = FastAPI(lifespan=lifespan, title="DockDNS", version="0.1.0", )
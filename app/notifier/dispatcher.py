@@ -0,0 +1,215 @@
+import asyncio
+import logging
+import threading
+from abc import ABC, abstractmethod
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+import httpx
+import time
+
+from agent.dockdns_config import DockDNSConfig
+
+logger = logging.getLogger('dockdns.notifier.dispatcher')
+
+DIGEST_MAX_LINES = 10
+
+
+@dataclass(frozen=True)
+class Notification:
+    kind: str  # plural phrase used in digests, e.g. "routes added"
+    message: str
+    created: float = field(default_factory=time.time)
+
+
+class NotificationSink(ABC):
+    @abstractmethod
+    async def send(self, message: str):
+        """Delivers one (possibly digested) message; raises on failure"""
+
+    async def aclose(self):
+        pass
+
+
+class TelegramSink(NotificationSink):
+    def __init__(self, token: str, chat_id: str, timeout: float = 10.0):
+        self.url = f"https://api.telegram.org/bot{token}/sendMessage"
+        self.chat_id = chat_id
+        self._client = httpx.AsyncClient(timeout=timeout)
+
+    async def send(self, message: str):
+        response = await self._client.post(self.url, data={"chat_id": self.chat_id, "text": message})
+        response.raise_for_status()
+
+    async def aclose(self):
+        await self._client.aclose()
+
+
+class MemorySink(NotificationSink):
+    """Local stand-in that keeps delivered messages in memory, for tests and dry runs"""
+
+    def __init__(self):
+        self.messages: List[str] = []
+
+    async def send(self, message: str):
+        self.messages.append(message)
+
+
+class RateLimiter:
+    """Token bucket: ``rate`` messages per second on average with bursts of up to ``burst``"""
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+
+    async def acquire(self):
+        while True:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+def digest(notifications: List[Notification], window: float) -> str:
+    """One message for a batch, e.g. ``42 routes added in the last 10s`` followed by the first entries"""
+    if len(notifications) == 1:
+        return notifications[0].message
+    counts = Counter(notification.kind for notification in notifications)
+    summary = ", ".join(f"{count} {kind}" for kind, count in counts.items())
+    lines = [f"{summary} in the last {window:g}s"]
+    lines += [f"• {notification.message}" for notification in notifications[:DIGEST_MAX_LINES]]
+    if len(notifications) > DIGEST_MAX_LINES:
+        lines.append(f"… and {len(notifications) - DIGEST_MAX_LINES} more")
+    return "\n".join(lines)
+
+
+class NotificationDispatcher:
+    """
+    Delivers notifications off the caller's thread, on a private event loop.
+
+    ``notify`` never blocks: notifications go to a bounded queue and are dropped (and counted) when
+    it is full. Each channel collects what arrives within ``digest_window`` seconds into one digest
+    message and sends through its own rate limiter, so a mass deploy costs a handful of API calls.
+    """
+
+    def __init__(self, sinks: Dict[str, NotificationSink], queue_size: int = 1000, digest_window: float = 10.0,
+                 rate: float = 1.0, burst: int = 5):
+        self.sinks = sinks
+        self.queue_size = queue_size
+        self.digest_window = digest_window
+        self.limiters = {channel: RateLimiter(rate, burst) for channel in sinks}
+        self.received = 0
+        self.dropped = 0
+        self.sent = 0
+        self.failed = 0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._queues: Dict[str, asyncio.Queue] = {}
+        self._batches: Dict[str, List[Notification]] = {}
+        self._tasks: List[asyncio.Task] = []
+
+    def stats(self) -> dict:
+        return {'received': self.received, 'dropped': self.dropped, 'sent': self.sent, 'failed': self.failed}
+
+    def start(self):
+        if self._thread or not self.sinks:
+            return
+        self._loop = asyncio.new_event_loop()
+        ready = threading.Event()
+        self._thread = threading.Thread(name='NotificationLoop', target=self._run, args=(ready,), daemon=True)
+        self._thread.start()
+        ready.wait()
+
+    def _run(self, ready: threading.Event):
+        asyncio.set_event_loop(self._loop)
+        for channel in self.sinks:
+            self._queues[channel] = asyncio.Queue(self.queue_size)
+            self._tasks.append(self._loop.create_task(self._deliver(channel)))
+        ready.set()
+        self._loop.run_forever()
+
+    def notify(self, kind: str, message: str):
+        """Thread-safe and non-blocking; a no-op when no channel is configured"""
+        if self._loop is None:
+            return
+        self.received += 1
+        self._loop.call_soon_threadsafe(self._enqueue, Notification(kind, message))
+
+    def _enqueue(self, notification: Notification):
+        for channel, queue in self._queues.items():
+            try:
+                queue.put_nowait(notification)
+            except asyncio.QueueFull:
+                self.dropped += 1
+                logger.warning(f"[NOTIFY] {channel} queue full, dropping: {notification.message}")
+
+    async def _deliver(self, channel: str):
+        queue = self._queues[channel]
+        while True:
+            # Kept in _batches until delivered, so stop() can still flush a batch waiting for its window
+            batch = self._batches[channel] = [await queue.get()]
+            if self.digest_window > 0:
+                await asyncio.sleep(self.digest_window)
+            while not queue.empty():
+                batch.append(queue.get_nowait())
+            await self.limiters[channel].acquire()
+            try:
+                await self.sinks[channel].send(digest(batch, self.digest_window))
+                self.sent += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.failed += 1
+                logger.warning(f"[NOTIFY] {channel} failed to deliver {len(batch)} notifications: {e}")
+            self._batches[channel] = []
+
+    async def _drain(self, timeout: float):
+        """Sends whatever is still queued, bypassing the digest delay, then closes the sinks"""
+        for task in self._tasks:
+            task.cancel()
+        for channel, queue in self._queues.items():
+            batch = self._batches.pop(channel, [])
+            while not queue.empty():
+                batch.append(queue.get_nowait())
+            if batch:
+                try:
+                    await asyncio.wait_for(self.sinks[channel].send(digest(batch, self.digest_window)), timeout)
+                    self.sent += 1
+                except Exception as e:
+                    self.failed += 1
+                    logger.warning(f"[NOTIFY] {channel} failed to deliver {len(batch)} notifications: {e}")
+            await self.sinks[channel].aclose()
+
+    def stop(self, timeout: float = 5.0):
+        if self._loop is None:
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(self._drain(timeout), self._loop).result(timeout + 1)
+        except Exception as e:
+            logger.warning(f"[NOTIFY] Failed to flush notifications on shutdown: {e}")
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop = None
+        self._thread = None
+        self._queues, self._batches, self._tasks = {}, {}, []
+        logger.info(f"[NOTIFY] Dispatcher stopped: {self.stats()}")
+
+
+def create_dispatcher(config: DockDNSConfig, sinks: Optional[Dict[str, NotificationSink]] = None
+                      ) -> NotificationDispatcher:
+    """Dispatcher for the configured channels (Telegram when a token and chat id are set)"""
+    if sinks is None:
+        sinks = {}
+        if config.notifications_enabled and config.telegram_token and config.telegram_chat_id:
+            sinks['telegram'] = TelegramSink(config.telegram_token, config.telegram_chat_id)
+    return NotificationDispatcher(sinks,
+                                  queue_size=config.notification_queue_size,
+                                  digest_window=config.notification_digest_window,
+                                  rate=config.notification_rate,
+                                  burst=config.notification_burst,)
@@ -0,0 +1,305 @@
+"""
+In-process stand-ins for the Docker API and Pi-hole (customdns.php, or the v6 REST API) used by the benchmarks.
+
+Only the calls DockDNS makes are implemented: ``api.containers``, ``api.inspect_container``,
+``containers.list`` and a blocking ``events`` stream fed from a queue.
+"""
+import json
+import queue
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, unquote, urlparse
+
+import docker.errors
+
+
+class FakeContainer:
+    def __init__(self, attrs: dict):
+        self.attrs = attrs
+        self.id = attrs['Id']
+        self.name = attrs['Name'].lstrip('/')
+        self.labels = attrs['Config']['Labels']
+
+
+class FakeDockerAPI:
+    def __init__(self, docker: 'FakeDocker'):
+        self.docker = docker
+
+    def containers(self, filters: Optional[dict] = None, **kwargs) -> List[dict]:
+        self.docker.calls['list'] += 1
+        self.docker.sleep()
+        return [self.docker.summary(attrs) for attrs in list(self.docker.running.values())]
+
+    def inspect_container(self, container_id: str) -> dict:
+        self.docker.calls['inspect'] += 1
+        self.docker.sleep()
+        try:
+            return self.docker.running[container_id]
+        except KeyError:
+            raise docker.errors.NotFound(f"No such container: {container_id}")
+
+
+class FakeContainers:
+    def __init__(self, docker: 'FakeDocker'):
+        self.docker = docker
+
+    def list(self, filters: Optional[dict] = None, **kwargs) -> List[FakeContainer]:
+        return [FakeContainer(attrs) for attrs in self.docker.api.containers(filters)]
+
+    def get(self, container_id: str) -> FakeContainer:
+        return FakeContainer(self.docker.api.inspect_container(container_id))
+
+
+class FakeEventStream:
+    """Blocking event iterator; like docker's ``CancellableStream`` it only ends when closed"""
+
+    def __init__(self, events: 'queue.Queue[dict]'):
+        self._events = events
+        self._closed = threading.Event()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> dict:
+        while not self._closed.is_set():
+            try:
+                return self._events.get(timeout=0.05)
+            except queue.Empty:
+                continue
+        raise StopIteration
+
+    def close(self):
+        self._closed.set()
+
+
+class FakeDocker:
+    """Fake ``docker.DockerClient`` with ``latency`` seconds per API call"""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.running: Dict[str, dict] = {}
+        self.calls = {'list': 0, 'inspect': 0, 'events': 0}
+        self.api = FakeDockerAPI(self)
+        self.containers = FakeContainers(self)
+        self._events: 'queue.Queue[dict]' = queue.Queue()
+        self._next_ip = 2
+
+    def sleep(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    def create(self, name: str, labels: Optional[dict] = None) -> dict:
+        container_id = f"{self._next_ip:064x}"
+        ip = f"10.{(self._next_ip >> 16) & 255}.{(self._next_ip >> 8) & 255}.{self._next_ip & 255}"
+        self._next_ip += 1
+        attrs = {
+            'Id': container_id,
+            'Name': f"/{name}",
+            'Config': {'Image': 'bench:latest', 'Labels': dict(labels or {}), 'ExposedPorts': {'80/tcp': {}}},
+            'HostConfig': {'NetworkMode': 'bridge'},
+            'NetworkSettings': {'IPAddress': ip, 'Networks': {'bridge': {'IPAddress': ip}}},
+        }
+        self.running[container_id] = attrs
+        return attrs
+
+    @staticmethod
+    def summary(attrs: dict) -> dict:
+        return {
+            'Id': attrs['Id'],
+            'Names': [attrs['Name']],
+            'Image': attrs['Config']['Image'],
+            'Labels': attrs['Config']['Labels'],
+            'HostConfig': attrs['HostConfig'],
+            'Ports': [{'PrivatePort': 80, 'Type': 'tcp'}],
+            'NetworkSettings': {'Networks': attrs['NetworkSettings']['Networks']},
+        }
+
+    def emit(self, action: str, container_id: str):
+        attrs = self.running.get(container_id, {})
+        now = time.time_ns()
+        self._events.put({
+            'Type': 'container', 'Action': action, 'id': container_id, 'status': action,
+            'Actor': {'ID': container_id, 'Attributes': {'name': attrs.get('Name', '/').lstrip('/'),
+                                                         **attrs.get('Config', {}).get('Labels', {})}},
+            'time': now // 1_000_000_000, 'timeNano': now,
+        })
+
+    def start(self, name: str, labels: Optional[dict] = None) -> str:
+        container_id = self.create(name, labels)['Id']
+        self.emit('start', container_id)
+        return container_id
+
+    def events(self, decode: bool = True, filters: Optional[dict] = None, since=None, **kwargs) -> FakeEventStream:
+        self.calls['events'] += 1
+        return FakeEventStream(self._events)
+
+    def close(self):
+        """Like ``DockerClient.close``, leaves a stream waiting for events blocked"""
+
+
+class FakePiHole:
+    """
+    Local HTTP stand-in for ``/admin/scripts/pi-hole/php/customdns.php`` or, with ``api_version=6``,
+    for the v6 ``/api/auth``, ``/api/config/dns/hosts[/{entry}]`` and ``PATCH /api/config`` endpoints.
+
+    Every request sleeps ``latency`` seconds and fails with a 503 with probability ``error_rate``.
+    ``added_at`` keeps when each hostname was first added, for convergence measurements.
+    """
+
+    def __init__(self, latency: float = 0.0, error_rate: float = 0.0, seed: int = 0, api_version: int = 5,
+                 password: str = ''):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.api_version = api_version
+        self.password = password
+        self.sessions = set()
+        self.logins = 0
+        self.records: Dict[str, str] = {}
+        self.added_at: Dict[str, int] = {}
+        self.requests = 0
+        self.errors = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(name='FakePiHole', target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def start(self) -> 'FakePiHole':
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _fail(self) -> bool:
+        with self._lock:
+            self.requests += 1
+            if self.error_rate and self._random.random() < self.error_rate:
+                self.errors += 1
+                return True
+        return False
+
+    def _apply(self, form: Dict[str, str]) -> str:
+        action, hostname, ip = form.get('action'), form.get('domain', ''), form.get('ip', '')
+        with self._lock:
+            if action == 'get':
+                return '\n'.join(f"{ip} {hostname}" for hostname, ip in self.records.items())
+            if action == 'add':
+                self.records[hostname] = ip
+                self.added_at.setdefault(hostname, time.time_ns())
+            elif action == 'delete':
+                self.records.pop(hostname, None)
+        return '{"success":true}'
+
+    def _hosts(self) -> List[str]:
+        return [f"{ip} {hostname}" for hostname, ip in self.records.items()]
+
+    def _api(self, method: str, path: str, sid: Optional[str], body: dict):
+        """v6 REST API: returns (status, JSON response)"""
+        if path == '/api/auth' and method == 'POST':
+            if self.password and body.get('password') != self.password:
+                return 401, {'session': {'valid': False, 'sid': None, 'message': 'password incorrect'}}
+            with self._lock:
+                self.logins += 1
+                sid = uuid.uuid4().hex if self.password else None
+                if sid:
+                    self.sessions.add(sid)
+            return 200, {'session': {'valid': True, 'sid': sid, 'validity': 1800}}
+        if self.password and sid not in self.sessions:
+            return 401, {'error': {'key': 'unauthorized'}}
+        if path == '/api/auth' and method == 'DELETE':
+            with self._lock:
+                self.sessions.discard(sid)
+            return 204, {}
+        if path == '/api/config/dns/hosts' and method == 'GET':
+            with self._lock:
+                return 200, {'config': {'dns': {'hosts': self._hosts()}}}
+        if path.startswith('/api/config/dns/hosts/') and method in ('PUT', 'DELETE'):
+            ip, _, hostname = unquote(path.rsplit('/', 1)[1]).partition(' ')
+            with self._lock:
+                present = self.records.get(hostname) == ip
+                if method == 'PUT':
+                    if present:
+                        return 400, {'error': {'key': 'bad_request', 'message': 'Item already present'}}
+                    self.records[hostname] = ip
+                    self.added_at.setdefault(hostname, time.time_ns())
+                    return 201, {}
+                if not present:
+                    return 404, {'error': {'key': 'not_found', 'message': 'Item not found'}}
+                del self.records[hostname]
+                return 204, {}
+        if path == '/api/config' and method == 'PATCH':
+            hosts = body.get('config', {}).get('dns', {}).get('hosts')
+            if hosts is not None:
+                now = time.time_ns()
+                with self._lock:
+                    self.records = {name: parts[0] for parts in (entry.split() for entry in hosts)
+                                    for name in parts[1:]}
+                    for hostname in self.records:
+                        self.added_at.setdefault(hostname, now)
+            return 200, {'config': body.get('config', {})}
+        return 404, {'error': {'key': 'not_found'}}
+
+    def _handler(self):
+        pihole = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # Headers and body are separate writes: with Nagle on, a multi-segment body waits for the client's
+            # delayed ACK (~40 ms) on every keep-alive response
+            disable_nagle_algorithm = True
+
+            def _respond(self, form: Dict[str, str], method: str = 'GET'):
+                if pihole.latency:
+                    time.sleep(pihole.latency)
+                if pihole._fail():
+                    status, body = 503, b'unavailable'
+                elif pihole.api_version == 6:
+                    status, payload = pihole._api(method, urlparse(self.path).path, self.headers.get('X-FTL-SID'),
+                                                  form)
+                    body = json.dumps(payload).encode() if status != 204 else b''
+                else:
+                    status, body = 200, pihole._apply(form).encode()
+                self.send_response(status)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _json(self) -> dict:
+                length = int(self.headers.get('Content-Length', 0))
+                return json.loads(self.rfile.read(length) or b'{}')
+
+            def do_GET(self):
+                query = parse_qs(urlparse(self.path).query)
+                self._respond({key: values[0] for key, values in query.items()})
+
+            def do_POST(self):
+                if pihole.api_version == 6:
+                    self._respond(self._json(), 'POST')
+                    return
+                length = int(self.headers.get('Content-Length', 0))
+                form = parse_qs(self.rfile.read(length).decode())
+                self._respond({key: values[0] for key, values in form.items()})
+
+            def do_PUT(self):
+                self._respond(self._json(), 'PUT')
+
+            def do_PATCH(self):
+                self._respond(self._json(), 'PATCH')
+
+            def do_DELETE(self):
+                self._respond(self._json(), 'DELETE')
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
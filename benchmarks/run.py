@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+DockDNS benchmark: drives the real DockerEventMonitor against FakeDocker and FakePiHole.
+
+For every container count N it measures
+
+* ``startup_sync_seconds``: sync_existing_containers with N running containers
+* ``events_per_second`` and ``convergence_p50/p99_seconds``: N start events through monitor_events,
+  from the event timestamp until the record exists in the fake Pi-hole
+* ``state_bytes_written``: bytes written to the shared state by both phases
+
+Results are written as JSON (default ``benchmarks/results/<timestamp>.json``) so runs can be compared.
+
+    python benchmarks/run.py --sizes 10,100,1000 --pihole-latency 0.005 --pihole-error-rate 0.01
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+from typing import Dict, List
+
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.fakes import FakeDocker, FakePiHole  # noqa: E402
+from main import DockerEventMonitor, PiHoleDNSManager  # noqa: E402
+from core.tracing import TRACER  # noqa: E402
+
+logger = logging.getLogger('dockdns.benchmarks')
+
+ENV_PREFIX = 'bench'
+BASE_DOMAIN = 'lan'
+
+
+def hostname(index: int) -> str:
+    return f"{ENV_PREFIX}-c{index}.{BASE_DOMAIN}"
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method='inclusive')[int(q) - 1]
+
+
+def state_bytes_written(monitor: DockerEventMonitor, state_dir: str) -> int:
+    """bytes_written of the journaled file store; for other backends the size of what is on disk"""
+    store = getattr(monitor.state_store, 'store', monitor.state_store)
+    if hasattr(store, 'bytes_written'):
+        return store.bytes_written
+    return sum(os.path.getsize(os.path.join(path, name))
+               for path, _, names in os.walk(state_dir) for name in names)
+
+
+def wait_for(condition, timeout: float, interval: float = 0.005) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(interval)
+    return condition()
+
+
+def make_pihole(args) -> FakePiHole:
+    password = 'bench' if args.pihole_api_version == 6 else ''
+    return FakePiHole(args.pihole_latency, args.pihole_error_rate, args.seed, args.pihole_api_version,
+                      password).start()
+
+
+def make_monitor(args, pihole: FakePiHole, docker: FakeDocker, state_dir: str):
+    dns_manager = PiHoleDNSManager(pihole.url, pihole.password or None, args.pihole_timeout,
+                                   args.pihole_max_concurrency, args.pihole_max_retries,
+                                   api_version=args.pihole_api_version)
+    monitor = DockerEventMonitor(dns_manager, 'dns.hostname', BASE_DOMAIN, '127.0.0.1', 'bench', state_dir,
+                                 ENV_PREFIX, args.coalesce_window, args.coalesce_max_delay, args.event_workers,
+                                 args.event_queue_size, state_backend=args.state_backend,
+                                 state_flush_interval=args.state_flush_interval, event_resume_max_age=0,
+                                 docker_client=docker)
+    return dns_manager, monitor
+
+
+def bench_startup(args, n: int) -> Dict:
+    pihole = make_pihole(args)
+    docker = FakeDocker(args.docker_latency)
+    for index in range(n):
+        docker.create(f"c{index}")
+    with tempfile.TemporaryDirectory() as state_dir:
+        dns_manager, monitor = make_monitor(args, pihole, docker, state_dir)
+        try:
+            started = time.perf_counter()
+            monitor.sync_existing_containers()
+            elapsed = time.perf_counter() - started
+            monitor.state_store.close()
+            return {
+                'startup_sync_seconds': round(elapsed, 4),
+                'startup_records': sum(1 for index in range(n) if hostname(index) in pihole.records),
+                'startup_state_bytes_written': state_bytes_written(monitor, state_dir),
+                'startup_docker_calls': dict(docker.calls),
+                'startup_pihole_requests': pihole.requests,
+            }
+        finally:
+            dns_manager.close()
+            pihole.stop()
+
+
+def bench_events(args, n: int) -> Dict:
+    pihole = make_pihole(args)
+    docker = FakeDocker(args.docker_latency)
+    with tempfile.TemporaryDirectory() as state_dir:
+        dns_manager, monitor = make_monitor(args, pihole, docker, state_dir)
+        thread = threading.Thread(name='BenchMonitor', target=monitor.monitor_events, daemon=True)
+        try:
+            thread.start()
+            wait_for(lambda: docker.calls['events'] > 0, 10)
+
+            emitted_at = {}
+            started = time.perf_counter()
+            for index in range(n):
+                docker.start(f"c{index}")
+                emitted_at[hostname(index)] = time.time_ns()
+            converged = wait_for(lambda: len(pihole.added_at) >= n, args.timeout)
+            elapsed = time.perf_counter() - started
+
+            latencies = sorted((pihole.added_at[name] - emitted) / 1e9
+                               for name, emitted in emitted_at.items() if name in pihole.added_at)
+            monitor.stop()
+            thread.join(30)
+            return {
+                'events': n,
+                'converged': converged,
+                'events_per_second': round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+                'convergence_p50_seconds': round(percentile(latencies, 50), 4),
+                'convergence_p99_seconds': round(percentile(latencies, 99), 4),
+                'event_state_bytes_written': state_bytes_written(monitor, state_dir),
+                'event_docker_calls': dict(docker.calls),
+                'event_pihole_requests': pihole.requests,
+                'pihole_errors_injected': pihole.errors,
+            }
+        finally:
+            dns_manager.close()
+            pihole.stop()
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except Exception:
+        return 'unknown'
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--sizes', default='10,100,1000', help='comma separated container counts')
+    parser.add_argument('--pihole-latency', type=float, default=0.002, help='seconds per Pi-hole request')
+    parser.add_argument('--pihole-error-rate', type=float, default=0.0, help='share of requests failing with 503')
+    parser.add_argument('--docker-latency', type=float, default=0.0005, help='seconds per Docker API call')
+    parser.add_argument('--pihole-timeout', type=float, default=10.0)
+    parser.add_argument('--pihole-max-concurrency', type=int, default=8)
+    parser.add_argument('--pihole-max-retries', type=int, default=3)
+    parser.add_argument('--pihole-api-version', type=int, default=5, choices=[5, 6])
+    parser.add_argument('--coalesce-window', type=float, default=1.0)
+    parser.add_argument('--coalesce-max-delay', type=float, default=10.0)
+    parser.add_argument('--event-workers', type=int, default=4)
+    parser.add_argument('--event-queue-size', type=int, default=256)
+    parser.add_argument('--state-backend', default='file', choices=['file', 'sqlite'])
+    parser.add_argument('--state-flush-interval', type=float, default=2.0)
+    parser.add_argument('--timeout', type=float, default=300.0, help='seconds to wait for convergence')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--trace', help='also write Chrome trace files with this path prefix')
+    parser.add_argument('--output', help='JSON result file (default: benchmarks/results/<timestamp>.json)')
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    logging.getLogger().setLevel(logging.WARNING)
+    sizes = [int(size) for size in args.sizes.split(',') if size]
+    TRACER.configure(args.trace)
+
+    results = []
+    for n in sizes:
+        logger.warning(f"Benchmarking N={n}...")
+        result = {'containers': n, **bench_startup(args, n), **bench_events(args, n)}
+        results.append(result)
+        print(json.dumps(result))
+    TRACER.flush()
+
+    report = {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'parameters': {key: value for key, value in vars(args).items() if key != 'output'},
+        'results': results,
+    }
+    output = args.output or os.path.join(ROOT, 'benchmarks', 'results', f"{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    logger.warning(f"Results written to {output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,108 +1,168 @@
 #!/usr/bin/env python3
 """
-DockDNS - Automatic DNS management for Docker containers with Pi-hole
-Monitors Docker events and automatically creates/removes DNS records in Pi-hole.
+DockDNS - Automatic DNS management for Docker containers with Pi-hole or a hosts file
+Monitors Docker events and automatically creates/removes DNS records for them.
 """
 
 import os
+import sys
 import time
+import asyncio
 import logging
-import requests
+import signal
+import threading
 import docker
 import socket
-import json
 import hashlib
-import fcntl
 from typing import Optional, Dict, List, Set
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app'))
+
+from agent.container_cache import ContainerMetadataCache  # noqa: E402
+from agent.docker_endpoints import parse_docker_endpoints  # noqa: E402
+from agent.event_coalescer import EventCoalescer  # noqa: E402
+from agent.event_dispatcher import ShardedWorkerPool  # noqa: E402
+from agent.event_stream import NETWORK_ACTIONS, EventCursor, event_filters, stream_events  # noqa: E402
+from core.host_address import HostAddressProvider  # noqa: E402
+from core.metrics import (DOCKER_ERRORS, DOCKER_REQUEST_SECONDS, EVENT_QUEUE_DEPTH, MANAGED_RECORDS,  # noqa: E402
+                          observe_call, observe_convergence, serve_metrics)
+from core.tracing import CORRELATION_ID, TRACER, correlate, event_correlation_id, in_context, span  # noqa: E402
+from dns.manager.dns_manager import DNS_BACKENDS, DNSManager  # noqa: E402
+from dns.manager.hosts.hosts_file import HostsFileDNSManager  # noqa: E402
+from dns.manager.persistence.leader_lease import LeaderLease  # noqa: E402
+from dns.manager.persistence.state_store import StateStore, create_state_store  # noqa: E402
+from dns.manager.pihole.async_pihole_client import create_async_pihole_client  # noqa: E402
+from dns.manager.pihole.config import PiHoleConfig  # noqa: E402
+from dns.manager.pihole.pihole_client import DNSRecord  # noqa: E402
+from dns.manager.pihole.record_index import DNSRecordIndex  # noqa: E402
+from dns.manager.reconciler import DNSReconciler, ReconcilePlan, normalize_records  # noqa: E402
+from domain.container_metadata import ContainerMetadata  # noqa: E402
+from domain.hostname_policy import HostnameIndex, HostnamePolicy, Owner  # noqa: E402
+
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - DockDNS - %(levelname)s - %(message)s')
 logger = logging.getLogger('dockdns')
+logging.getLogger('httpx').setLevel(logging.WARNING)
+
+HEARTBEAT_INTERVAL = 60
+INACTIVE_INSTANCE_THRESHOLD = 300  # 5 minutes
+# A cached "already served" answer older than this is re-checked with Pi-hole before a record is adopted
+ADOPT_MAX_AGE = 2.0
+
+class PiHoleDNSManager(DNSManager):
+    """Blocking facade over AsyncPiHoleClient (or the v6 REST client), which runs on a private event loop thread.
 
-class PiHoleDNSManager:
-    def __init__(self, pihole_url: str, api_token: Optional[str] = None):
+    Callers from several threads share one pooled HTTP client, and the bulk methods write
+    a whole batch of records concurrently (bounded by PIHOLE_MAX_CONCURRENCY). Reads are
+    served from a DNSRecordIndex that is refreshed after PIHOLE_CACHE_TTL seconds and kept
+    up to date in place by our own writes.
+    """
+    def __init__(self, pihole_url: str, api_token: Optional[str] = None, timeout: float = 10.0,
+                 max_concurrency: int = 8, max_retries: int = 3, cache_ttl: float = 60.0, api_version: int = 5):
         self.pihole_url = pihole_url.rstrip('/')
         self.api_token = api_token
-        self.session = requests.Session()
+        self.client = create_async_pihole_client(PiHoleConfig(url=self.pihole_url, api_token=api_token or '',
+                                                              timeout=timeout, max_concurrency=max_concurrency,
+                                                              max_connections=max_concurrency,
+                                                              max_retries=max_retries, api_version=api_version))
+        self.records = DNSRecordIndex(self._fetch_records, ttl=cache_ttl)
+        self._loop = asyncio.new_event_loop()
+        self._loop_thread = threading.Thread(name='PiHoleClientLoop', target=self._loop.run_forever, daemon=True)
+        self._loop_thread.start()
+    
+    def _run(self, coro):
+        return asyncio.run_coroutine_threadsafe(in_context(coro, CORRELATION_ID.get()), self._loop).result()
+    
+    def close(self):
+        if self._loop.is_running():
+            self._run(self.client.aclose())
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._loop_thread.join()
+    
+    def _fetch_records(self) -> List[tuple]:
+        return [(record.hostname, record.ip) for record in self._run(self.client.fetch_dns_records())]
+    
+    def _track(self, action: str, records: List[tuple], results: List[bool]) -> List[bool]:
+        for (hostname, ip), ok in zip(records, results):
+            if ok:
+                if action == 'add':
+                    self.records.add(hostname, ip)
+                else:
+                    self.records.discard(hostname, ip)
+        return results
         
-    def add_dns_record(self, hostname: str, ip: str) -> bool:
-        try:
-            url = f"{self.pihole_url}/admin/scripts/pi-hole/php/customdns.php"
-            data = {
-                'action': 'add',
-                'domain': hostname,
-                'ip': ip
-            }
-            if self.api_token:
-                data['auth'] = self.api_token
-                
-            response = self.session.post(url, data=data)
-            response.raise_for_status()
-            logger.info(f"Added DNS record: {hostname} -> {ip}")
-            return True
-        except Exception as e:
-            logger.error(f"Failed to add DNS record {hostname} -> {ip}: {e}")
-            return False
+    def add_dns_records(self, records: List[tuple]) -> List[bool]:
+        results = self._run(self.client.add_dns_records(DNSRecord(hostname, ip) for hostname, ip in records))
+        return self._track('add', records, results)
+    
+    def remove_dns_records(self, records: List[tuple]) -> List[bool]:
+        return self._track('remove', records, self._run(self.client.remove_dns_records(records)))
     
-    def remove_dns_record(self, hostname: str, ip: str) -> bool:
+    def has_dns_record(self, hostname: str, ip: str) -> bool:
+        """
+        Whether Pi-hole already resolves hostname to ip, answered from the record index. A yes from an
+        index older than ADOPT_MAX_AGE is confirmed by a refresh, as another writer may have removed it
+        """
         try:
-            url = f"{self.pihole_url}/admin/scripts/pi-hole/php/customdns.php"
-            data = {
-                'action': 'delete',
-                'domain': hostname,
-                'ip': ip
-            }
-            if self.api_token:
-                data['auth'] = self.api_token
-                
-            response = self.session.post(url, data=data)
-            response.raise_for_status()
-            logger.info(f"Removed DNS record: {hostname} -> {ip}")
-            return True
+            return self.records.contains(hostname, ip, max_age=ADOPT_MAX_AGE)
         except Exception as e:
-            logger.error(f"Failed to remove DNS record {hostname} -> {ip}: {e}")
+            logger.warning(f"Failed to refresh DNS record index: {e}")
             return False
     
-    def get_dns_records(self) -> List[Dict[str, str]]:
-        try:
-            url = f"{self.pihole_url}/admin/scripts/pi-hole/php/customdns.php"
-            params = {'action': 'get'}
-            if self.api_token:
-                params['auth'] = self.api_token
-                
-            response = self.session.get(url, params=params)
-            response.raise_for_status()
-            
-            records = []
-            for line in response.text.strip().split('\n'):
-                if line and ' ' in line:
-                    parts = line.split(' ', 1)
-                    if len(parts) == 2:
-                        records.append({'ip': parts[0], 'domain': parts[1]})
-            return records
-        except Exception as e:
-            logger.error(f"Failed to get DNS records: {e}")
-            return []
+    def fetch_dns_records(self, force: bool = True) -> List[Dict[str, str]]:
+        """Same as get_dns_records, but raises instead of returning an empty list on failure"""
+        return [{'ip': ip, 'domain': hostname} for hostname, ip in sorted(self.records.snapshot(force))]
 
 class DockerEventMonitor:
-    def __init__(self, dns_manager: PiHoleDNSManager, dns_label: str = 'dns.hostname', 
+    def __init__(self, dns_manager: DNSManager, dns_label: str = 'dns.hostname', 
                  base_domain: str = '', docker_host_ip: Optional[str] = None, 
                  instance_id: Optional[str] = None, state_dir: str = '/shared-state',
-                 env_prefix: str = ''):
-        self.client = docker.from_env()
+                 env_prefix: str = '', coalesce_window: float = 1.0, coalesce_max_delay: float = 10.0,
+                 event_workers: int = 4, event_queue_size: int = 256,
+                 state_journal_max_bytes: int = 1024 * 1024, state_backend: str = 'file',
+                 state_flush_interval: float = 2.0, state_flush_max_pending: int = 100,
+                 container_cache_size: int = 1024, event_label_filter: Optional[str] = None,
+                 event_resume_max_age: float = 300.0, docker_client: Optional[docker.DockerClient] = None,
+                 host_ip_refresh_interval: float = 300.0, docker_url: Optional[str] = None,
+                 state_store: Optional[StateStore] = None, hostnames: Optional[HostnameIndex] = None,
+                 cleanup_interval: float = 300.0, leader_lease_ttl: float = 180.0):
+        self.docker_url = docker_url
+        self.client = docker_client or (docker.DockerClient(base_url=docker_url) if docker_url else docker.from_env())
         self.dns_manager = dns_manager
         self.dns_label = dns_label
         self.base_domain = base_domain
-        self.docker_host_ip = docker_host_ip or self._get_docker_host_ip()
+        self.host_address = HostAddressProvider(docker_host_ip, docker_url or os.getenv('DOCKER_HOST'),
+                                                host_ip_refresh_interval)
         self.instance_id = instance_id or self._generate_instance_id()
         self.env_prefix = env_prefix or self._generate_env_prefix()
         self.state_dir = state_dir
-        self.state_file = os.path.join(state_dir, 'dockdns-shared-state.json')
+        # A store passed in is shared with other monitors of this process and closed by its owner
+        self._owns_state_store = state_store is None
+        self.state_store = state_store or create_state_store(state_backend, state_dir, state_journal_max_bytes,
+                                                             state_flush_interval, state_flush_max_pending)
+        self.coalesce_window = coalesce_window
+        self.coalesce_max_delay = coalesce_max_delay
+        self.event_workers = event_workers
+        self.event_queue_size = event_queue_size
+        self.event_label_filter = event_label_filter
+        self.event_resume_max_age = event_resume_max_age
         self.container_dns_records: Dict[str, tuple] = {}
+        self._stopping = threading.Event()
+        self._event_stream = None
+        self._event_stream_lock = threading.RLock()
+        self._state_lock = threading.RLock()
+        self.containers = ContainerMetadataCache(container_cache_size)
+        self.hostname_policy = HostnamePolicy(dns_label, base_domain, self.env_prefix)
+        self.hostnames = hostnames if hostnames is not None else HostnameIndex()
+        self.hostnames.add_local(self.instance_id)
+        self.cleanup_interval = cleanup_interval
+        self.leader_lease = LeaderLease(state_dir, self.instance_id, leader_lease_ttl)
+        self.reconciler = DNSReconciler(dns_manager)
         self._load_state()
+        MANAGED_RECORDS.track(self.instance_id, self._managed_record_counts)
         
     def _generate_instance_id(self) -> str:
         hostname = socket.gethostname()
-        docker_host = os.getenv('DOCKER_HOST', 'unix:///var/run/docker.sock')
+        docker_host = self.docker_url or os.getenv('DOCKER_HOST', 'unix:///var/run/docker.sock')
         unique_string = f"{hostname}-{docker_host}-{self.base_domain}"
         return hashlib.md5(unique_string.encode()).hexdigest()[:8]
     
@@ -114,234 +174,513 @@ class DockerEventMonitor:
             clean_hostname = clean_hostname[:10]
         return clean_hostname or 'env'
     
-    def _get_docker_host_ip(self) -> str:
-        try:
-            docker_host = os.getenv('DOCKER_HOST', 'unix:///var/run/docker.sock')
-            if docker_host.startswith('tcp://'):
-                host = docker_host.replace('tcp://', '').split(':')[0]
-                return host
-            else:
-                return socket.gethostbyname(socket.gethostname())
-        except Exception:
-            return '127.0.0.1'
+    @property
+    def docker_host_ip(self) -> str:
+        """Resolved once and refreshed in the background, see HostAddressProvider"""
+        return self.host_address.address or '127.0.0.1'
     
     def _load_shared_state(self) -> Dict:
-        """Load the shared state file with file locking"""
-        try:
-            os.makedirs(self.state_dir, exist_ok=True)
-            if not os.path.exists(self.state_file):
-                return {'instances': {}, 'last_updated': time.time()}
-                
-            with open(self.state_file, 'r') as f:
-                fcntl.flock(f.fileno(), fcntl.LOCK_SH)
-                return json.load(f)
-        except Exception as e:
-            logger.warning(f"Failed to load shared state from {self.state_file}: {e}")
-            return {'instances': {}, 'last_updated': time.time()}
+        """Load the multi-instance shared state (snapshot plus journal replay)"""
+        return self.state_store.load()
     
-    def _save_shared_state(self, shared_state: Dict):
-        """Save the shared state file with file locking"""
-        try:
-            os.makedirs(self.state_dir, exist_ok=True)
-            shared_state['last_updated'] = time.time()
-            
-            with open(self.state_file, 'w') as f:
-                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
-                json.dump(shared_state, f, indent=2)
-        except Exception as e:
-            logger.warning(f"Failed to save shared state to {self.state_file}: {e}")
+    def _instance_meta(self) -> Dict:
+        return {
+            'hostname': socket.gethostname(),
+            'base_domain': self.base_domain,
+            'env_prefix': self.env_prefix,
+        }
+    
+    def _heartbeat_loop(self, stop: threading.Event):
+        """Renew this instance's lease so peers don't treat it as inactive while it is idle"""
+        while not stop.wait(HEARTBEAT_INTERVAL):
+            try:
+                self.state_store.heartbeat(self.instance_id)
+            except Exception as e:
+                logger.warning(f"Failed to renew lease for instance {self.instance_id}: {e}")
+            try:
+                self._refresh_peer_claims()
+            except Exception as e:
+                logger.warning(f"Failed to refresh hostnames claimed by other instances: {e}")
+    
+    def _refresh_peer_claims(self):
+        """Re-reads the hostnames other instances claim; they change whenever a peer starts or stops a container"""
+        self.hostnames.load(self.state_store.load().get('instances', {}), exclude=[self.instance_id])
     
     def _load_state(self):
         """Load this instance's records from shared state"""
         try:
-            shared_state = self._load_shared_state()
-            instance_data = shared_state.get('instances', {}).get(self.instance_id, {})
-            
-            self.container_dns_records = {}
-            for container_id, record_data in instance_data.get('records', {}).items():
-                self.container_dns_records[container_id] = tuple(record_data)
-                
+            self.container_dns_records = self.state_store.load_instance(self.instance_id)
             logger.info(f"Loaded {len(self.container_dns_records)} DNS records for instance {self.instance_id}")
+            self._refresh_peer_claims()
+            logger.info(f"Indexed {len(self.hostnames)} hostnames claimed by other instances")
         except Exception as e:
             logger.warning(f"Failed to load state for instance {self.instance_id}: {e}")
+        self.hostnames.replace_instance(self.instance_id, self.container_dns_records)
+    
+    def _managed_record_counts(self) -> Dict[str, int]:
+        """Our own records plus the peers' claims; other monitors of this process report their own count"""
+        counts = {instance_id: count for instance_id, count in self.hostnames.counts().items()
+                  if not self.hostnames.is_local(instance_id)}
+        counts[self.instance_id] = len(self.container_dns_records)
+        return counts
     
     def _save_state(self):
-        """Save this instance's records to shared state"""
-        try:
-            shared_state = self._load_shared_state()
-            
-            if 'instances' not in shared_state:
-                shared_state['instances'] = {}
-            
-            shared_state['instances'][self.instance_id] = {
-                'hostname': socket.gethostname(),
-                'base_domain': self.base_domain,
-                'env_prefix': self.env_prefix,
-                'last_seen': time.time(),
-                'records': {k: list(v) for k, v in self.container_dns_records.items()}
-            }
-            
-            self._save_shared_state(shared_state)
-        except Exception as e:
-            logger.warning(f"Failed to save state for instance {self.instance_id}: {e}")
+        """Save all of this instance's records to shared state"""
+        with span('save_state', instance_id=self.instance_id):
+            try:
+                with self._state_lock:
+                    self.state_store.save_instance(self.instance_id, self._instance_meta(),
+                                                   self.container_dns_records)
+            except Exception as e:
+                logger.warning(f"Failed to save state for instance {self.instance_id}: {e}")
+    
+    def _save_record(self, container_id: str):
+        """Persist a single record change of this instance"""
+        with span('save_record', container_id=container_id):
+            try:
+                record = self.container_dns_records.get(container_id)
+                if record:
+                    self.state_store.put_record(self.instance_id, container_id, *record)
+                else:
+                    self.state_store.delete_record(self.instance_id, container_id)
+            except Exception as e:
+                logger.warning(f"Failed to save state for container {container_id}: {e}")
         
     def get_container_hostname(self, container) -> Optional[str]:
-        labels = container.labels or {}
-        
-        if self.dns_label in labels:
-            hostname = labels[self.dns_label]
-        else:
-            container_name = container.name
-            if not container_name or container_name.startswith('/'):
-                return None
-            hostname = container_name.lstrip('/')
+        return self.hostname_policy.hostname(container.name, container.labels)
+    
+    def _log_collision(self, hostname: str, conflict: Owner, container_id: str):
+        owner = 'this instance' if conflict.instance_id == self.instance_id else f"instance {conflict.instance_id}"
+        logger.warning(f"Hostname {hostname} is already owned by container {conflict.container_id[:12]} "
+                       f"on {owner}, skipping container {container_id[:12]}")
+    
+    def _container_running(self, container_id: str) -> bool:
+        try:
+            return bool(self.client.api.inspect_container(container_id)['State']['Running'])
+        except docker.errors.NotFound:
+            return False
+        except Exception as e:
+            logger.warning(f"Failed to inspect container {container_id[:12]}: {e}")
+            return True
+    
+    def _peer_owns(self, hostname: str) -> bool:
+        """Asks the shared state, as peer claims in the index are only refreshed every HEARTBEAT_INTERVAL"""
+        try:
+            return any(instance_id != self.instance_id for instance_id, _, _ in self.state_store.find_owners(hostname))
+        except Exception as e:
+            logger.warning(f"Failed to look up the owners of {hostname}: {e}")
+            return True
+    
+    def _claim_hostname(self, container_id: str, hostname: str, ip: str) -> bool:
+        """Claims hostname for container_id in the collision index, logging the owner on a collision"""
+        owner = Owner(self.instance_id, container_id)
+        conflict = self.hostnames.claim(hostname, owner)
+        if not conflict:
+            return True
+        if conflict.instance_id != self.instance_id:
+            if self.hostnames.is_local(conflict.instance_id) or self._peer_owns(hostname):
+                self._log_collision(hostname, conflict, container_id)
+                return False
+            logger.info(f"Hostname {hostname} was released by instance {conflict.instance_id}, "
+                        f"claiming it for {container_id[:12]}")
+            self.hostnames.transfer(hostname, owner)
+            return True
+        if self._container_running(conflict.container_id):
+            self._log_collision(hostname, conflict, container_id)
+            return False
         
-        # Add environment prefix to avoid conflicts across Docker environments
-        if self.env_prefix and not hostname.startswith(f"{self.env_prefix}-"):
-            hostname = f"{self.env_prefix}-{hostname}"
-            
-        if self.base_domain and '{container-name}' in self.base_domain:
-            hostname = self.base_domain.replace('{container-name}', hostname)
-        elif self.base_domain and '{env-prefix}' in self.base_domain:
-            hostname = self.base_domain.replace('{env-prefix}', self.env_prefix).replace('{container-name}', hostname.replace(f"{self.env_prefix}-", ""))
-        elif self.base_domain:
-            hostname = f"{hostname}.{self.base_domain}"
-            
-        return hostname
+        # A recreated container whose predecessor's stop event has not been handled yet takes the name over
+        logger.info(f"Hostname {hostname} moves from stopped container {conflict.container_id[:12]} "
+                    f"to {container_id[:12]}")
+        with self._state_lock:
+            stale = self.container_dns_records.pop(conflict.container_id, None)
+            self._save_record(conflict.container_id)
+        if stale and stale != (hostname, ip):
+            self.dns_manager.remove_dns_record(*stale)
+        self.hostnames.transfer(hostname, owner)
+        return True
+    
+    def _metadata(self, container) -> ContainerMetadata:
+        """Accepts a docker Container or ContainerMetadata; Containers are parsed once and cached"""
+        if isinstance(container, ContainerMetadata):
+            return container
+        return self.containers.put_attrs(container.attrs)
     
     def get_container_ip(self, container) -> Optional[str]:
-        try:
-            container.reload()
-            network_mode = container.attrs.get('HostConfig', {}).get('NetworkMode', '')
+        with span('get_container_ip', container_id=container.id):
+            try:
+                metadata = self._metadata(container)
+                if metadata.host_network:
+                    return self.docker_host_ip
             
-            if network_mode == 'host':
-                return self.docker_host_ip
-            
-            networks = container.attrs['NetworkSettings']['Networks']
-            for network_name, network_info in networks.items():
-                if network_info.get('IPAddress'):
-                    return network_info['IPAddress']
+                for network_name, ip in metadata.networks.items():
+                    if ip:
+                        return ip
                     
-        except Exception as e:
-            logger.error(f"Failed to get IP for container {container.name}: {e}")
-        return None
+            except Exception as e:
+                logger.error(f"Failed to get IP for container {container.name}: {e}")
+            return None
     
     def handle_container_start(self, container):
-        hostname = self.get_container_hostname(container)
-        if not hostname:
-            logger.debug(f"No hostname found for container {container.name}")
-            return
+        with span('handle_container_start', container_id=container.id):
+            container = self._metadata(container)
+            hostname = self.get_container_hostname(container)
+            if not hostname:
+                logger.debug(f"No hostname found for container {container.name}")
+                return
             
-        ip = self.get_container_ip(container)
-        if not ip:
-            logger.warning(f"No IP found for container {container.name}")
-            return
-            
-        if self.dns_manager.add_dns_record(hostname, ip):
-            self.container_dns_records[container.id] = (hostname, ip)
-            self._save_state()
+            ip = self.get_container_ip(container)
+            if not ip:
+                logger.warning(f"No IP found for container {container.name}")
+                return
+        
+            current = self.container_dns_records.get(container.id)
+            if current == (hostname, ip):
+                logger.debug(f"DNS record {hostname} -> {ip} already registered for container {container.name}")
+                return
+            if not self._claim_hostname(container.id, hostname, ip):
+                return
+            if current:
+                self.dns_manager.remove_dns_record(*current)
+                if current[0] != hostname:
+                    self.hostnames.release(current[0], Owner(self.instance_id, container.id))
+        
+            if self.dns_manager.has_dns_record(hostname, ip):
+                logger.info(f"DNS record {hostname} -> {ip} already served, adopting it")
+            elif not self.dns_manager.add_dns_record(hostname, ip):
+                self.hostnames.release(hostname, Owner(self.instance_id, container.id))
+                return
+            with self._state_lock:
+                self.container_dns_records[container.id] = (hostname, ip)
+                self._save_record(container.id)
     
-    def handle_container_stop(self, container_id: str):
+    def handle_network_change(self, container_id: str):
+        """Moves the container's record to its current IP after a network connect/disconnect"""
+        with span('handle_network_change', container_id=container_id):
+            try:
+                metadata = self.containers.get_or_inspect(self.client, container_id)
+            except docker.errors.NotFound:
+                self.handle_container_stop(container_id)
+                return
+            current = self.container_dns_records.get(container_id)
+            ip = self.get_container_ip(metadata)
+            if not ip:
+                # Disconnected from its last network, usually while stopping; the stop event removes the record
+                logger.debug(f"Container {metadata.name} has no IP left after a network change")
+                return
+            if current and current[1] == ip:
+                return
+            logger.info(f"Container {metadata.name} IP changed: {current[1] if current else None} -> {ip}")
+            self.handle_container_start(metadata)
+    
+    def _network_event_container(self, event: dict) -> Optional[str]:
+        """Id of the container a network connect/disconnect concerns, if DNS for it may need to follow"""
+        if event.get('Type') != 'network' or event.get('Action') not in NETWORK_ACTIONS:
+            return None
+        container_id = event.get('Actor', {}).get('Attributes', {}).get('container')
+        if not container_id:
+            return None
         if container_id in self.container_dns_records:
-            hostname, ip = self.container_dns_records[container_id]
-            if self.dns_manager.remove_dns_record(hostname, ip):
-                del self.container_dns_records[container_id]
-                self._save_state()
+            return container_id
+        cached = self.containers.get(container_id)
+        return container_id if cached and self.get_container_hostname(cached) else None
+    
+    def handle_container_stop(self, container_id: str):
+        with span('handle_container_stop', container_id=container_id):
+            if container_id in self.container_dns_records:
+                hostname, ip = self.container_dns_records[container_id]
+                if self.dns_manager.remove_dns_record(hostname, ip):
+                    with self._state_lock:
+                        self.container_dns_records.pop(container_id, None)
+                        self._save_record(container_id)
+                    self.hostnames.release(hostname, Owner(self.instance_id, container_id))
+    
+    def _fetch_existing_records(self) -> Optional[Set[tuple]]:
+        """Fetch the records the DNS backend serves once; None if it could not be read"""
+        try:
+            return normalize_records(self.dns_manager.fetch_dns_records())
+        except Exception as e:
+            logger.warning(f"Failed to fetch existing DNS records, falling back to blind writes: {e}")
+            return None
+    
+    def build_desired_records(self, containers) -> Dict[str, tuple]:
+        candidates = []
+        for container in containers:
+            container = self._metadata(container)
+            hostname = self.get_container_hostname(container)
+            if not hostname:
+                logger.debug(f"No hostname found for container {container.name}")
+                continue
+            ip = self.get_container_ip(container)
+            if not ip:
+                logger.warning(f"No IP found for container {container.name}")
+                continue
+            candidates.append((container.id, hostname, ip))
+        
+        # Containers that already own their hostname keep it, the others are checked against the index
+        candidates.sort(key=lambda c: self.hostnames.owner(c[1]) != Owner(self.instance_id, c[0]))
+        desired, taken = {}, {}
+        for container_id, hostname, ip in candidates:
+            conflict = self.hostnames.owner(hostname)
+            if conflict and conflict.instance_id != self.instance_id:
+                self._log_collision(hostname, conflict, container_id)
+                continue
+            if hostname in taken:
+                self._log_collision(hostname, Owner(self.instance_id, taken[hostname]), container_id)
+                continue
+            taken[hostname] = container_id
+            desired[container_id] = (hostname, ip)
+        return desired
+    
+    def list_running_containers(self) -> List[ContainerMetadata]:
+        """One ``docker ps`` call; the summaries carry labels and IPs, so no per-container inspect is needed"""
+        with observe_call(DOCKER_REQUEST_SECONDS, DOCKER_ERRORS, 'list'):
+            summaries = self.client.api.containers(filters={'status': 'running'})
+        return [self.containers.put(ContainerMetadata.from_summary(summary)) for summary in summaries]
+    
+    def plan_reconcile(self, existing: Optional[Set[tuple]] = None, stale_only: bool = False) -> ReconcilePlan:
+        """Diff the running containers against this instance's records and Pi-hole's current records"""
+        containers = self.list_running_containers()
+        if stale_only:
+            running_ids = {c.id for c in containers}
+            stale = {k: v for k, v in self.container_dns_records.items() if k not in running_ids}
+            return self.reconciler.plan_removal(stale, existing)
+        return self.reconciler.plan(self.build_desired_records(containers), self.container_dns_records, existing)
+    
+    def apply_plan(self, plan: ReconcilePlan):
+        if plan.empty:
+            logger.info(f"DNS records already in sync: {plan}")
+            return
+        with self._state_lock:
+            result = self.reconciler.apply(plan, self.container_dns_records)
+            self.container_dns_records = result.records
+            self.hostnames.replace_instance(self.instance_id, result.records)
+            self._save_state()
     
     def cleanup_stale_dns_records(self):
         logger.info(f"Cleaning up stale DNS records for instance {self.instance_id}...")
         try:
-            running_containers = self.client.containers.list(filters={'status': 'running'})
-            current_container_ids = {c.id for c in running_containers}
-            
-            stale_records = []
-            for container_id, (hostname, ip) in list(self.container_dns_records.items()):
-                if container_id not in current_container_ids:
-                    stale_records.append((container_id, hostname, ip))
-            
-            for container_id, hostname, ip in stale_records:
-                logger.info(f"Removing stale DNS record managed by this instance: {hostname} -> {ip}")
-                if self.dns_manager.remove_dns_record(hostname, ip):
-                    del self.container_dns_records[container_id]
-            
-            if stale_records:
-                self._save_state()
-                logger.info(f"Cleaned up {len(stale_records)} stale DNS records")
-            
-            self._cleanup_inactive_instances()
-                        
+            plan = self.plan_reconcile(self._fetch_existing_records(), stale_only=True)
+            self.apply_plan(plan)
+            if self.leader_lease.try_acquire():
+                self._cleanup_inactive_instances()
         except Exception as e:
             logger.error(f"Failed to cleanup stale DNS records: {e}")
     
-    def _cleanup_inactive_instances(self):
-        """Remove DNS records from instances that haven't been seen for too long"""
+    def _cleanup_loop(self, stop: threading.Event):
+        """Keeps competing for the cleaner lease; the leader sweeps inactive instances every cleanup_interval"""
+        renew_interval = self.leader_lease.ttl / 3
+        last_sweep = time.monotonic()
+        while not stop.wait(min(renew_interval, self.cleanup_interval) if self.cleanup_interval > 0
+                            else renew_interval):
+            if not self.leader_lease.try_acquire():
+                continue
+            if 0 < self.cleanup_interval <= time.monotonic() - last_sweep:
+                last_sweep = time.monotonic()
+                self._cleanup_inactive_instances()
+    
+    def _cleanup_inactive_instances(self, existing: Optional[Set[tuple]] = None):
+        """Remove the DNS records of instances that haven't been seen for too long, as one batched diff"""
         try:
-            shared_state = self._load_shared_state()
-            current_time = time.time()
-            inactive_threshold = 300  # 5 minutes
+            inactive_instances = self.state_store.inactive_instances(INACTIVE_INSTANCE_THRESHOLD,
+                                                                     exclude=self.instance_id)
+            if not inactive_instances:
+                return
             
-            inactive_instances = []
-            for instance_id, instance_data in shared_state.get('instances', {}).items():
-                if instance_id == self.instance_id:
+            logger.info(f"Found {len(inactive_instances)} inactive instances, cleaning up their DNS records")
+            if existing is None:
+                existing = self._fetch_existing_records()
+            
+            # Records still served by this instance stay, and one record left by several dead peers is deleted once
+            keep = set(self.container_dns_records.values())
+            records = {}
+            for instance_id in inactive_instances:
+                for container_id, record in self.state_store.load_instance(instance_id).items():
+                    if record not in keep:
+                        keep.add(record)
+                        records[f"{instance_id}/{container_id}"] = record
+            plan = self.reconciler.plan_removal(records, existing)
+            logger.info(f"Removing DNS records from inactive instances {', '.join(inactive_instances)}: {plan}")
+            result = self.reconciler.apply(plan, records)
+            # An instance whose records could not all be removed keeps its state, so the next sweep retries them
+            unfinished = {key.rsplit('/', 1)[0] for key in result.records}
+            for instance_id in inactive_instances:
+                if instance_id in unfinished:
                     continue
-                    
-                last_seen = instance_data.get('last_seen', 0)
-                if current_time - last_seen > inactive_threshold:
-                    inactive_instances.append(instance_id)
+                self.state_store.drop_instance(instance_id)
+                self.hostnames.drop_instance(instance_id)
+            
+            logger.info(f"Cleaned up {len(inactive_instances) - len(unfinished)} inactive instances"
+                        + (f", kept {', '.join(sorted(unfinished))} for the next sweep" if unfinished else ""))
             
-            if inactive_instances:
-                logger.info(f"Found {len(inactive_instances)} inactive instances, cleaning up their DNS records")
-                
-                for instance_id in inactive_instances:
-                    instance_data = shared_state['instances'][instance_id]
-                    for container_id, record_data in instance_data.get('records', {}).items():
-                        hostname, ip = record_data
-                        logger.info(f"Removing DNS record from inactive instance {instance_id}: {hostname} -> {ip}")
-                        self.dns_manager.remove_dns_record(hostname, ip)
-                    
-                    del shared_state['instances'][instance_id]
-                
-                self._save_shared_state(shared_state)
-                logger.info(f"Cleaned up {len(inactive_instances)} inactive instances")
-                
         except Exception as e:
             logger.error(f"Failed to cleanup inactive instances: {e}")
     
-    def sync_existing_containers(self):
+    def sync_existing_containers(self, existing: Optional[Set[tuple]] = None):
+        """Reconcile all running containers against Pi-hole, writing only the missing and stale records"""
         logger.info("Syncing existing running containers...")
+        started = time.monotonic()
         try:
-            containers = self.client.containers.list(filters={'status': 'running'})
-            for container in containers:
-                self.handle_container_start(container)
+            if existing is None:
+                existing = self._fetch_existing_records()
+            plan = self.plan_reconcile(existing)
+            logger.info(f"Sync plan for running containers: {plan}")
+            self.apply_plan(plan)
+            logger.info(f"Existing containers in sync after {time.monotonic() - started:.2f}s")
         except Exception as e:
             logger.error(f"Failed to sync existing containers: {e}")
     
     def monitor_events(self):
         logger.info("Starting Docker event monitoring...")
-        self.cleanup_stale_dns_records()
-        self.sync_existing_containers()
+        self.state_store.register(self.instance_id, self._instance_meta())
+        stop_heartbeat = threading.Event()
+        threading.Thread(name='HeartbeatThread', target=self._heartbeat_loop, args=(stop_heartbeat,),
+                         daemon=True).start()
+        threading.Thread(name='CleanupLeaderThread', target=self._cleanup_loop, args=(stop_heartbeat,),
+                         daemon=True).start()
+        self.host_address.start()
+        
+        # A recent cursor means the daemon can replay what we missed, so the full resync is skipped
+        cursor = EventCursor(os.path.join(self.state_dir, 'events', f"{self.instance_id}.cursor"))
+        existing = None
+        if cursor.resumable(self.event_resume_max_age):
+            logger.info(f"Resuming Docker events since {cursor.since} ({cursor.age():.0f}s ago), skipping full sync")
+        else:
+            cursor.reset()
+            existing = self._fetch_existing_records()
+            self.sync_existing_containers(existing)
+        # Only the lease holder sweeps dead peers, so their records are not deleted by every instance at once
+        if self.leader_lease.try_acquire():
+            self._cleanup_inactive_instances(existing)
         
+        def handle_event(container_id: str, action: str, event: Optional[dict] = None):
+            try:
+                self.handle_container_event(container_id, action, event)
+            finally:
+                cursor.done(event)
+        
+        # The reader thread only parses events; inspects, Pi-hole writes and state saves run on the workers.
+        # The saved cursor only moves past an event once a worker handled it (or it was coalesced away).
+        # Both the coalescer and the worker queues are bounded, so a slow Pi-hole blocks the reader.
+        workers = ShardedWorkerPool(handle_event, self.event_workers, self.event_queue_size)
+        workers.start()
+        EVENT_QUEUE_DEPTH.track(self.instance_id, lambda: workers.depth)
+        coalescer = EventCoalescer(workers.submit, self.coalesce_window, self.coalesce_max_delay,
+                                   on_discard=cursor.done, max_pending=self.event_queue_size)
+        coalescer.start()
         try:
-            for event in self.client.events(decode=True):
-                if event.get('Type') == 'container':
+            filters = event_filters(label=self.event_label_filter)
+            for event in stream_events(self.client, cursor, filters, running=lambda: not self._stopping.is_set(),
+                                       on_stream=self._set_event_stream):
+                network_container = self._network_event_container(event)
+                self.containers.handle_event(event)
+                self.host_address.handle_event(event)
+                if network_container:
+                    cursor.track(event)
+                    coalescer.push(network_container, 'network', event, replace=False)
+                elif event.get('Type') == 'container':
                     action = event.get('Action')
                     container_id = event.get('id')
                     
                     if action == 'start':
-                        try:
-                            container = self.client.containers.get(container_id)
-                            self.handle_container_start(container)
-                        except docker.errors.NotFound:
-                            logger.warning(f"Container {container_id} not found")
-                    
+                        cursor.track(event)
+                        coalescer.push(container_id, 'start', event)
                     elif action in ['stop', 'die', 'kill']:
-                        self.handle_container_stop(container_id)
+                        cursor.track(event)
+                        coalescer.push(container_id, 'stop', event)
                         
         except KeyboardInterrupt:
             logger.info("Shutting down...")
         except Exception as e:
             logger.error(f"Error monitoring events: {e}")
             raise
+        finally:
+            coalescer.stop()
+            workers.stop()
+            self.host_address.stop()
+            EVENT_QUEUE_DEPTH.untrack(self.instance_id)
+            MANAGED_RECORDS.untrack(self.instance_id)
+            cursor.save()
+            stop_heartbeat.set()
+            self.leader_lease.release()
+            if self._owns_state_store:
+                self.state_store.close()
+            stats = coalescer.stats()
+            logger.info(f"Event coalescing: {stats['received']} events, {stats['emitted']} handled, "
+                        f"{stats['saved']} redundant writes saved")
+            logger.info(f"Event workers: {workers.stats()}")
+            logger.info(f"Container metadata cache: {self.containers.stats()}")
+    
+    def _set_event_stream(self, stream):
+        with self._event_stream_lock:
+            self._event_stream = stream
+            stopping = self._stopping.is_set()
+        if stopping:
+            stream.close()
+    
+    def stop(self):
+        """Ends monitor_events by closing its event stream, which unblocks a stream waiting for events"""
+        with self._event_stream_lock:
+            self._stopping.set()
+            stream = self._event_stream
+        if stream is not None:
+            try:
+                stream.close()
+            except Exception as e:
+                logger.debug(f"Failed to close Docker event stream for {self.docker_url}: {e}")
+    
+    def handle_container_event(self, container_id: str, action: str, event: Optional[dict] = None):
+        with correlate(event_correlation_id(container_id, action, event)), \
+                span('handle_container_event', container_id=container_id, action=action):
+            if action == 'start':
+                try:
+                    self.handle_container_start(self.containers.get_or_inspect(self.client, container_id))
+                except docker.errors.NotFound:
+                    logger.warning(f"Container {container_id} not found")
+            elif action == 'stop':
+                self.handle_container_stop(container_id)
+            elif action == 'network':
+                self.handle_network_change(container_id)
+        observe_convergence(event, action)
+
+def stop_monitors(monitors: List[DockerEventMonitor]):
+    """
+    Ends every monitor's event loop by closing its event stream. The Docker clients stay open: closing one
+    does not unblock a stream waiting for events, and the workers may still inspect containers while draining.
+    """
+    for monitor in monitors:
+        monitor.stop()
+
+def run_monitors(monitors: List[DockerEventMonitor]):
+    """Runs every monitor's event loop, each on its own thread when there are several, until all return"""
+    if len(monitors) == 1:
+        monitors[0].monitor_events()
+        return
+    
+    failures = []
+    
+    def run(monitor: DockerEventMonitor):
+        try:
+            monitor.monitor_events()
+        except Exception as e:
+            logger.error(f"Monitor for {monitor.docker_url} failed: {e}")
+            failures.append(monitor)
+    
+    threads = [threading.Thread(name=f"Monitor-{monitor.env_prefix}", target=run, args=(monitor,), daemon=True)
+               for monitor in monitors]
+    for thread in threads:
+        thread.start()
+    try:
+        while any(thread.is_alive() for thread in threads):
+            for thread in threads:
+                thread.join(1)
+    except KeyboardInterrupt:
+        logger.info("Shutting down...")
+        stop_monitors(monitors)
+        for thread in threads:
+            thread.join(10)
+    if failures:
+        raise RuntimeError(f"{len(failures)} of {len(monitors)} Docker monitors failed")
 
 def main():
     pihole_url = os.getenv('PIHOLE_URL', 'http://pihole.local')
@@ -352,31 +691,109 @@ def main():
     instance_id = os.getenv('INSTANCE_ID')
     state_dir = os.getenv('STATE_DIR', '/shared-state')
     env_prefix = os.getenv('ENV_PREFIX', '')
+    pihole_timeout = float(os.getenv('PIHOLE_TIMEOUT', '10'))
+    pihole_max_concurrency = int(os.getenv('PIHOLE_MAX_CONCURRENCY', '8'))
+    pihole_max_retries = int(os.getenv('PIHOLE_MAX_RETRIES', '3'))
+    pihole_cache_ttl = float(os.getenv('PIHOLE_CACHE_TTL', '60'))
+    pihole_api_version = int(os.getenv('PIHOLE_API_VERSION', '5'))
+    coalesce_window = float(os.getenv('EVENT_COALESCE_WINDOW', '1.0'))
+    coalesce_max_delay = float(os.getenv('EVENT_COALESCE_MAX_DELAY', '10'))
+    event_workers = int(os.getenv('EVENT_WORKERS', '4'))
+    event_queue_size = int(os.getenv('EVENT_QUEUE_SIZE', '256'))
+    state_journal_max_bytes = int(os.getenv('STATE_JOURNAL_MAX_BYTES', str(1024 * 1024)))
+    state_backend = os.getenv('STATE_BACKEND', 'file')
+    state_flush_interval = float(os.getenv('STATE_FLUSH_INTERVAL', '2'))
+    state_flush_max_pending = int(os.getenv('STATE_FLUSH_MAX_PENDING', '100'))
+    container_cache_size = int(os.getenv('CONTAINER_CACHE_SIZE', '1024'))
+    event_label_filter = os.getenv('EVENT_LABEL_FILTER') or None
+    event_resume_max_age = float(os.getenv('EVENT_RESUME_MAX_AGE', '300'))
+    metrics_port = int(os.getenv('METRICS_PORT', '0'))
+    trace_file = os.getenv('TRACE_FILE') or None
+    trace_max_events = int(os.getenv('TRACE_MAX_EVENTS', '100000'))
+    trace_max_files = int(os.getenv('TRACE_MAX_FILES', '5'))
+    host_ip_refresh_interval = float(os.getenv('HOST_IP_REFRESH_INTERVAL', '300'))
+    docker_hosts = parse_docker_endpoints(os.getenv('DOCKER_HOSTS'))
+    cleanup_interval = float(os.getenv('CLEANUP_INTERVAL', '300'))
+    leader_lease_ttl = float(os.getenv('LEADER_LEASE_TTL', '180'))
+    dns_backend = os.getenv('DNS_BACKEND', 'pihole')
+    hosts_file = os.getenv('HOSTS_FILE', '/etc/dockdns/hosts')
+    hosts_write_delay = float(os.getenv('HOSTS_WRITE_DELAY', '0.5'))
+    hosts_reload_pid_file = os.getenv('HOSTS_RELOAD_PID_FILE') or None
+    hosts_reload_command = os.getenv('HOSTS_RELOAD_COMMAND') or None
     
-    if not pihole_url:
+    if dns_backend not in DNS_BACKENDS:
+        logger.error(f"Unknown DNS_BACKEND {dns_backend!r}, expected one of {', '.join(DNS_BACKENDS)}")
+        return 1
+    if dns_backend == 'pihole' and not pihole_url:
         logger.error("PIHOLE_URL environment variable is required")
         return 1
     
     logger.info("🚀 Starting DockDNS - Automatic DNS for Docker containers")
-    logger.info(f"📡 Pi-hole server: {pihole_url}")
+    if dns_backend == 'hosts':
+        logger.info(f"📄 Hosts file: {hosts_file}")
+    else:
+        logger.info(f"📡 Pi-hole server: {pihole_url} (API v{pihole_api_version})")
     logger.info(f"🏷️  DNS label: {dns_label}")
-    logger.info(f"💾 Shared state directory: {state_dir}")
+    logger.info(f"💾 Shared state directory: {state_dir} ({state_backend} backend)")
     if base_domain:
         logger.info(f"🌐 Base domain: {base_domain}")
     if docker_host_ip:
         logger.info(f"🖥️  Docker host IP: {docker_host_ip}")
     
-    dns_manager = PiHoleDNSManager(pihole_url, api_token)
-    monitor = DockerEventMonitor(dns_manager, dns_label, base_domain, docker_host_ip, instance_id, state_dir, env_prefix)
+    if dns_backend == 'hosts':
+        dns_manager = HostsFileDNSManager(hosts_file, hosts_write_delay, hosts_reload_pid_file, hosts_reload_command)
+    else:
+        dns_manager = PiHoleDNSManager(pihole_url, api_token, pihole_timeout, pihole_max_concurrency,
+                                       pihole_max_retries, pihole_cache_ttl, pihole_api_version)
+    monitor_args = (dns_manager, dns_label, base_domain)
+    monitor_kwargs = dict(state_dir=state_dir, coalesce_window=coalesce_window, coalesce_max_delay=coalesce_max_delay,
+                          event_workers=event_workers, event_queue_size=event_queue_size,
+                          state_journal_max_bytes=state_journal_max_bytes, state_backend=state_backend,
+                          state_flush_interval=state_flush_interval, state_flush_max_pending=state_flush_max_pending,
+                          container_cache_size=container_cache_size, event_label_filter=event_label_filter,
+                          event_resume_max_age=event_resume_max_age, host_ip_refresh_interval=host_ip_refresh_interval,
+                          cleanup_interval=cleanup_interval, leader_lease_ttl=leader_lease_ttl)
+    state_store = None
+    if docker_hosts:
+        # One process for several daemons: one state store (one flusher) and one hostname index for all of them
+        logger.info(f"🐳 Docker hosts: {', '.join(f'{e.name}={e.url}' for e in docker_hosts)}")
+        state_store = create_state_store(state_backend, state_dir, state_journal_max_bytes, state_flush_interval,
+                                         state_flush_max_pending)
+        hostnames = HostnameIndex()
+        monitors = [DockerEventMonitor(*monitor_args, docker_host_ip if len(docker_hosts) == 1 else None,
+                                       f"{instance_id}-{endpoint.name}" if instance_id else None,
+                                       env_prefix=f"{env_prefix}-{endpoint.name}" if env_prefix else endpoint.name,
+                                       docker_url=endpoint.url, state_store=state_store, hostnames=hostnames,
+                                       **monitor_kwargs)
+                    for endpoint in docker_hosts]
+    else:
+        monitors = [DockerEventMonitor(*monitor_args, docker_host_ip, instance_id, env_prefix=env_prefix,
+                                       **monitor_kwargs)]
+    
+    if metrics_port:
+        serve_metrics(metrics_port)
+    TRACER.configure(trace_file, trace_max_events, trace_max_files)
+    
+    for monitor in monitors:
+        logger.info(f"🆔 Service instance ID: {monitor.instance_id}")
+        logger.info(f"🏢 Environment prefix: {monitor.env_prefix}")
     
-    logger.info(f"🆔 Service instance ID: {monitor.instance_id}")
-    logger.info(f"🏢 Environment prefix: {monitor.env_prefix}")
+    def handle_sigterm(signum, frame):
+        # docker stop sends SIGTERM: end the event loops so buffered state and DNS writes are flushed below
+        logger.info("Received SIGTERM, shutting down...")
+        stop_monitors(monitors)
     
+    signal.signal(signal.SIGTERM, handle_sigterm)
     try:
-        monitor.monitor_events()
+        run_monitors(monitors)
     except Exception as e:
         logger.error(f"Fatal error: {e}")
         return 1
+    finally:
+        if state_store is not None:
+            state_store.close()
+        dns_manager.close()
+        TRACER.flush()
     
     return 0
 
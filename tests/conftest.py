@@ -0,0 +1,46 @@
+from typing import Dict, List, Set
+
+import pytest
+
+import main
+from benchmarks.fakes import FakeDocker
+from dns.manager.dns_manager import DNSManager, Record
+
+
+class MemoryDNSManager(DNSManager):
+    """Records kept in a set; removing a hostname listed in ``failing`` fails"""
+
+    def __init__(self, records: Set[Record] = ()):
+        self.records = set(records)
+        self.failing: Set[str] = set()
+
+    def add_dns_records(self, records: List[Record]) -> List[bool]:
+        self.records.update(records)
+        return [True] * len(records)
+
+    def remove_dns_records(self, records: List[Record]) -> List[bool]:
+        results = []
+        for hostname, ip in records:
+            results.append(hostname not in self.failing)
+            if results[-1]:
+                self.records.discard((hostname, ip))
+        return results
+
+    def has_dns_record(self, hostname: str, ip: str) -> bool:
+        return (hostname, ip) in self.records
+
+    def fetch_dns_records(self, force: bool = True) -> List[Dict[str, str]]:
+        return [{'ip': ip, 'domain': hostname} for hostname, ip in sorted(self.records)]
+
+
+@pytest.fixture
+def monitor(request, tmp_path):
+    """
+    DockerEventMonitor 'self' on a FakeDocker, with its records in a MemoryDNSManager; parametrize it
+    indirectly with a state backend to use another one than 'file'
+    """
+    monitor = main.DockerEventMonitor(MemoryDNSManager(), 'dns.hostname', 'docker', '127.0.0.1', 'self',
+                                      str(tmp_path), 'test', state_flush_interval=0, docker_client=FakeDocker(),
+                                      state_backend=getattr(request, 'param', 'file'))
+    yield monitor
+    monitor.state_store.close()
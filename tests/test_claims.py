@@ -0,0 +1,24 @@
+import pytest
+
+from domain.hostname_policy import Owner
+
+pytestmark = pytest.mark.parametrize('monitor', ['file', 'sqlite'], indirect=True)
+
+
+def test_hostname_released_by_a_peer_is_claimed_before_the_next_refresh(monitor):
+    monitor.state_store.save_instance('peer', {}, {'c1': ('web.docker', '10.0.0.1')})
+    monitor._refresh_peer_claims()
+    assert not monitor._claim_hostname('c2', 'web.docker', '10.0.0.2')
+
+    # The peer stopped its container; this instance has not refreshed the peer claims yet
+    monitor.state_store.delete_record('peer', 'c1')
+    assert monitor.hostnames.owner('web.docker') == Owner('peer', 'c1')
+    assert monitor._claim_hostname('c2', 'web.docker', '10.0.0.2')
+    assert monitor.hostnames.owner('web.docker') == Owner('self', 'c2')
+
+
+def test_hostname_of_a_local_instance_is_not_taken_over(monitor):
+    monitor.hostnames.add_local('sibling')
+    monitor.hostnames.claim('web.docker', Owner('sibling', 'c1'))
+    assert not monitor._claim_hostname('c2', 'web.docker', '10.0.0.2')
+    assert monitor.hostnames.owner('web.docker') == Owner('sibling', 'c1')
@@ -0,0 +1,38 @@
+import pytest
+
+import main
+
+
+@pytest.fixture(autouse=True)
+def every_peer_is_inactive(monkeypatch):
+    monkeypatch.setattr(main, 'INACTIVE_INSTANCE_THRESHOLD', -1)
+
+
+def test_inactive_instance_is_dropped_once_its_records_are_removed(monitor):
+    monitor.dns_manager.records = {('a.docker', '10.0.0.1'), ('b.docker', '10.0.0.2')}
+    monitor.state_store.save_instance('peer', {}, {'c1': ('a.docker', '10.0.0.1'), 'c2': ('b.docker', '10.0.0.2')})
+
+    monitor._cleanup_inactive_instances()
+
+    assert monitor.dns_manager.records == set()
+    assert monitor.state_store.inactive_instances(-1, exclude='self') == []
+
+
+def test_instance_with_a_failed_removal_is_kept_for_the_next_sweep(monitor):
+    monitor.dns_manager.records = {('a.docker', '10.0.0.1'), ('b.docker', '10.0.0.2'), ('c.docker', '10.0.0.3')}
+    monitor.state_store.save_instance('peer-a', {}, {'c1': ('a.docker', '10.0.0.1'), 'c2': ('b.docker', '10.0.0.2')})
+    monitor.state_store.save_instance('peer-b', {}, {'c3': ('c.docker', '10.0.0.3')})
+    monitor.dns_manager.failing = {'b.docker'}
+
+    monitor._cleanup_inactive_instances()
+
+    assert monitor.dns_manager.records == {('b.docker', '10.0.0.2')}
+    assert monitor.state_store.inactive_instances(-1, exclude='self') == ['peer-a']
+    assert monitor.state_store.load_instance('peer-a') == {'c1': ('a.docker', '10.0.0.1'),
+                                                           'c2': ('b.docker', '10.0.0.2')}
+
+    monitor.dns_manager.failing = set()
+    monitor._cleanup_inactive_instances()
+
+    assert monitor.dns_manager.records == set()
+    assert monitor.state_store.inactive_instances(-1, exclude='self') == []
@@ -0,0 +1,48 @@
+import asyncio
+
+from agent import container_watcher
+from agent.dockdns_config import DockDNSConfig
+from agent.event_stream import EventCursor
+from benchmarks.fakes import FakeDocker
+
+
+def test_resume_keeps_the_routes_of_containers_that_kept_running(tmp_path, monkeypatch):
+    docker = FakeDocker()
+    web = docker.create('web', {'dockdns.target.hostname': 'web.docker'})['Id']
+    docker.create('api', {'dockdns.target.hostname': 'api.docker'})
+    routes_file = tmp_path / 'routes.yaml'
+    routes_file.write_text('written before the restart')
+
+    # The cursor is recent enough to resume without the initial sync
+    cursor = EventCursor(str(tmp_path / 'events.cursor'))
+    cursor.reset()
+    cursor.save()
+
+    # While DockDNS was down "web" was restarted with another IP, and the daemon replays that start
+    docker.running[web]['NetworkSettings']['Networks']['bridge']['IPAddress'] = '10.9.9.9'
+    docker.running[web]['NetworkSettings']['IPAddress'] = '10.9.9.9'
+
+    async def replay(http, cursor, filters, **kwargs):
+        yield {'Type': 'container', 'Action': 'start', 'id': web, 'time': 0, 'timeNano': 0}
+        await asyncio.Event().wait()
+
+    monkeypatch.setattr(container_watcher.docker, 'DockerClient', lambda **kwargs: docker)
+    monkeypatch.setattr(container_watcher, 'stream_events_async', replay)
+    config = DockDNSConfig(_env_file=None, docker_url='tcp://127.0.0.1:2375', docker_host_ip='127.0.0.1',
+                           event_cursor_path=str(tmp_path / 'events.cursor'), event_coalesce_window=0,
+                           traefik_output_dir=str(tmp_path), traefik_consolidated_file='routes.yaml',
+                           traefik_flush_interval=0, notifications_enabled=False)
+
+    async def run():
+        watcher = container_watcher.DockerWatcher(config)
+        await watcher.start()
+        for _ in range(500):
+            if 'http://10.9.9.9:80' in routes_file.read_text():
+                break
+            await asyncio.sleep(0.01)
+        await watcher.stop()
+
+    asyncio.run(run())
+    routes = routes_file.read_text()
+    assert 'Host(`web.docker`)' in routes and 'http://10.9.9.9:80' in routes
+    assert 'Host(`api.docker`)' in routes
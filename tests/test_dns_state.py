@@ -0,0 +1,60 @@
+import json
+
+import pytest
+
+from dns.manager.persistence.dns_state import SharedStateStore, apply_journal_entry
+
+
+def test_entries_assign_absolute_values():
+    state = {}
+    entries = [
+        ['I', 'i1', {'hostname': 'h1'}, {'c1': ['a.docker', '10.0.0.1']}, 1.0],
+        ['P', 'i1', 'c2', 'b.docker', '10.0.0.2', 2.0],
+        ['D', 'i1', 'c1', 3.0],
+        ['H', 'i1', 4.0],
+        ['P', 'i2', 'c3', 'c.docker', '10.0.0.3', 5.0],
+        ['X', 'i2', 6.0],
+    ]
+    for entry in entries:
+        apply_journal_entry(state, entry)
+
+    assert state == {'instances': {'i1': {'hostname': 'h1', 'records': {'c2': ['b.docker', '10.0.0.2']},
+                                          'last_seen': 4.0}},
+                     'last_updated': 6.0}
+
+    # Replaying entries already folded into the snapshot changes nothing but the timestamps
+    replayed = json.loads(json.dumps(state))
+    for entry in entries:
+        apply_journal_entry(replayed, entry)
+    assert replayed == state
+
+
+def test_unknown_op_is_rejected():
+    with pytest.raises(ValueError):
+        apply_journal_entry({}, ['Z', 'i1', 1.0])
+
+
+def test_load_replays_the_journal_over_the_snapshot_and_skips_a_torn_line(tmp_path):
+    store = SharedStateStore(str(tmp_path), max_journal_bytes=1 << 20)
+    store.replace_instance('i1', {'hostname': 'h1'}, {'c1': ('a.docker', '10.0.0.1')})
+    store.put_record('i1', 'c2', 'b.docker', '10.0.0.2')
+    store.delete_record('i1', 'c1')
+    with open(store.journal_file, 'a') as f:
+        f.write('["P","i1","c3","c.doc')
+
+    assert store.load_instance('i1') == {'c2': ('b.docker', '10.0.0.2')}
+
+    # The next append starts on a fresh line instead of extending the torn one
+    store.put_record('i1', 'c4', 'd.docker', '10.0.0.4')
+    assert store.load_instance('i1') == {'c2': ('b.docker', '10.0.0.2'), 'c4': ('d.docker', '10.0.0.4')}
+
+
+def test_compaction_folds_the_journal_into_the_snapshot(tmp_path):
+    store = SharedStateStore(str(tmp_path), max_journal_bytes=200)
+    for index in range(20):
+        store.put_record('i1', f"c{index}", f"host{index}.docker", f"10.0.0.{index}")
+
+    with open(store.journal_file) as f:
+        assert len(f.read()) <= 200
+    assert len(store.load_instance('i1')) == 20
+    assert len(SharedStateStore(str(tmp_path)).load_instance('i1')) == 20
@@ -0,0 +1,135 @@
+import time
+import threading
+
+from agent.event_coalescer import EventCoalescer
+from agent.event_stream import EventCursor
+
+
+def event(time_nano: int, container_id: str = 'c1', action: str = 'start') -> dict:
+    return {'Type': 'container', 'Action': action, 'id': container_id, 'timeNano': time_nano,
+            'time': time_nano // 1_000_000_000}
+
+
+def test_seen_skips_events_at_or_before_the_cursor():
+    cursor = EventCursor()
+    assert not cursor.seen(event(5))
+
+    cursor.advance(event(10))
+    assert cursor.seen(event(5))
+    assert cursor.seen(event(10))
+    assert not cursor.seen(event(11))
+    assert not cursor.seen({'Type': 'container'})
+
+
+def test_committed_stays_before_oldest_event_in_flight():
+    cursor = EventCursor()
+    first, second = event(100), event(200)
+    for e in (first, second):
+        cursor.track(e)
+        cursor.advance(e)
+
+    assert cursor.time_nano == 200
+    assert cursor.committed == 99
+
+    cursor.done(second)
+    assert cursor.committed == 99
+    cursor.done(first)
+    assert cursor.committed == 200
+    assert cursor.in_flight == 0
+
+
+def test_restart_replays_events_that_were_still_buffered(tmp_path):
+    path = str(tmp_path / 'events' / 'instance.cursor')
+    cursor = EventCursor(path)
+    handled, buffered = event(1_000_000_000), event(2_000_000_000)
+    for e in (handled, buffered):
+        cursor.track(e)
+        cursor.advance(e)
+    cursor.done(handled)
+    cursor.save()
+
+    restarted = EventCursor(path)
+    assert restarted.seen(handled)
+    assert not restarted.seen(buffered)
+    assert restarted.since == 1
+
+    cursor.done(buffered)
+    cursor.save()
+    assert EventCursor(path).seen(buffered)
+
+
+def test_coalescer_discards_the_replaced_event():
+    discarded, handled = [], []
+    coalescer = EventCoalescer(lambda *args: handled.append(args), window=60, on_discard=discarded.append)
+    start, stop = event(1), event(2, action='stop')
+    coalescer.push('c1', 'start', start)
+    coalescer.push('c1', 'stop', stop)
+    assert discarded == [start]
+
+    network = event(3, action='connect')
+    coalescer.push('c1', 'network', network, replace=False)
+    assert discarded == [start, network]
+
+    coalescer.flush()
+    assert handled == [('c1', 'stop', stop)]
+
+
+def test_coalesced_events_release_the_cursor_once_handled():
+    cursor = EventCursor()
+    handled = []
+
+    def handler(container_id, action, e):
+        handled.append(action)
+        cursor.done(e)
+
+    coalescer = EventCoalescer(handler, window=0.05, on_discard=cursor.done)
+    coalescer.start()
+    try:
+        for e in (event(1), event(2, action='stop'), event(3, 'c2')):
+            cursor.track(e)
+            cursor.advance(e)
+            coalescer.push(e['id'], e['Action'], e)
+        # The start was superseded by the stop, which still holds the cursor back
+        assert cursor.committed == 1
+        deadline = time.monotonic() + 5
+        while cursor.in_flight and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        coalescer.stop()
+    assert sorted(handled) == ['start', 'stop']
+    assert cursor.committed == 3
+
+
+def test_push_blocks_while_the_coalescer_is_full_and_the_handler_is_stuck():
+    release, handled = threading.Event(), []
+
+    def handler(container_id, action, e):
+        release.wait(5)
+        handled.append(container_id)
+
+    coalescer = EventCoalescer(handler, window=60, max_pending=2)
+    coalescer.start()
+    try:
+        coalescer.push('c1', 'start', event(1, 'c1'))
+        coalescer.push('c2', 'start', event(2, 'c2'))
+        # Events for pending containers still coalesce without waiting
+        coalescer.push('c1', 'stop', event(3, 'c1'))
+
+        reader = threading.Thread(target=coalescer.push, args=('c3', 'start', event(4, 'c3')))
+        reader.start()
+        # The oldest event went to the (stuck) handler early to make room; the one after it blocks
+        blocked = threading.Thread(target=coalescer.push, args=('c4', 'start', event(5, 'c4')))
+        reader.join(5)
+        assert not reader.is_alive()
+        blocked.start()
+        blocked.join(0.2)
+        assert blocked.is_alive()
+        assert coalescer.pending == 2
+
+        release.set()
+        blocked.join(5)
+        assert not blocked.is_alive()
+    finally:
+        coalescer.stop()
+    assert sorted(handled) == ['c1', 'c2', 'c3', 'c4']
+    assert coalescer.stats()['backpressure'] == 2
@@ -0,0 +1,82 @@
+import pytest
+
+from domain.hostname_policy import HostnameIndex, HostnamePolicy, Owner, is_valid_hostname, normalize_hostname
+
+
+@pytest.mark.parametrize('base_domain, name, expected', [
+    ('', 'nginx', 'prod-nginx'),
+    ('local.dev', 'nginx', 'prod-nginx.local.dev'),
+    ('local.dev', 'prod-nginx', 'prod-nginx.local.dev'),
+    ('{container-name}.services.local', 'nginx', 'prod-nginx.services.local'),
+    ('{env-prefix}-{container-name}.services.local', 'nginx', 'prod-nginx.services.local'),
+    ('{env-prefix}-{container-name}.services.local', 'prod-nginx', 'prod-nginx.services.local'),
+    ('local.dev', 'My_App', 'prod-my-app.local.dev'),
+])
+def test_policy_renders_base_domain_patterns(base_domain, name, expected):
+    assert HostnamePolicy('dns.hostname', base_domain, 'prod').hostname(name) == expected
+
+
+def test_policy_prefers_the_label_and_rejects_invalid_names():
+    policy = HostnamePolicy('dns.hostname', 'local.dev', 'prod')
+    assert policy.hostname('/nginx', {'dns.hostname': 'web'}) == 'prod-web.local.dev'
+    assert policy.hostname('/nginx', {'other': 'web'}) == 'prod-nginx.local.dev'
+    assert policy.hostname('', {}) is None
+    assert policy.hostname('-bad-') is None
+    assert policy.hostname('x' * 64) is None
+
+
+def test_normalize_and_validate_hostnames():
+    assert normalize_hostname(' Web_App.Local. ') == 'web-app.local'
+    assert is_valid_hostname('a-1.b')
+    assert not is_valid_hostname('a..b')
+    assert not is_valid_hostname('-a.b')
+    assert not is_valid_hostname('a' * 254)
+
+
+def state(**instances):
+    return {instance_id: {'records': records} for instance_id, records in instances.items()}
+
+
+def test_load_replaces_peer_claims_and_keeps_local_ones():
+    index = HostnameIndex()
+    index.add_local('self')
+    index.claim('mine.docker', Owner('self', 'c0'))
+
+    index.load(state(peer={'c1': ['a.docker', '10.0.0.1']}, gone={'c2': ['b.docker', '10.0.0.2']},
+                     self={'c9': ['stale.docker', '10.0.0.9']}))
+    assert index.owner('a.docker') == Owner('peer', 'c1')
+    assert index.owner('b.docker') == Owner('gone', 'c2')
+    assert index.owner('stale.docker') is None
+
+    # The peer moved its container to another name and "gone" was dropped from the shared state
+    index.load(state(peer={'c1': ['c.docker', '10.0.0.1']}))
+    assert index.owner('a.docker') is None
+    assert index.owner('b.docker') is None
+    assert index.owner('c.docker') == Owner('peer', 'c1')
+    assert index.owner('mine.docker') == Owner('self', 'c0')
+    assert index.counts() == {'self': 1, 'peer': 1}
+
+
+def test_load_does_not_take_a_hostname_from_a_local_owner():
+    index = HostnameIndex()
+    index.add_local('self')
+    index.claim('a.docker', Owner('self', 'c0'))
+
+    index.load(state(peer={'c1': ['a.docker', '10.0.0.1']}), exclude=['other'])
+    assert index.owner('a.docker') == Owner('self', 'c0')
+    assert index.claim('a.docker', Owner('other', 'c5')) == Owner('self', 'c0')
+
+
+def test_claim_release_and_transfer():
+    index = HostnameIndex()
+    first, second = Owner('i1', 'c1'), Owner('i1', 'c2')
+    assert index.claim('a.docker', first) is None
+    assert index.claim('a.docker', first) is None
+    assert index.claim('a.docker', second) == first
+
+    index.release('a.docker', second)
+    assert index.owner('a.docker') == first
+    index.transfer('a.docker', second)
+    assert index.owner('a.docker') == second
+    index.release('a.docker', second)
+    assert index.owner('a.docker') is None
@@ -0,0 +1,47 @@
+from dns.manager.hosts.hosts_file import HEADER, HostsFileDNSManager, apply_host_changes, parse_hosts, read_hosts
+
+
+def test_parse_hosts_yields_one_record_per_name():
+    hosts = ['# comment', '10.0.0.1 a.docker b.docker  # trailing', '', '10.0.0.2 c.docker']
+    assert parse_hosts(hosts) == [('a.docker', '10.0.0.1'), ('b.docker', '10.0.0.1'), ('c.docker', '10.0.0.2')]
+
+
+def test_apply_host_changes_keeps_untouched_lines_verbatim():
+    hosts = [HEADER, '192.168.1.5   nas.lan   # by hand', '10.0.0.1 a.docker b.docker']
+    updated = apply_host_changes(hosts, [('add', 'c.docker', '10.0.0.3'), ('remove', 'b.docker', '10.0.0.1')])
+    assert updated == [HEADER, '192.168.1.5   nas.lan   # by hand', '10.0.0.1 a.docker', '10.0.0.3 c.docker']
+
+
+def test_apply_host_changes_drops_emptied_entries_and_is_idempotent():
+    hosts = ['10.0.0.1 a.docker']
+    assert apply_host_changes(hosts, [('remove', 'a.docker', '10.0.0.1')]) == []
+    assert apply_host_changes(hosts, [('add', 'a.docker', '10.0.0.1')]) == hosts
+    # Removing a record that points elsewhere leaves the entry alone
+    assert apply_host_changes(hosts, [('remove', 'a.docker', '10.0.0.9')]) == hosts
+
+
+def test_apply_host_changes_applies_in_order():
+    changes = [('add', 'a.docker', '10.0.0.1'), ('remove', 'a.docker', '10.0.0.1'), ('add', 'a.docker', '10.0.0.2')]
+    assert apply_host_changes([], changes) == ['10.0.0.2 a.docker']
+
+
+def test_manager_writes_behind_and_keeps_other_writers_entries(tmp_path):
+    path = tmp_path / 'hosts'
+    path.write_text('192.168.1.5 nas.lan\n')
+    manager = HostsFileDNSManager(str(path), write_delay=60)
+    try:
+        assert manager.add_dns_records([('a.docker', '10.0.0.1'), ('b.docker', '10.0.0.2')]) == [True, True]
+        assert manager.remove_dns_record('a.docker', '10.0.0.1')
+        assert manager.has_dns_record('b.docker', '10.0.0.2')
+        assert not manager.has_dns_record('a.docker', '10.0.0.1')
+        # Nothing written before the delay
+        assert read_hosts(str(path)) == ['192.168.1.5 nas.lan']
+
+        # Another writer adds an entry in the meantime
+        path.write_text('192.168.1.5 nas.lan\n192.168.1.6 printer.lan\n')
+        manager.flush()
+        assert read_hosts(str(path)) == ['192.168.1.5 nas.lan', '192.168.1.6 printer.lan', '10.0.0.2 b.docker']
+        assert manager.writes == 1
+        assert manager.has_dns_record('printer.lan', '192.168.1.6')
+    finally:
+        manager.close()
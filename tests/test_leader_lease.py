@@ -0,0 +1,48 @@
+import time
+
+from dns.manager.persistence.leader_lease import LeaderLease
+
+
+def test_one_holder_at_a_time_until_the_lease_expires(tmp_path):
+    first = LeaderLease(str(tmp_path), 'i1', ttl=0.2)
+    second = LeaderLease(str(tmp_path), 'i2', ttl=0.2)
+
+    assert first.try_acquire()
+    assert not second.try_acquire()
+    assert second.current_holder() == 'i1'
+
+    # A renewal extends the lease
+    time.sleep(0.12)
+    assert first.try_acquire()
+    time.sleep(0.12)
+    assert not second.try_acquire()
+
+    # The holder stopped renewing (crashed): the lease expires and changes hands
+    time.sleep(0.25)
+    assert not first.is_leader
+    assert second.current_holder() is None
+    assert second.try_acquire()
+    assert not first.try_acquire()
+    assert second.current_holder() == 'i2'
+
+
+def test_release_hands_over_at_once(tmp_path):
+    first = LeaderLease(str(tmp_path), 'i1', ttl=60)
+    second = LeaderLease(str(tmp_path), 'i2', ttl=60)
+    assert first.try_acquire()
+
+    first.release()
+    assert not first.is_leader
+    assert second.try_acquire()
+
+    # Releasing a lease we do not hold leaves the holder's lease alone
+    first.release()
+    assert second.current_holder() == 'i2'
+
+
+def test_unreadable_lease_file_is_taken_over(tmp_path):
+    lease = LeaderLease(str(tmp_path), 'i1', ttl=60)
+    with open(lease.path, 'w') as f:
+        f.write('{not json')
+    assert lease.try_acquire()
+    assert lease.current_holder() == 'i1'
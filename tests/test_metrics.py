@@ -0,0 +1,27 @@
+import main
+from benchmarks.fakes import FakeDocker
+from conftest import MemoryDNSManager
+from core.metrics import MANAGED_RECORDS
+from domain.hostname_policy import HostnameIndex, Owner
+
+
+def test_managed_records_reports_every_monitor_of_the_process(tmp_path):
+    hostnames = HostnameIndex()
+    monitors = [main.DockerEventMonitor(MemoryDNSManager(), 'dns.hostname', 'docker', '127.0.0.1', instance_id,
+                                        str(tmp_path), instance_id, state_flush_interval=0,
+                                        docker_client=FakeDocker(), hostnames=hostnames)
+                for instance_id in ('host-a', 'host-b')]
+    try:
+        first, second = monitors
+        first.container_dns_records.update({'c1': ('a.docker', '10.0.0.1'), 'c2': ('b.docker', '10.0.0.2')})
+        second.container_dns_records['c3'] = ('c.docker', '10.0.0.3')
+        hostnames.claim('peer.docker', Owner('peer', 'c9'))
+
+        samples = set(MANAGED_RECORDS.samples())
+        assert 'dockdns_managed_records{instance="host-a"} 2' in samples
+        assert 'dockdns_managed_records{instance="host-b"} 1' in samples
+        assert 'dockdns_managed_records{instance="peer"} 1' in samples
+    finally:
+        for monitor in monitors:
+            MANAGED_RECORDS.untrack(monitor.instance_id)
+            monitor.state_store.close()
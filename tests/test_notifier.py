@@ -0,0 +1,79 @@
+import asyncio
+import time
+
+from notifier.dispatcher import DIGEST_MAX_LINES, MemorySink, Notification, NotificationDispatcher, RateLimiter, digest
+
+
+def wait_for(condition, timeout: float = 5.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_digest_summarizes_and_truncates():
+    assert digest([Notification("routes added", "a → 1")], 10) == "a → 1"
+
+    notifications = [Notification("routes added", f"host{i}") for i in range(DIGEST_MAX_LINES + 2)]
+    notifications.append(Notification("routes removed", "old"))
+    lines = digest(notifications, 10).split("\n")
+    assert lines[0] == f"{DIGEST_MAX_LINES + 2} routes added, 1 routes removed in the last 10s"
+    assert lines[1:-1] == [f"• host{i}" for i in range(DIGEST_MAX_LINES)]
+    assert lines[-1] == "… and 3 more"
+
+
+def test_notifications_within_the_window_are_sent_as_one_digest():
+    sink = MemorySink()
+    dispatcher = NotificationDispatcher({'memory': sink}, digest_window=0.2, rate=100, burst=10)
+    dispatcher.start()
+    try:
+        for i in range(3):
+            dispatcher.notify("routes added", f"host{i}")
+        assert wait_for(lambda: sink.messages)
+    finally:
+        dispatcher.stop()
+    assert sink.messages == ["3 routes added in the last 0.2s\n• host0\n• host1\n• host2"]
+    assert dispatcher.stats() == {'received': 3, 'dropped': 0, 'sent': 1, 'failed': 0}
+
+
+def test_notifications_are_dropped_when_the_queue_is_full():
+    sink = MemorySink()
+    dispatcher = NotificationDispatcher({'memory': sink}, queue_size=2, digest_window=60)
+    dispatcher.start()
+    for i in range(6):
+        dispatcher.notify("routes added", f"host{i}")
+    assert wait_for(lambda: dispatcher.dropped + 2 >= 5)
+    # stop() flushes what was queued without waiting for the digest window
+    dispatcher.stop()
+
+    stats = dispatcher.stats()
+    assert stats['received'] == 6
+    # The delivery task may already have taken the first one off the queue
+    assert stats['dropped'] in (3, 4)
+    assert len(sink.messages) == 1
+    assert sink.messages[0].startswith(f"{6 - stats['dropped']} routes added")
+
+
+def test_no_op_without_sinks():
+    dispatcher = NotificationDispatcher({})
+    dispatcher.start()
+    dispatcher.notify("routes added", "host")
+    dispatcher.stop()
+    assert dispatcher.stats()['received'] == 0
+
+
+def test_rate_limiter_allows_a_burst_then_paces():
+    async def acquire_times():
+        limiter = RateLimiter(rate=20, burst=2)
+        started = time.monotonic()
+        times = []
+        for _ in range(4):
+            await limiter.acquire()
+            times.append(time.monotonic() - started)
+        return times
+
+    times = asyncio.run(acquire_times())
+    assert times[1] < 0.03
+    # Two tokens per 0.1s once the burst is spent
+    assert times[3] >= 0.09
+    assert times[3] < 1.0
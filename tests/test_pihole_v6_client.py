@@ -0,0 +1,154 @@
+import asyncio
+
+import pytest
+
+from benchmarks.fakes import FakePiHole
+from dns.manager.pihole.config import PiHoleConfig
+from dns.manager.pihole.pihole_client import DNSRecord
+from dns.manager.pihole.pihole_v6_client import AsyncPiHoleV6Client, changes_applied
+
+
+@pytest.fixture
+def pihole():
+    pihole = FakePiHole(api_version=6, password='secret').start()
+    yield pihole
+    pihole.stop()
+
+
+def run(pihole: FakePiHole, scenario):
+    async def main():
+        async with AsyncPiHoleV6Client(PiHoleConfig(pihole.url, 'secret', api_version=6, batch_window=0.01)) as client:
+            return await scenario(client)
+    return asyncio.run(main())
+
+
+def records(count: int, prefix: str = 'app'):
+    return [DNSRecord(f"{prefix}{i}.docker", f"10.0.0.{i + 1}") for i in range(count)]
+
+
+def test_changes_applied():
+    hosts = ['10.0.0.1 a.docker b.docker']
+    assert changes_applied(hosts, [('add', 'a.docker', '10.0.0.1'), ('remove', 'c.docker', '10.0.0.1')])
+    assert not changes_applied(hosts, [('remove', 'b.docker', '10.0.0.1')])
+    assert changes_applied(hosts, [('remove', 'a.docker', '10.0.0.1'), ('add', 'a.docker', '10.0.0.1')])
+
+
+def test_logs_in_once_and_again_after_the_session_expires(pihole):
+    async def scenario(client):
+        assert await client.add_dns_record(DNSRecord('a.docker', '10.0.0.1'))
+        assert await client.add_dns_record(DNSRecord('b.docker', '10.0.0.2'))
+        assert pihole.logins == 1
+        pihole.sessions.clear()
+        assert await client.add_dns_record(DNSRecord('c.docker', '10.0.0.3'))
+        assert pihole.logins == 2
+
+    run(pihole, scenario)
+    assert pihole.records == {'a.docker': '10.0.0.1', 'b.docker': '10.0.0.2', 'c.docker': '10.0.0.3'}
+    assert not pihole.sessions
+
+
+def test_wrong_password_is_rejected(pihole):
+    async def scenario():
+        async with AsyncPiHoleV6Client(PiHoleConfig(pihole.url, 'wrong', api_version=6, max_retries=0)) as client:
+            return await client.add_dns_records(records(1))
+
+    assert asyncio.run(scenario()) == [False]
+    assert pihole.records == {}
+
+
+def test_concurrent_single_changes_are_applied_in_one_update(pihole):
+    async def scenario(client):
+        await client.add_dns_record(DNSRecord('gone.docker', '10.0.0.99'))
+        requests = pihole.requests
+        results = await asyncio.gather(*(client.add_dns_record(record) for record in records(50)),
+                                       client.remove_dns_record('gone.docker', '10.0.0.99'))
+        assert results == [True] * 51
+        return client.batches, pihole.requests - requests
+
+    # One GET, one PATCH and the GET checking it, instead of one request per container event
+    assert run(pihole, scenario) == (2, 3)
+    assert len(pihole.records) == 50
+
+
+def test_bulk_changes_are_applied_in_one_update(pihole):
+    pihole.records['manual.lan'] = '192.168.1.10'
+
+    async def scenario(client):
+        assert await client.add_dns_records(records(50)) == [True] * 50
+        assert await client.remove_dns_records([(f"app{i}.docker", f"10.0.0.{i + 1}") for i in range(10)]) \
+            == [True] * 10
+        return client.batches
+
+    assert run(pihole, scenario) == 2
+    assert len(pihole.records) == 41
+    assert pihole.records['manual.lan'] == '192.168.1.10'
+
+
+def test_changes_already_in_place_succeed(pihole):
+    pihole.records['a.docker'] = '10.0.0.1'
+
+    async def scenario(client):
+        patches = overwrite_after_patch(client, pihole, times=0)
+        assert await client.add_dns_record(DNSRecord('a.docker', '10.0.0.1'))
+        assert await client.remove_dns_record('gone.docker', '10.0.0.9')
+        assert await client.add_dns_records([DNSRecord('a.docker', '10.0.0.1')] * 10) == [True] * 10
+        return patches
+
+    # A batch that changes nothing does not PATCH
+    assert run(pihole, scenario) == []
+    assert pihole.records == {'a.docker': '10.0.0.1'}
+
+
+def overwrite_after_patch(client: AsyncPiHoleV6Client, pihole: FakePiHole, times: int):
+    """Simulates another writer replacing the host list right after each of our first ``times`` PATCHes"""
+    api, patches = client._api, []
+
+    async def _api(method, path, operation, **kwargs):
+        response = await api(method, path, operation, **kwargs)
+        if method == 'PATCH':
+            patches.append(path)
+            if len(patches) <= times:
+                with pihole._lock:
+                    pihole.records = {'other.docker': '10.9.9.9'}
+        return response
+
+    client._api = _api
+    return patches
+
+
+def test_bulk_update_is_reapplied_when_another_writer_overwrites_it(pihole):
+    async def scenario(client):
+        patches = overwrite_after_patch(client, pihole, times=1)
+        assert await client.add_dns_records(records(20)) == [True] * 20
+        return patches
+
+    assert len(run(pihole, scenario)) == 2
+    assert len(pihole.records) == 21
+    assert pihole.records['other.docker'] == '10.9.9.9'
+
+
+def test_bulk_update_fails_when_it_keeps_being_overwritten(pihole):
+    async def scenario(client):
+        overwrite_after_patch(client, pihole, times=100)
+        return await client.add_dns_records(records(20))
+
+    assert run(pihole, scenario) == [False] * 20
+
+
+def test_changes_queued_during_an_update_reuse_the_list_it_read_back(pihole):
+    async def scenario(client):
+        api, calls, queued = client._api, [], []
+
+        async def _api(method, path, operation, **kwargs):
+            calls.append(method)
+            if method == 'PATCH' and not queued:
+                queued.append(asyncio.ensure_future(client.add_dns_record(DNSRecord('b.docker', '10.0.0.2'))))
+            return await api(method, path, operation, **kwargs)
+
+        client._api = _api
+        assert await client.add_dns_record(DNSRecord('a.docker', '10.0.0.1'))
+        assert await queued[0]
+        return calls
+
+    assert run(pihole, scenario) == ['GET', 'PATCH', 'GET', 'PATCH', 'GET']
+    assert pihole.records == {'a.docker': '10.0.0.1', 'b.docker': '10.0.0.2'}
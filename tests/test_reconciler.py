@@ -0,0 +1,75 @@
+from conftest import MemoryDNSManager
+from dns.manager.reconciler import DNSReconciler, RecordChange, normalize_records
+
+
+def by_container(changes):
+    return {change.container_id: change.record for change in changes}
+
+
+def test_plan_writes_only_the_difference():
+    desired = {'c1': ('a.docker', '10.0.0.1'), 'c2': ('b.docker', '10.0.0.2'), 'c3': ('c.docker', '10.0.0.3')}
+    managed = {'c1': ('a.docker', '10.0.0.1'), 'c2': ('b.docker', '10.0.0.9'), 'c4': ('d.docker', '10.0.0.4')}
+    existing = {('a.docker', '10.0.0.1'), ('b.docker', '10.0.0.9'), ('d.docker', '10.0.0.4')}
+
+    plan = DNSReconciler.plan(desired, managed, existing)
+
+    assert by_container(plan.keep) == {'c1': ('a.docker', '10.0.0.1')}
+    assert by_container(plan.add) == {'c2': ('b.docker', '10.0.0.2'), 'c3': ('c.docker', '10.0.0.3')}
+    assert by_container(plan.remove) == {'c2': ('b.docker', '10.0.0.9'), 'c4': ('d.docker', '10.0.0.4')}
+    assert plan.forget == []
+    assert plan.writes == 4
+
+
+def test_plan_forgets_records_that_are_gone_or_taken_over():
+    # c1's record was deleted by hand, c2's record now belongs to recreated container c3
+    managed = {'c1': ('a.docker', '10.0.0.1'), 'c2': ('b.docker', '10.0.0.2')}
+    desired = {'c3': ('b.docker', '10.0.0.2')}
+    existing = {('b.docker', '10.0.0.2')}
+
+    plan = DNSReconciler.plan(desired, managed, existing)
+
+    assert by_container(plan.forget) == managed
+    assert plan.remove == [] and plan.add == []
+    assert by_container(plan.keep) == desired
+
+
+def test_plan_without_existing_records_writes_blindly():
+    managed = {'c1': ('a.docker', '10.0.0.1'), 'c2': ('b.docker', '10.0.0.2')}
+    desired = {'c1': ('a.docker', '10.0.0.1'), 'c3': ('c.docker', '10.0.0.3')}
+
+    plan = DNSReconciler.plan(desired, managed, None)
+
+    assert by_container(plan.keep) == {'c1': ('a.docker', '10.0.0.1')}
+    assert by_container(plan.add) == {'c3': ('c.docker', '10.0.0.3')}
+    assert by_container(plan.remove) == {'c2': ('b.docker', '10.0.0.2')}
+
+
+def test_in_sync_plan_is_empty():
+    records = {'c1': ('a.docker', '10.0.0.1')}
+    plan = DNSReconciler.plan(records, records, {('a.docker', '10.0.0.1'), ('manual.lan', '192.168.1.2')})
+    assert plan.empty
+    assert plan.writes == 0
+
+
+def test_apply_keeps_failed_removals_managed():
+    dns_manager = MemoryDNSManager({('a.docker', '10.0.0.1'), ('b.docker', '10.0.0.2')})
+    dns_manager.failing = {'b.docker'}
+    managed = {'c1': ('a.docker', '10.0.0.1'), 'c2': ('b.docker', '10.0.0.2')}
+    desired = {'c3': ('c.docker', '10.0.0.3')}
+    reconciler = DNSReconciler(dns_manager, batch_size=1)
+
+    existing = normalize_records(dns_manager.fetch_dns_records())
+    result = reconciler.apply(DNSReconciler.plan(desired, managed, existing), managed)
+
+    assert result.records == {'c2': ('b.docker', '10.0.0.2'), 'c3': ('c.docker', '10.0.0.3')}
+    assert result.failed == [RecordChange('c2', 'b.docker', '10.0.0.2')]
+    assert dns_manager.records == {('b.docker', '10.0.0.2'), ('c.docker', '10.0.0.3')}
+    assert result.changed
+
+
+def test_normalize_records_accepts_dicts_and_records():
+    class Record:
+        hostname, ip = 'b.docker', '10.0.0.2'
+
+    assert normalize_records([{'domain': 'a.docker', 'ip': '10.0.0.1'}, Record()]) == \
+        {('a.docker', '10.0.0.1'), ('b.docker', '10.0.0.2')}
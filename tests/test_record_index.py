@@ -0,0 +1,64 @@
+import threading
+
+from dns.manager.pihole.record_index import DNSRecordIndex
+
+
+def test_writes_are_not_blocked_by_a_fetch_in_flight_and_survive_it():
+    fetching, release = threading.Event(), threading.Event()
+
+    def fetch():
+        fetching.set()
+        release.wait(5)
+        return [('a.docker', '10.0.0.1'), ('gone.docker', '10.0.0.9')]
+
+    index = DNSRecordIndex(fetch)
+    refresher = threading.Thread(target=index.refresh)
+    refresher.start()
+    assert fetching.wait(5)
+
+    writer = threading.Thread(target=lambda: (index.add('b.docker', '10.0.0.2'),
+                                              index.discard('gone.docker', '10.0.0.9')))
+    writer.start()
+    writer.join(1)
+    assert not writer.is_alive()
+
+    release.set()
+    refresher.join(5)
+    assert index.snapshot() == {('a.docker', '10.0.0.1'), ('b.docker', '10.0.0.2')}
+    assert index.refreshes == 1
+
+
+def test_concurrent_refreshes_share_one_fetch():
+    release = threading.Event()
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        release.wait(5)
+        return [('a.docker', '10.0.0.1')]
+
+    index = DNSRecordIndex(fetch)
+    threads = [threading.Thread(target=index.refresh) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert len(calls) == 1
+    assert index.contains('a.docker', '10.0.0.1')
+
+
+def test_max_age_rechecks_a_cached_yes():
+    served = {('a.docker', '10.0.0.1')}
+    index = DNSRecordIndex(lambda: list(served), ttl=60)
+    assert index.contains('a.docker', '10.0.0.1')
+
+    # Removed by another writer since the index was loaded
+    served.clear()
+    assert index.contains('a.docker', '10.0.0.1')
+    assert not index.contains('a.docker', '10.0.0.1', max_age=0)
+    assert index.refreshes == 2
+
+    # A cached no is not re-checked
+    assert not index.contains('b.docker', '10.0.0.2', max_age=0)
+    assert index.refreshes == 2
@@ -0,0 +1,56 @@
+import os
+import threading
+
+import fcntl
+
+from dns.manager.persistence.dns_state import SharedStateStore
+from dns.manager.persistence.sharded_state import ShardedStateStore
+
+
+def test_drop_instance_waits_for_the_peer_shard_lock(tmp_path):
+    store = ShardedStateStore(str(tmp_path))
+    store.put_record('peer', 'c1', 'a.docker', '10.0.0.1')
+    # The peer's own handle on its shard, mid-write
+    peer = SharedStateStore(store.shard_dir, 'peer')
+    locked, release = threading.Event(), threading.Event()
+
+    def peer_write():
+        with peer._locked(fcntl.LOCK_EX):
+            locked.set()
+            release.wait(5)
+
+    writer = threading.Thread(target=peer_write)
+    writer.start()
+    assert locked.wait(5)
+    dropper = threading.Thread(target=store.drop_instance, args=('peer',))
+    dropper.start()
+    dropper.join(0.2)
+    assert dropper.is_alive()
+    assert os.path.exists(peer.journal_file)
+
+    release.set()
+    writer.join(5)
+    dropper.join(5)
+    assert not dropper.is_alive()
+    assert not any(os.path.exists(path) for path in (peer.snapshot_file, peer.journal_file, peer.lock_file))
+    assert store.load_instance('peer') == {}
+
+
+def test_writer_queued_on_a_removed_lock_file_locks_the_new_one(tmp_path):
+    shard = SharedStateStore(str(tmp_path), 'peer')
+    shard.put_record('peer', 'c1', 'a.docker', '10.0.0.1')
+    other = SharedStateStore(str(tmp_path), 'peer')
+
+    with shard._locked(fcntl.LOCK_EX):
+        # Opens the current lock file and waits for its flock
+        writer = threading.Thread(target=other.put_record, args=('peer', 'c2', 'b.docker', '10.0.0.2'))
+        writer.start()
+        writer.join(0.2)
+        assert writer.is_alive()
+        for path in (shard.snapshot_file, shard.journal_file, shard.lock_file):
+            if os.path.exists(path):
+                os.remove(path)
+    writer.join(5)
+    assert not writer.is_alive()
+    assert os.path.exists(shard.lock_file)
+    assert shard.load_instance('peer') == {'c2': ('b.docker', '10.0.0.2')}
@@ -0,0 +1,41 @@
+import threading
+import time
+
+import main
+
+
+def wait_for(condition, timeout: float = 5.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def test_stop_unblocks_a_monitor_waiting_on_an_idle_stream(monitor):
+    docker = monitor.client
+    thread = threading.Thread(target=monitor.monitor_events, daemon=True)
+    thread.start()
+    assert wait_for(lambda: docker.calls['events'] > 0)
+    assert wait_for(lambda: monitor.leader_lease.is_leader)
+
+    # Closing the client leaves the stream blocked, as with docker's client
+    docker.close()
+    thread.join(0.3)
+    assert thread.is_alive()
+
+    main.stop_monitors([monitor])
+    thread.join(5)
+    assert not thread.is_alive()
+    # monitor_events reached its shutdown path
+    assert not monitor.leader_lease.is_leader
+    assert docker.calls['events'] == 1
+
+
+def test_stop_before_the_stream_opens_ends_monitor_events(monitor):
+    monitor.stop()
+    thread = threading.Thread(target=monitor.monitor_events, daemon=True)
+    thread.start()
+    thread.join(5)
+    assert not thread.is_alive()
@@ -0,0 +1,40 @@
+from dns.manager.reverse_proxy.traefik_client import TraefikConfig, TraefikWriter
+from domain.container_metadata import ContainerMetadata
+from domain.container_wraper import ContainerWrapper
+
+
+def container(container_id: str, hostname: str = 'web.docker') -> ContainerWrapper:
+    return ContainerWrapper(ContainerMetadata(id=container_id, name='web',
+                                              labels={'dockdns.target.hostname': hostname}))
+
+
+def test_consolidated_routes_are_kept_per_container(tmp_path):
+    writer = TraefikWriter(TraefikConfig(None, str(tmp_path), False, consolidated_file='routes.yaml',
+                                         flush_interval=0))
+    first, second = container('a' * 64), container('b' * 64)
+
+    assert writer.write('web.docker', '10.0.0.1', 80, first)
+    assert writer.write('web.docker', '10.0.0.2', 80, second)
+    assert not writer.write('web.docker', '10.0.0.1', 80, first)
+
+    routes = (tmp_path / 'routes.yaml').read_text()
+    assert 'http://10.0.0.1:80' in routes and 'http://10.0.0.2:80' in routes
+
+    assert writer.delete(first)
+    assert not writer.delete(first)
+    routes = (tmp_path / 'routes.yaml').read_text()
+    assert 'http://10.0.0.1:80' not in routes and 'http://10.0.0.2:80' in routes
+
+
+def test_per_container_file_uses_the_default_template(tmp_path):
+    writer = TraefikWriter(TraefikConfig(None, str(tmp_path / 'dynamic'), False))
+    wrapper = container('c' * 64)
+
+    assert writer.write('web.docker', '10.0.0.1', 8080, wrapper)
+    assert not writer.write('web.docker', '10.0.0.1', 8080, wrapper)
+    path = tmp_path / 'dynamic' / f"web.docker_{'c' * 12}.yaml"
+    assert 'Host(`web.docker`)' in path.read_text()
+
+    assert writer.delete(wrapper)
+    assert not path.exists()
+    assert not writer.delete(wrapper)
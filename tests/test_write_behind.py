@@ -0,0 +1,54 @@
+import json
+
+import pytest
+
+from dns.manager.persistence.state_store import create_state_store
+
+
+def journal(store, instance_id: str) -> list:
+    with open(store.store._shard(instance_id).journal_file) as f:
+        return [json.loads(line)[0] for line in f if line.strip()]
+
+
+def test_flush_appends_only_the_changed_records_to_the_journal(tmp_path):
+    store = create_state_store('file', str(tmp_path), flush_interval=60)
+    try:
+        store.save_instance('i1', {'hostname': 'h1'}, {'c1': ('a.docker', '10.0.0.1'), 'c2': ('b.docker', '10.0.0.2')})
+        store.flush()
+        # A full replacement rewrites the shard snapshot and leaves an empty journal
+        assert journal(store, 'i1') == []
+
+        store.put_record('i1', 'c3', 'c.docker', '10.0.0.3')
+        store.delete_record('i1', 'c1')
+        store.put_record('i1', 'c4', 'd.docker', '10.0.0.4')
+        store.delete_record('i1', 'c4')
+        store.flush()
+        assert journal(store, 'i1') == ['P', 'D']
+        assert store.store.load_instance('i1') == {'c2': ('b.docker', '10.0.0.2'), 'c3': ('c.docker', '10.0.0.3')}
+    finally:
+        store.close()
+
+
+@pytest.mark.parametrize('backend', ['file', 'sqlite'])
+def test_changes_survive_a_reopen_and_unchanged_instances_are_not_written(tmp_path, backend):
+    store = create_state_store(backend, str(tmp_path), flush_interval=60)
+    store.put_record('i1', 'c1', 'a.docker', '10.0.0.1')
+    store.put_record('i1', 'c2', 'b.docker', '10.0.0.2')
+    store.flush()
+    assert store.flushes == 1
+
+    # A container stopped and started again with the same record
+    store.delete_record('i1', 'c1')
+    store.put_record('i1', 'c1', 'a.docker', '10.0.0.1')
+    store.flush()
+    assert (store.flushes, store.skipped_flushes) == (1, 1)
+
+    store.put_record('i1', 'c2', 'b.docker', '10.0.0.9')
+    store.delete_record('i1', 'c1')
+    store.close()
+
+    reopened = create_state_store(backend, str(tmp_path))
+    try:
+        assert reopened.load_instance('i1') == {'c2': ('b.docker', '10.0.0.9')}
+    finally:
+        reopened.close()